@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from benchmarks.suite import BENCHMARKS, DEFAULT_REPEATS, DEFAULT_SIZE, SIZES, compare_results, run_benchmarks
+from core.utilities import format_bytes
+
+
+def print_results(results, ratios=None):
+    ratios = ratios or {}
+    for name, result in results["benchmarks"].items():
+        line = f"{name:<24} {result['seconds']:9.3f} s {result['vertices_per_second']:14,.0f} vertices/s"
+        if result["megabytes_per_second"] is not None:
+            line += f" {result['megabytes_per_second']:9.1f} MB/s"
+        line += f"  peak {format_bytes(result['peak_memory'])}"
+        if name in ratios:
+            line += f"  {ratios[name]:.2f}x the baseline time"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmarks")
+    parser.add_argument(
+        "-b",
+        "--benchmarks",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        help="<Optional> Benchmarks to run, defaults to all of them",
+    )
+    parser.add_argument(
+        "--size",
+        choices=list(SIZES),
+        default=DEFAULT_SIZE,
+        help=f"<Optional> Size of the generated data, defaults to {DEFAULT_SIZE}",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=DEFAULT_REPEATS,
+        help=f"<Optional> Timed runs of every benchmark, the fastest is reported, defaults to {DEFAULT_REPEATS}",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="<Optional> Seed of the generated data")
+    parser.add_argument(
+        "--data-folder",
+        help="<Optional> Folder to generate the data in and keep it, a temporary folder is used otherwise",
+    )
+    parser.add_argument("-o", "--output", help="<Optional> JSON file to write the results to")
+    parser.add_argument(
+        "--compare",
+        help="<Optional> JSON results of an earlier run, e.g. of another commit, to compare the timings with",
+    )
+    args = parser.parse_args()
+
+    if args.repeats < 1:
+        parser.error("--repeats has to be at least 1")
+
+    if args.data_folder:
+        os.makedirs(args.data_folder, exist_ok=True)
+        results = run_benchmarks(args.data_folder, args.benchmarks, args.size, args.repeats, args.seed)
+    else:
+        with TemporaryDirectory() as tempdir:
+            results = run_benchmarks(tempdir, args.benchmarks, args.size, args.repeats, args.seed)
+
+    ratios = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fi:
+            ratios = compare_results(results, json.load(fi))
+
+    print_results(results, ratios)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fo:
+            json.dump(results, fo, indent=2)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,176 @@
+"""Deterministic synthetic txt list and osm files for the benchmarks
+
+The same arguments and seed always give the same file, so timings of different commits are measured on the same
+data. Coordinates are random walks around a random origin, rounded to 7 decimals as in osm data.
+"""
+import math
+import random
+from xml.sax.saxutils import quoteattr
+
+from core.txt_file.constants import TXT_LIST_HEADERS
+
+POINTS = "points"
+LINES = "lines"
+AREAS = "areas"
+MULTIPOLYGON_PARTS = "multipolygon_parts"
+TXT_KINDS = [POINTS, LINES, AREAS, MULTIPOLYGON_PARTS]
+
+COORDINATE_DECIMALS = 7
+# Degrees between the consecutive vertices of a line, roughly 10 to 100 meters
+MIN_STEP = 0.0001
+MAX_STEP = 0.001
+
+
+def get_random_origin(rng):
+    return rng.uniform(-170, 170), rng.uniform(-80, 80)
+
+
+def get_line_coordinates(rng, number_of_vertices):
+    """Return [(longitude, latitude)] of a random walk keeping roughly the same heading"""
+    longitude, latitude = get_random_origin(rng)
+    heading = rng.uniform(0, 2 * math.pi)
+
+    coordinates = []
+    for _ in range(number_of_vertices):
+        coordinates.append((round(longitude, COORDINATE_DECIMALS), round(latitude, COORDINATE_DECIMALS)))
+        heading += rng.gauss(0, 0.3)
+        step = rng.uniform(MIN_STEP, MAX_STEP)
+        longitude += step * math.cos(heading)
+        latitude += step * math.sin(heading)
+
+    return coordinates
+
+
+def get_ring_coordinates(rng, number_of_vertices):
+    """Return [(longitude, latitude)] of a closed ring of number_of_vertices + 1 coordinates, the last one repeating
+    the first"""
+    longitude, latitude = get_random_origin(rng)
+    radius = rng.uniform(10 * MIN_STEP, 10 * MAX_STEP)
+
+    coordinates = []
+    for position in range(number_of_vertices):
+        angle = 2 * math.pi * position / number_of_vertices
+        distance = radius * rng.uniform(0.8, 1.2)
+        coordinates.append(
+            (
+                round(longitude + distance * math.cos(angle), COORDINATE_DECIMALS),
+                round(latitude + distance * math.sin(angle), COORDINATE_DECIMALS),
+            )
+        )
+
+    return coordinates + coordinates[:1]
+
+
+def split_ring(rng, coordinates, parts):
+    """Split a closed ring into open parts sharing their end coordinates, shuffled and some of them reversed
+
+    The parts are what merge_rings joins back into the ring.
+    """
+    parts = max(1, min(parts, len(coordinates) - 1))
+    cuts = sorted(rng.sample(range(1, len(coordinates) - 1), parts - 1)) if parts > 1 else []
+    bounds = [0] + cuts + [len(coordinates) - 1]
+
+    ring_parts = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        part = coordinates[start : stop + 1]
+        ring_parts.append(part[::-1] if rng.random() < 0.5 else part)
+
+    rng.shuffle(ring_parts)
+    return ring_parts
+
+
+def get_txt_groups(kind, number_of_features, vertices_per_feature, seed=0, parts=4):
+    """Yield the (name, [(longitude, latitude)]) groups of the synthetic features of a kind
+
+    :param kind: one of TXT_KINDS, multipolygon parts are named feature-part as multipolygon_fixer expects
+    :param vertices_per_feature: vertices of a line or a ring, points have one
+    :param parts: parts every ring of a multipolygon is split into
+    """
+    if kind not in TXT_KINDS:
+        raise ValueError(f"Unknown kind: {kind}, expected one of {TXT_KINDS}")
+
+    rng = random.Random(f"{kind}-{seed}")
+    for position in range(number_of_features):
+        name = str(1000000 + position)
+
+        if kind == POINTS:
+            longitude, latitude = get_random_origin(rng)
+            yield name, [(round(longitude, COORDINATE_DECIMALS), round(latitude, COORDINATE_DECIMALS))]
+        elif kind == LINES:
+            yield name, get_line_coordinates(rng, vertices_per_feature)
+        elif kind == AREAS:
+            yield name, get_ring_coordinates(rng, vertices_per_feature)
+        else:
+            ring = get_ring_coordinates(rng, vertices_per_feature)
+            for part_number, part in enumerate(split_ring(rng, ring, parts), start=1):
+                yield f"{name}-{part_number}", part
+
+
+def generate_txt_file(filepath, kinds=TXT_KINDS, number_of_features=100, vertices_per_feature=100, seed=0, parts=4):
+    """Write a txt list file of synthetic features of the given kinds, return the number of vertices written"""
+    index = 0
+    with open(filepath, mode="w", encoding="utf-8", newline="") as fo:
+        fo.write("\t".join(TXT_LIST_HEADERS) + "\n")
+        for kind in kinds:
+            for name, coordinates in get_txt_groups(kind, number_of_features, vertices_per_feature, seed, parts):
+                for longitude, latitude in coordinates:
+                    fo.write(f"{index}\t{longitude}\t{latitude}\t0\t{name}\n")
+                    index += 1
+
+    return index
+
+
+def generate_osm_file(filepath, number_of_ways=100, vertices_per_way=100, number_of_relations=None, seed=0):
+    """Write an osm xml file of synthetic nodes, ways and multipolygon relations, return the number of way vertices
+
+    Every other way is closed. The way nodes carry their coordinates, as in overpass "out geom" exports, and are
+    also written as node elements. Relations take two consecutive closed ways as their outer and inner members,
+    by default until the closed ways run out.
+    """
+    rng = random.Random(f"osm-{seed}")
+    if number_of_relations is None:
+        number_of_relations = number_of_ways // 4
+
+    ways = []
+    node_ref = 1
+    for position in range(number_of_ways):
+        is_closed = position % 2 == 1
+        if is_closed:
+            coordinates = get_ring_coordinates(rng, vertices_per_way - 1)
+            refs = list(range(node_ref, node_ref + vertices_per_way - 1))
+            refs.append(refs[0])
+        else:
+            coordinates = get_line_coordinates(rng, vertices_per_way)
+            refs = list(range(node_ref, node_ref + vertices_per_way))
+        node_ref += len(set(refs))
+        ways.append((1000000 + position, refs, coordinates, is_closed))
+
+    number_of_vertices = 0
+    with open(filepath, mode="w", encoding="utf-8") as fo:
+        fo.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6" generator="geo-suite benchmarks">\n')
+
+        for _, refs, coordinates, is_closed in ways:
+            for ref, (longitude, latitude) in zip(refs[:-1] if is_closed else refs, coordinates):
+                fo.write(f'  <node id="{ref}" lat="{latitude}" lon="{longitude}"/>\n')
+
+        for way_ref, refs, coordinates, is_closed in ways:
+            fo.write(f'  <way id="{way_ref}">\n')
+            for ref, (longitude, latitude) in zip(refs, coordinates):
+                fo.write(f'    <nd ref="{ref}" lat="{latitude}" lon="{longitude}"/>\n')
+            number_of_vertices += len(refs)
+            fo.write(f'    <tag k="name" v={quoteattr(f"Way {way_ref}")}/>\n')
+            fo.write(f'    <tag k="{"building" if is_closed else "highway"}" v="yes"/>\n')
+            fo.write("  </way>\n")
+
+        closed_ways = [way_ref for way_ref, _, _, is_closed in ways if is_closed]
+        for position in range(min(number_of_relations, len(closed_ways) // 2)):
+            outer, inner = closed_ways[2 * position], closed_ways[2 * position + 1]
+            fo.write(f'  <relation id="{2000000 + position}">\n')
+            fo.write(f'    <member type="way" ref="{outer}" role="outer"/>\n')
+            fo.write(f'    <member type="way" ref="{inner}" role="inner"/>\n')
+            fo.write('    <tag k="type" v="multipolygon"/>\n')
+            fo.write("  </relation>\n")
+
+        fo.write("</osm>\n")
+
+    return number_of_vertices
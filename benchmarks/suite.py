@@ -0,0 +1,246 @@
+"""Timings of the core readers, writers and algorithms on synthetic data
+
+Every benchmark prepares its input once, then its run is timed repeats times and the fastest run is reported with
+the throughput it gives. The peak memory is measured on one more run traced with tracemalloc, it counts the Python
+and numpy allocations of the run but not those of sqlite.
+"""
+import io
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from benchmarks.generators import LINES, MULTIPOLYGON_PARTS, TXT_KINDS, generate_osm_file, generate_txt_file
+from core.kml_file.logic import write_node_group
+from core.osm.loader import osm_loader
+from core.txt_file.read_txt_file import read_txt_file
+from core.txt_file.write_txt_file import txt_list_writer
+from core.utilities import get_peak_memory_usage
+from line_thinner.line_thinner import get_node_coordinate_groups, reduce_points_in_a_line
+from multipolygon_fixer.merge_rings import process_feature_nodes
+
+RESULTS_VERSION = 1
+
+# (features per kind, vertices per feature) of the txt files and (ways, vertices per way) of the osm file
+SIZES = {
+    "small": {"txt": (200, 50), "osm": (200, 50)},
+    "medium": {"txt": (2000, 100), "osm": (2000, 100)},
+    "large": {"txt": (10000, 200), "osm": (10000, 200)},
+}
+DEFAULT_SIZE = "medium"
+DEFAULT_REPEATS = 3
+
+
+def generate_benchmark_data(folder, size=DEFAULT_SIZE, seed=0):
+    """Write the synthetic files of a size to folder, return {name: filepath}"""
+    number_of_features, vertices_per_feature = SIZES[size]["txt"]
+    number_of_ways, vertices_per_way = SIZES[size]["osm"]
+
+    files = {
+        "features": os.path.join(folder, "features.txt"),
+        "lines": os.path.join(folder, "lines.txt"),
+        "multipolygon_parts": os.path.join(folder, "multipolygon_parts.txt"),
+        "osm": os.path.join(folder, "features.osm"),
+    }
+
+    generate_txt_file(files["features"], TXT_KINDS, number_of_features, vertices_per_feature, seed)
+    generate_txt_file(files["lines"], [LINES], number_of_features, vertices_per_feature, seed)
+    generate_txt_file(files["multipolygon_parts"], [MULTIPOLYGON_PARTS], number_of_features, vertices_per_feature, seed)
+    generate_osm_file(files["osm"], number_of_ways, vertices_per_way, seed=seed)
+
+    return files
+
+
+def count_vertices(features):
+    return sum(len(feature) for feature in features)
+
+
+# Every setup function takes the files of generate_benchmark_data and the folder to write outputs in and returns a
+# run function, a run returns the (vertices, bytes) it processed
+
+
+def setup_read_txt_file(files, folder):
+    filepath = files["features"]
+
+    def run():
+        return count_vertices(read_txt_file(filepath)), os.path.getsize(filepath)
+
+    return run
+
+
+def setup_read_txt_file_columnar(files, folder):
+    filepath = files["features"]
+
+    def run():
+        vertices = sum(len(array) for array, _ in read_txt_file(filepath, columnar=True))
+        return vertices, os.path.getsize(filepath)
+
+    return run
+
+
+def setup_txt_list_writer(files, folder):
+    rows = [
+        [node.longitude, node.latitude, node.altitude, node.name]
+        for feature_nodes in read_txt_file(files["features"])
+        for node in feature_nodes
+    ]
+    output_file = os.path.join(folder, "written.txt")
+
+    def run():
+        if os.path.isfile(output_file):
+            os.remove(output_file)
+
+        with txt_list_writer(output_file) as (tsv_writer, last_index):
+            for index, (longitude, latitude, altitude, name) in enumerate(rows, start=last_index + 1):
+                tsv_writer.writerow([index, longitude, latitude, altitude, name])
+
+        return len(rows), os.path.getsize(output_file)
+
+    return run
+
+
+def setup_reduce_points_in_a_line(files, folder):
+    coordinate_groups = [
+        coordinates
+        for feature_nodes in read_txt_file(files["lines"])
+        for _, coordinates in get_node_coordinate_groups(feature_nodes)
+    ]
+
+    def run():
+        for coordinates in coordinate_groups:
+            reduce_points_in_a_line(coordinates, allowed_angle_deviation=5)
+        return count_vertices(coordinate_groups), None
+
+    return run
+
+
+def setup_merge_rings(files, folder):
+    features = list(read_txt_file(files["multipolygon_parts"]))
+
+    def run():
+        for feature_nodes in features:
+            process_feature_nodes(feature_nodes)
+        return count_vertices(features), None
+
+    return run
+
+
+def setup_write_node_group(files, folder):
+    features = list(read_txt_file(files["features"]))
+
+    def run():
+        fp = io.StringIO()
+        for feature_nodes in features:
+            write_node_group(feature_nodes, fp, is_area=True)
+        return count_vertices(features), len(fp.getvalue().encode())
+
+    return run
+
+
+def setup_osm_loader(files, folder):
+    filepath = files["osm"]
+    db_file = os.path.join(folder, "osm.sqlite")
+
+    def run():
+        if os.path.isfile(db_file):
+            os.remove(db_file)
+
+        with osm_loader(filepath, None, db_file, bulk=True) as con:
+            vertices = con.execute("SELECT COUNT(*) FROM way_node").fetchone()[0]
+        return vertices, os.path.getsize(filepath)
+
+    return run
+
+
+BENCHMARKS = {
+    "read_txt_file": setup_read_txt_file,
+    "read_txt_file_columnar": setup_read_txt_file_columnar,
+    "txt_list_writer": setup_txt_list_writer,
+    "reduce_points_in_a_line": setup_reduce_points_in_a_line,
+    "merge_rings": setup_merge_rings,
+    "write_node_group": setup_write_node_group,
+    "osm_loader": setup_osm_loader,
+}
+
+
+def measure(run, repeats=DEFAULT_REPEATS):
+    """Time run repeats times and trace its allocations once, return the result of a benchmark"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vertices, size = run()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        "seconds": seconds,
+        "timings": timings,
+        "vertices": vertices,
+        "bytes": size,
+        "vertices_per_second": vertices / seconds if seconds else None,
+        "megabytes_per_second": size / seconds / (1024 * 1024) if size is not None and seconds else None,
+        "peak_memory": peak_memory,
+    }
+
+
+def get_commit():
+    """Return the git commit of the repository, None when it is not run from a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(folder, names=None, size=DEFAULT_SIZE, repeats=DEFAULT_REPEATS, seed=0):
+    """Generate the data of a size in folder and run the benchmarks of names (all by default)
+
+    Return the results as a json serializable dict.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}, expected some of {list(BENCHMARKS)}")
+
+    files = generate_benchmark_data(folder, size, seed)
+
+    results = {}
+    for name in names:
+        run = BENCHMARKS[name](files, folder)
+        results[name] = measure(run, repeats)
+
+    return {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "size": size,
+        "seed": seed,
+        "repeats": repeats,
+        "benchmarks": results,
+        "peak_rss": get_peak_memory_usage(),
+    }
+
+
+def compare_results(results, baseline):
+    """Return {benchmark: seconds / baseline seconds} of the benchmarks in both results, above 1 is slower"""
+    ratios = {}
+    for name, result in results["benchmarks"].items():
+        baseline_result = baseline["benchmarks"].get(name)
+        if baseline_result and baseline_result["seconds"]:
+            ratios[name] = result["seconds"] / baseline_result["seconds"]
+    return ratios
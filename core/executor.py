@@ -0,0 +1,209 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+BACKENDS = ["thread", "process"]
+DEFAULT_BACKEND = "thread"
+DEFAULT_NUMBER_OF_THREADS = 10
+
+SCHEDULES = ["largest-first", "input-order"]
+DEFAULT_SCHEDULE = "largest-first"
+
+# Items of a staged run read and computed ahead of the item being written
+DEFAULT_QUEUE_SIZE = 64
+
+# Seconds the reader of a staged run waits on a full queue before checking if the run stopped
+QUEUE_POLL_INTERVAL = 0.1
+
+
+def add_executor_arguments(parser):
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="<Optional> Run the files in threads or in processes, use processes to use all cores for CPU bound work",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help=(
+            f"<Optional> Number of threads or processes, defaults to {DEFAULT_NUMBER_OF_THREADS} threads or "
+            "one process per core"
+        ),
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=1,
+        help="<Optional> Number of files sent to a worker at once, larger chunks cut overhead for many small files",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=SCHEDULES,
+        default=DEFAULT_SCHEDULE,
+        help="<Optional> Order the files are started in, largest-first keeps big files from starting last",
+    )
+    parser.add_argument(
+        "--staged",
+        help=(
+            "<Optional> Read, compute and write the features of a file in separate stages joined by bounded queues, "
+            "so reading and writing overlap the computation"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--compute-backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="<Optional> Compute the features of --staged runs in threads or in processes",
+    )
+    parser.add_argument(
+        "--compute-workers",
+        type=int,
+        help="<Optional> Number of threads or processes computing the features of --staged runs",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=(
+            "<Optional> Features read and computed ahead of the one being written in --staged runs, "
+            f"defaults to {DEFAULT_QUEUE_SIZE}"
+        ),
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        help=(
+            "<Optional> Parse each input file in this many processes, splitting it at feature boundaries, "
+            "to use several cores on a single large file. Works best with --columnar"
+        ),
+    )
+
+
+def get_executor(backend=DEFAULT_BACKEND, max_workers=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}, expected one of {BACKENDS}")
+
+    if backend == "process":
+        return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+
+    return ThreadPoolExecutor(max_workers=max_workers or DEFAULT_NUMBER_OF_THREADS)
+
+
+def get_input_size(option):
+    try:
+        return os.path.getsize(option["input_file"])
+    except OSError:
+        return 0
+
+
+def schedule_options(options, schedule=DEFAULT_SCHEDULE):
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Unknown schedule: {schedule}, expected one of {SCHEDULES}")
+
+    if schedule == "largest-first":
+        return sorted(options, key=get_input_size, reverse=True)
+
+    return list(options)
+
+
+def run_chunk(worker, options):
+    return [worker(option) for option in options]
+
+
+def run_workers(worker, options, backend=DEFAULT_BACKEND, max_workers=None, chunksize=1, schedule=DEFAULT_SCHEDULE):
+    """Run worker(option) for every option and yield (option, result) in the order the workers complete
+
+    worker has to be a module level function when using the process backend so it can be sent to the processes.
+    """
+    options = schedule_options(options, schedule=schedule)
+    chunksize = max(1, chunksize)
+    chunks = [options[i : i + chunksize] for i in range(0, len(options), chunksize)]
+
+    with get_executor(backend=backend, max_workers=max_workers) as executor:
+        futures = {executor.submit(run_chunk, worker, chunk): chunk for chunk in chunks}
+
+        for future in as_completed(futures):
+            yield from zip(futures[future], future.result())
+
+
+def run_workers_from_args(worker, options, args):
+    return run_workers(
+        worker,
+        options,
+        backend=args.backend,
+        max_workers=args.workers,
+        chunksize=args.chunksize,
+        schedule=args.schedule,
+    )
+
+
+def get_staged_options(args):
+    """staged_map arguments of the --staged command line options, None when not staged"""
+    if not args.staged:
+        return None
+
+    return {"backend": args.compute_backend, "max_workers": args.compute_workers, "queue_size": args.queue_size}
+
+
+def map_items(function, items, staged_options=None):
+    """Yield function(item) for every item in order, in stages with staged_map when staged_options are given"""
+    if staged_options is None:
+        return map(function, items)
+
+    return staged_map(function, items, **staged_options)
+
+
+def staged_map(function, items, backend=DEFAULT_BACKEND, max_workers=None, queue_size=DEFAULT_QUEUE_SIZE):
+    """Yield function(item) for every item in order, reading the items in a thread and computing them in an executor
+
+    The caller writes the results while the next items are read and computed. At most queue_size items are read
+    ahead of the result being yielded, the reader waits for the caller beyond that. An exception reading the items or
+    computing one is raised when its result is reached, closing the generator stops the reader.
+
+    function has to be a module level function when using the process backend so it can be sent to the processes.
+    """
+    pending = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                pending.put(entry, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    with get_executor(backend=backend, max_workers=max_workers) as executor:
+
+        def read():
+            try:
+                for item in items:
+                    if not put((executor.submit(function, item), None)):
+                        return
+            except BaseException as e:
+                put((None, e))
+                return
+            put((None, None))
+
+        reader = threading.Thread(target=read, name="staged-map-reader", daemon=True)
+        reader.start()
+        try:
+            while True:
+                future, error = pending.get()
+                if error is not None:
+                    raise error
+                if future is None:
+                    break
+                yield future.result()
+        finally:
+            stop.set()
+            reader.join()
+            while not pending.empty():
+                future, _ = pending.get_nowait()
+                if future is not None:
+                    future.cancel()
@@ -1,4 +1,40 @@
-from core.txt_file.logic import is_ring_closed
+import os
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from core.txt_file.columnar import get_array_node_name, get_coordinates, is_array_ring_closed
+from core.txt_file.logic import get_node_name, is_ring_closed
+
+POLYGON = "polygon"
+LINEAR_RING = "linear_ring"
+LINESTRING = "linestring"
+POINT = "point"
+
+# Placemarks of the compact writer, without the indentation of the write_*_placemark templates
+COMPACT_PLACEMARK_TEMPLATES = {
+    POLYGON: (
+        "<Placemark><name>{name}</name><Polygon><altitudeMode>clampToGround</altitudeMode><outerBoundaryIs>"
+        "<LinearRing><altitudeMode>clampToGround</altitudeMode><coordinates>{coordinates}</coordinates></LinearRing>"
+        "</outerBoundaryIs></Polygon></Placemark>\n"
+    ),
+    LINEAR_RING: (
+        "<Placemark><name>{name}</name><LinearRing><extrude>1</extrude><tessellate>1</tessellate>"
+        "<coordinates>{coordinates}</coordinates></LinearRing></Placemark>\n"
+    ),
+    LINESTRING: (
+        "<Placemark><name>{name}</name><LineString><extrude>1</extrude><tessellate>1</tessellate>"
+        "<coordinates>{coordinates}</coordinates></LineString></Placemark>\n"
+    ),
+    POINT: "<Placemark><name>{name}</name><Point><coordinates>{coordinates}</coordinates></Point></Placemark>\n",
+}
+
+
+def get_is_area(input_file):
+    """Features of txt files named ending with "area" are written as polygons"""
+    basename = os.path.basename(input_file)
+    basename_noext = os.path.splitext(basename)[0]
+    return basename_noext.lower().endswith("area")
 
 
 def get_nodes_as_kml_coordinates(nodes):
@@ -9,6 +45,81 @@ def get_node_as_kml_coordinates(node):
     return f"{node['longitude']},{node['latitude']},{node['altitude']}"
 
 
+def get_array_as_kml_coordinates(array):
+    return list(
+        map(
+            "{},{},{}".format,
+            array["longitude"].tolist(),
+            array["latitude"].tolist(),
+            array["altitude"].tolist(),
+        )
+    )
+
+
+def get_geometry_type(number_of_nodes, is_closed, is_area=False):
+    is_ring = is_closed and number_of_nodes > 3
+    if is_ring and is_area:
+        return POLYGON
+    elif is_ring:
+        return LINEAR_RING
+    elif number_of_nodes == 1:
+        return POINT
+    return LINESTRING
+
+
+def format_kml_coordinates(coordinates, precision=None):
+    """Format [longitude, latitude, altitude] coordinates as the text of a kml coordinates element
+
+    coordinates is an (n, 3) array or a flat list of the longitude, latitude and altitude of every node.
+
+    All values are formatted in one operation. Without a precision floats are written in full like
+    get_node_as_kml_coordinates, otherwise rounded to precision decimals, fewer for columns that do not need them
+    (e.g. altitudes of 0).
+    """
+    if precision is None:
+        values = coordinates.ravel().tolist() if isinstance(coordinates, np.ndarray) else coordinates
+        coordinate_format = "%r,%r,%r"
+    else:
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+        values = coordinates.ravel().tolist()
+        coordinate_format = ",".join(
+            f"%.{get_column_decimals(coordinates[:, column], precision)}f" for column in range(3)
+        )
+
+    return " ".join([coordinate_format] * (len(values) // 3)) % tuple(values)
+
+
+def get_column_decimals(values, precision):
+    """Fewest decimals up to precision giving the same rounded values as precision decimals"""
+    rounded = np.round(values, precision)
+    for decimals in range(precision):
+        if np.array_equal(np.round(values, decimals), rounded):
+            return decimals
+    return precision
+
+
+def write_compact_placemark(geometry_type, name, coordinates, fp, precision=None):
+    fp.write(
+        COMPACT_PLACEMARK_TEMPLATES[geometry_type].format(
+            name=escape(name), coordinates=format_kml_coordinates(coordinates, precision=precision)
+        )
+    )
+
+
+def write_compact_node_group(nodes, fp, is_area=False, precision=None):
+    """Same placemarks as write_node_group without indentation, coordinates can be rounded to precision"""
+    geometry_type = get_geometry_type(len(nodes), is_ring_closed(nodes), is_area=is_area)
+    coordinates = [value for node in nodes for value in (node["longitude"], node["latitude"], node["altitude"])]
+    write_compact_placemark(geometry_type, get_node_name(nodes[0]), coordinates, fp, precision=precision)
+
+
+def write_compact_feature_array(array, metadata, fp, is_area=False, precision=None):
+    # Same as write_compact_node_group for a feature from read_txt_file(..., columnar=True)
+    geometry_type = get_geometry_type(len(array), is_array_ring_closed(array), is_area=is_area)
+    name = get_array_node_name(array, metadata)
+    write_compact_placemark(geometry_type, name, get_coordinates(array), fp, precision=precision)
+
+
 def write_node_group(nodes, fp, is_area=False):
     number_of_nodes = len(nodes)
     is_ring = is_ring_closed(nodes) and number_of_nodes > 3
@@ -22,11 +133,42 @@ def write_node_group(nodes, fp, is_area=False):
         write_linestring(nodes, fp)
 
 
+def write_feature_array(array, metadata, fp, is_area=False):
+    # Same as write_node_group for a feature from read_txt_file(..., columnar=True)
+    number_of_nodes = len(array)
+    name = get_array_node_name(array, metadata)
+    coordinates = get_array_as_kml_coordinates(array)
+    is_ring = is_array_ring_closed(array) and number_of_nodes > 3
+    if is_ring and is_area:
+        write_polygon_placemark(name, coordinates, fp)
+    elif is_ring:
+        write_linear_ring_placemark(name, coordinates, fp)
+    elif number_of_nodes == 1:
+        write_point_placemark(name, coordinates[0], fp)
+    else:
+        write_linestring_placemark(name, coordinates, fp)
+
+
 def write_polygon(nodes, fp):
-    coordinates = get_nodes_as_kml_coordinates(nodes)
+    write_polygon_placemark(get_node_name(nodes[0]), get_nodes_as_kml_coordinates(nodes), fp)
+
+
+def write_linestring(nodes, fp):
+    write_linestring_placemark(get_node_name(nodes[0]), get_nodes_as_kml_coordinates(nodes), fp)
+
+
+def write_linear_ring(nodes, fp):
+    write_linear_ring_placemark(get_node_name(nodes[0]), get_nodes_as_kml_coordinates(nodes), fp)
+
+
+def write_point(node, fp):
+    write_point_placemark(get_node_name(node), get_node_as_kml_coordinates(node), fp)
+
+
+def write_polygon_placemark(name, coordinates, fp):
     placemark = f"""\n
     <Placemark>
-        <name>{nodes[0]["name"] + ("-" + nodes[0]["sub_name"] if nodes[0]["sub_name"] else "")}</name>
+        <name>{name}</name>
         <Polygon>
             <altitudeMode>clampToGround</altitudeMode>
             <outerBoundaryIs>
@@ -42,9 +184,7 @@ def write_polygon(nodes, fp):
     fp.write(placemark)
 
 
-def write_linestring(nodes, fp):
-    coordinates = get_nodes_as_kml_coordinates(nodes)
-    name = nodes[0]["name"] + ("-" + nodes[0]["sub_name"] if nodes[0]["sub_name"] else "")
+def write_linestring_placemark(name, coordinates, fp):
     placemark = f"""\n
     <Placemark>
         <name>{name}</name>
@@ -59,10 +199,7 @@ def write_linestring(nodes, fp):
     fp.write(placemark)
 
 
-def write_linear_ring(nodes, fp):
-    coordinates = get_nodes_as_kml_coordinates(nodes)
-    name = nodes[0]["name"] + ("-" + nodes[0]["sub_name"] if nodes[0]["sub_name"] else "")
-
+def write_linear_ring_placemark(name, coordinates, fp):
     placemark = f"""\n
     <Placemark>
         <name>{name}</name>
@@ -77,9 +214,7 @@ def write_linear_ring(nodes, fp):
     fp.write(placemark)
 
 
-def write_point(node, fp):
-    coordinate = get_node_as_kml_coordinates(node)
-    name = node["name"] + ("-" + node["sub_name"] if node["sub_name"] else "")
+def write_point_placemark(name, coordinate, fp):
     placemark = f"""\n
     <Placemark>
         <name>{name}</name>
@@ -0,0 +1,240 @@
+"""Tiled kml output, features are split into tiles written as separate kml files
+
+A root kml links every tile with a NetworkLink inside a Region, so viewers only load the tiles in view. Features
+are assigned to the tile containing the center of their bounding box, the region of a tile covers its cell and the
+bounding boxes of its features.
+"""
+import os
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from core.executor import DEFAULT_BACKEND, run_workers
+from core.kml_file.write_kml_file import (
+    COMPACT_KML_FOOTER,
+    COMPACT_KML_HEADER,
+    DEFAULT_KMZ_COMPRESSION_LEVEL,
+    get_kml_output_filepath,
+    kml_writer,
+)
+from core.txt_file.read_txt_file import read_txt_file
+
+TILING_SCHEMES = ["grid", "quadtree"]
+DEFAULT_GRID_SIZE = 4
+DEFAULT_MAX_FEATURES_PER_TILE = 1000
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_MIN_LOD_PIXELS = 128
+
+# Size in degrees given to tile regions without a width or height, e.g. a tile of a single point
+MIN_REGION_SIZE = 1e-4
+
+NETWORK_LINK_TEMPLATE = (
+    "<NetworkLink><name>{name}</name><Region><LatLonAltBox><north>{north!r}</north><south>{south!r}</south>"
+    "<east>{east!r}</east><west>{west!r}</west></LatLonAltBox><Lod><minLodPixels>{min_lod_pixels}</minLodPixels>"
+    "<maxLodPixels>{max_lod_pixels}</maxLodPixels></Lod></Region><Link><href>{href}</href>"
+    "<viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>\n"
+)
+
+
+def get_feature_bboxes(arrays):
+    """Return a (n, 4) array of the west, south, east, north bounds of every feature array"""
+    bboxes = np.empty((len(arrays), 4), dtype=np.float64)
+    for i, array in enumerate(arrays):
+        longitudes = array["longitude"]
+        latitudes = array["latitude"]
+        bboxes[i] = (longitudes.min(), latitudes.min(), longitudes.max(), latitudes.max())
+    return bboxes
+
+
+def get_bbox_centers(bboxes):
+    return (bboxes[:, 0] + bboxes[:, 2]) / 2, (bboxes[:, 1] + bboxes[:, 3]) / 2
+
+
+def get_extent(bboxes):
+    return bboxes[:, 0].min(), bboxes[:, 1].min(), bboxes[:, 2].max(), bboxes[:, 3].max()
+
+
+def grid_tiles(bboxes, grid_size=DEFAULT_GRID_SIZE):
+    """Split the extent of the features in grid_size x grid_size cells
+
+    Return {tile name: (cell bounds, feature positions)} for the cells containing features.
+    """
+    west, south, east, north = get_extent(bboxes)
+    longitudes, latitudes = get_bbox_centers(bboxes)
+
+    cell_width = (east - west) / grid_size
+    cell_height = (north - south) / grid_size
+    columns = get_cell_numbers(longitudes, west, cell_width, grid_size)
+    rows = get_cell_numbers(latitudes, south, cell_height, grid_size)
+
+    tiles = {}
+    for column, row in sorted(set(zip(columns.tolist(), rows.tolist()))):
+        positions = np.flatnonzero((columns == column) & (rows == row))
+        cell = (
+            west + column * cell_width,
+            south + row * cell_height,
+            west + (column + 1) * cell_width,
+            south + (row + 1) * cell_height,
+        )
+        tiles[f"{column}_{row}"] = (cell, positions)
+    return tiles
+
+
+def get_cell_numbers(values, start, cell_size, grid_size):
+    if cell_size == 0:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.clip(((values - start) / cell_size).astype(np.int64), 0, grid_size - 1)
+
+
+def quadtree_tiles(bboxes, max_features=DEFAULT_MAX_FEATURES_PER_TILE, max_depth=DEFAULT_MAX_DEPTH):
+    """Split the extent of the features in quadrants until a tile has at most max_features features
+
+    Tiles are named by their quadkey, the digits 0-3 of the quadrant taken at every level (0 for the root).
+    Return {tile name: (cell bounds, feature positions)} for the cells containing features.
+    """
+    longitudes, latitudes = get_bbox_centers(bboxes)
+
+    tiles = {}
+    cells = [("0", get_extent(bboxes), np.arange(len(bboxes)))]
+    while cells:
+        name, cell, positions = cells.pop()
+        if len(positions) <= max_features or len(name) > max_depth:
+            tiles[name] = (cell, positions)
+            continue
+
+        west, south, east, north = cell
+        middle_longitude = (west + east) / 2
+        middle_latitude = (south + north) / 2
+        is_east = longitudes[positions] >= middle_longitude
+        is_north = latitudes[positions] >= middle_latitude
+
+        quadrants = [
+            ((west, middle_latitude, middle_longitude, north), ~is_east & is_north),
+            ((middle_longitude, middle_latitude, east, north), is_east & is_north),
+            ((west, south, middle_longitude, middle_latitude), ~is_east & ~is_north),
+            ((middle_longitude, south, east, middle_latitude), is_east & ~is_north),
+        ]
+        for quadrant, (quadrant_cell, mask) in reversed(list(enumerate(quadrants))):
+            if mask.any():
+                cells.append((f"{name}{quadrant}", quadrant_cell, positions[mask]))
+
+    return dict(sorted(tiles.items()))
+
+
+def get_region(cell, bboxes):
+    """Bounds covering the cell of a tile and the bounding boxes of its features"""
+    west, south, east, north = get_extent(np.vstack([bboxes, cell]))
+
+    if east - west < MIN_REGION_SIZE:
+        west, east = west - MIN_REGION_SIZE / 2, east + MIN_REGION_SIZE / 2
+    if north - south < MIN_REGION_SIZE:
+        south, north = south - MIN_REGION_SIZE / 2, north + MIN_REGION_SIZE / 2
+
+    return west, south, east, north
+
+
+def write_tile(option):
+    """Write the features of a tile to its kml, return the number of features written"""
+    with kml_writer(
+        option["output_file"],
+        compact=option["compact"],
+        precision=option["precision"],
+        kmz=option["kmz"],
+        compression_level=option["compression_level"],
+    ) as write_node_group:
+        for array, metadata in option["features"]:
+            write_node_group(array, metadata=metadata, is_area=option["is_area"])
+
+    return len(option["features"])
+
+
+def write_root_document(filepath, network_links):
+    """Write a kml of NetworkLinks given as (name, href, (west, south, east, north), (min, max lod pixels)) tuples
+
+    A max lod pixels of -1 keeps the link loaded however large its region gets on screen.
+    """
+    with open(filepath, mode="w", encoding="utf-8", newline="") as fo:
+        fo.write(COMPACT_KML_HEADER)
+        for name, href, (west, south, east, north), (min_lod_pixels, max_lod_pixels) in network_links:
+            fo.write(
+                NETWORK_LINK_TEMPLATE.format(
+                    name=escape(name),
+                    href=escape(href),
+                    north=float(north),
+                    south=float(south),
+                    east=float(east),
+                    west=float(west),
+                    min_lod_pixels=min_lod_pixels,
+                    max_lod_pixels=max_lod_pixels,
+                )
+            )
+        fo.write(COMPACT_KML_FOOTER)
+
+
+def write_tiled_kml(
+    input_file,
+    output_file,
+    scheme="quadtree",
+    grid_size=DEFAULT_GRID_SIZE,
+    max_features=DEFAULT_MAX_FEATURES_PER_TILE,
+    max_depth=DEFAULT_MAX_DEPTH,
+    min_lod_pixels=DEFAULT_MIN_LOD_PIXELS,
+    is_area=False,
+    compact=False,
+    precision=None,
+    kmz=False,
+    compression_level=DEFAULT_KMZ_COMPRESSION_LEVEL,
+    backend=DEFAULT_BACKEND,
+    max_workers=None,
+):
+    """Write the features of a txt file as tiles and a root kml linking them
+
+    The root is written to output_file (.kml) and the tiles to a folder next to it named after it with a _tiles
+    suffix. Tiles are written in parallel with the given executor backend, largest first.
+    Return the number of tiles written.
+    """
+    if scheme not in TILING_SCHEMES:
+        raise ValueError(f"Unknown tiling scheme: {scheme}, expected one of {TILING_SCHEMES}")
+
+    features = list(read_txt_file(input_file, columnar=True))
+
+    root_filepath = get_kml_output_filepath(output_file)
+    tiles_folder_name = os.path.splitext(os.path.basename(root_filepath))[0] + "_tiles"
+    tiles_folder = os.path.join(os.path.dirname(root_filepath), tiles_folder_name)
+    os.makedirs(tiles_folder, exist_ok=True)
+
+    if not features:
+        write_root_document(root_filepath, [])
+        return 0
+
+    bboxes = get_feature_bboxes([array for array, _ in features])
+    if scheme == "grid":
+        tiles = grid_tiles(bboxes, grid_size=grid_size)
+    else:
+        tiles = quadtree_tiles(bboxes, max_features=max_features, max_depth=max_depth)
+
+    extension = ".kmz" if kmz else ".kml"
+    network_links = []
+    tile_options = []
+    for name, (cell, positions) in tiles.items():
+        tile_filename = f"tile_{name}{extension}"
+        region = get_region(cell, bboxes[positions])
+        network_links.append((name, f"{tiles_folder_name}/{tile_filename}", region, (min_lod_pixels, -1)))
+        tile_options.append(
+            {
+                "output_file": os.path.join(tiles_folder, tile_filename),
+                "features": [features[i] for i in positions.tolist()],
+                "is_area": is_area,
+                "compact": compact,
+                "precision": precision,
+                "kmz": kmz,
+                "compression_level": compression_level,
+            }
+        )
+
+    tile_options.sort(key=lambda option: sum(len(array) for array, _ in option["features"]), reverse=True)
+    for _ in run_workers(write_tile, tile_options, backend=backend, max_workers=max_workers, schedule="input-order"):
+        pass
+
+    write_root_document(root_filepath, network_links)
+    return len(tiles)
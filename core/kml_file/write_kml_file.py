@@ -1,35 +1,134 @@
+import io
 import os
+import zipfile
 from contextlib import contextmanager
+from functools import partial
 
-from core.kml_file.logic import write_node_group
+from core.kml_file.logic import (
+    write_compact_feature_array,
+    write_compact_node_group,
+    write_feature_array,
+    write_node_group,
+)
 
+# Bytes buffered in memory before they are written to the file
+DEFAULT_KML_BUFFER_SIZE = 4 * 1024 * 1024
 
-@contextmanager
-def kml_writer(filepath):
-    mode = "w"
+COMPACT_KML_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document id="root_doc">\n'
+)
+COMPACT_KML_FOOTER = "</Document></kml>\n"
+
+# Document start and end of the indented writer, kept byte for byte as it has always written them
+KML_HEADER = """<?xml version="1.0" encoding="utf-8" ?>
+                <kml xmlns="http://www.opengis.net/kml/2.2">
+                    <Document id="root_doc">")
+            """
+KML_FOOTER = "\n</Document></kml>"
+
+# Name of the kml document inside a kmz archive
+KMZ_DOCUMENT_NAME = "doc.kml"
+DEFAULT_KMZ_COMPRESSION_LEVEL = 6
+
+
+def get_kml_output_filepath(filepath, kmz=False):
+    extension = ".kmz" if kmz else ".kml"
 
-    if not filepath.endswith(".kml"):
-        filepath = f"{filepath}.kml"
+    if kmz and filepath.endswith(".kml"):
+        filepath = filepath[: -len(".kml")]
+
+    if not filepath.endswith(extension):
+        filepath = f"{filepath}{extension}"
 
     filepath = os.path.abspath(os.path.join(filepath))
 
     if not os.path.isdir(os.path.dirname(filepath)):
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
-    with open(filepath, mode=mode, encoding="utf-8", newline="") as fo:
+    return filepath
 
-        def write_node_group_callback(nodes, **kwargs):
-            write_node_group(nodes, fo, **kwargs)
 
-        fo.write(
-            """<?xml version="1.0" encoding="utf-8" ?>
-                <kml xmlns="http://www.opengis.net/kml/2.2">
-                    <Document id="root_doc">")
-            """
-        )
+@contextmanager
+def open_kml_output(filepath, kmz=False, compression_level=DEFAULT_KMZ_COMPRESSION_LEVEL, buffer_size=None):
+    """Open a text stream for a kml document, written as the doc.kml entry of a kmz archive when kmz is True
+
+    The kmz entry is compressed while it is written, the document is never held in memory or on disk uncompressed.
+    """
+    if not kmz:
+        with open(filepath, mode="w", encoding="utf-8", newline="", buffering=buffer_size or -1) as fo:
+            yield fo
+        return
+
+    with zipfile.ZipFile(filepath, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zf:
+        with zf.open(KMZ_DOCUMENT_NAME, mode="w", force_zip64=True) as entry:
+            buffered = io.BufferedWriter(entry, buffer_size=buffer_size or io.DEFAULT_BUFFER_SIZE)
+            with io.TextIOWrapper(buffered, encoding="utf-8", newline="") as fo:
+                yield fo
+
+
+@contextmanager
+def kml_document(
+    filepath,
+    compact=False,
+    buffer_size=DEFAULT_KML_BUFFER_SIZE,
+    kmz=False,
+    compression_level=DEFAULT_KMZ_COMPRESSION_LEVEL,
+):
+    """Open a kml file with the document started and yield the text stream to write placemarks to
+
+    Placemarks formatted by format_kml_feature can be written to it as they are.
+    """
+    filepath = get_kml_output_filepath(filepath, kmz=kmz)
+
+    with open_kml_output(filepath, kmz=kmz, compression_level=compression_level, buffer_size=buffer_size) as fo:
+        fo.write(COMPACT_KML_HEADER if compact else KML_HEADER)
         try:
-            yield write_node_group_callback
+            yield fo
         except Exception as e:
             raise Exception(f"KML writing failed: {filepath}") from e
         finally:
-            fo.write("\n</Document></kml>")
+            fo.write(COMPACT_KML_FOOTER if compact else KML_FOOTER)
+
+
+def write_kml_feature(fo, nodes, metadata=None, compact=False, precision=None, **kwargs):
+    """Write a feature as a placemark, columnar features are given as an array with its metadata"""
+    if compact:
+        if metadata is not None:
+            write_compact_feature_array(nodes, metadata, fo, precision=precision, **kwargs)
+        else:
+            write_compact_node_group(nodes, fo, precision=precision, **kwargs)
+        return
+
+    if metadata is not None:
+        write_feature_array(nodes, metadata, fo, **kwargs)
+    else:
+        write_node_group(nodes, fo, **kwargs)
+
+
+def format_kml_feature(nodes, metadata=None, compact=False, precision=None, **kwargs):
+    """Return the placemark write_kml_feature writes for the feature"""
+    fo = io.StringIO()
+    write_kml_feature(fo, nodes, metadata=metadata, compact=compact, precision=precision, **kwargs)
+    return fo.getvalue()
+
+
+@contextmanager
+def kml_writer(
+    filepath,
+    compact=False,
+    precision=None,
+    buffer_size=DEFAULT_KML_BUFFER_SIZE,
+    kmz=False,
+    compression_level=DEFAULT_KMZ_COMPRESSION_LEVEL,
+):
+    """Open a kml file and yield a callback writing a feature as a placemark
+
+    :param compact: write placemarks without indentation, formatting the coordinates of a feature at once
+    :param precision: decimals of the coordinates in compact mode, written in full when None
+    :param kmz: write a .kmz archive, streaming the document into its compressed doc.kml entry
+    :param compression_level: zlib compression level of the kmz entry, 0 (none) to 9 (smallest)
+    """
+    with kml_document(
+        filepath, compact=compact, buffer_size=buffer_size, kmz=kmz, compression_level=compression_level
+    ) as fo:
+        yield partial(write_kml_feature, fo, compact=compact, precision=precision)
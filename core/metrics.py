@@ -0,0 +1,259 @@
+"""Per file metrics of the command line tools
+
+With --metrics-out every input file gets a JSON line with its wall time, the time spent in each stage, the features
+and vertices read and written, the bytes read and written and optionally the tracemalloc peak memory. Stage times
+are exclusive: time spent reading the next feature while writing is counted as reading. Work a tool does not split
+is counted in the stage doing it, e.g. placemarks formatted while they are written count as writing unless --staged.
+In --staged runs the stages run in several threads at once, so their times can add up to more than the wall time.
+
+With --profile every file is run under cProfile and the stats of the slowest one are dumped for pstats.
+"""
+import cProfile
+import json
+import marshal
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+from core.executor import map_items, run_workers_from_args
+
+READ = "read"
+COMPUTE = "compute"
+WRITE = "write"
+STAGES = [READ, COMPUTE, WRITE]
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument(
+        "--metrics-out",
+        help=(
+            "<Optional> JSON lines file to append the metrics of every input file to: wall time per stage, feature "
+            "and vertex counts and bytes read and written"
+        ),
+    )
+    parser.add_argument(
+        "--trace-memory",
+        help="<Optional> Add the tracemalloc peak memory of every file to --metrics-out, slows the run down",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="<Optional> Profile every file with cProfile and dump the stats of the slowest one to this file",
+    )
+
+
+def get_metrics_options(args):
+    """measure_worker arguments of the metrics command line options, None when no metrics are asked for"""
+    if not (args.metrics_out or args.profile):
+        return None
+
+    return {"trace_memory": args.trace_memory, "profile": bool(args.profile)}
+
+
+class FileMetrics:
+    """Stage times and counts of a run over one input file, safe to update from several threads"""
+
+    def __init__(self, input_file, output_file=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.stage_times = {stage: 0.0 for stage in STAGES}
+        self.counts = {"features_read": 0, "vertices_read": 0, "features_written": 0, "vertices_written": 0}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def add_time(self, stage, seconds):
+        # Time of the None stage, waiting on another stage, is not counted
+        if stage is None:
+            return
+        with self.lock:
+            self.stage_times[stage] += seconds
+
+    def add_count(self, key, value):
+        with self.lock:
+            self.counts[key] += value
+
+    @contextmanager
+    def stage(self, name):
+        """Count the time of the block in stage name, pausing the stage of the block it is in"""
+        stack = self.get_stack()
+        now = time.perf_counter()
+        if stack:
+            self.add_time(stack[-1][0], now - stack[-1][1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.add_time(name, now - stack.pop()[1])
+            if stack:
+                stack[-1][1] = now
+
+    def iterate(self, features, get_vertices=len):
+        """Yield the features counting them and the time taking the next one as reading"""
+        iterator = iter(features)
+        while True:
+            with self.stage(READ):
+                try:
+                    feature = next(iterator)
+                except StopIteration:
+                    return
+            self.add_count("features_read", 1)
+            self.add_count("vertices_read", get_vertices(feature))
+            yield feature
+
+    def map(self, function, items, staged_options=None):
+        """map_items(function, items, staged_options) counting the time of the function calls as computing"""
+        results = map_items(partial(timed_call, function), items, staged_options)
+        while True:
+            # Waiting for the next result is not counted, the items are read and computed in their own stages
+            with self.stage(None):
+                try:
+                    result, seconds = next(results)
+                except StopIteration:
+                    return
+            self.add_time(COMPUTE, seconds)
+            yield result
+
+    def to_dict(self):
+        return {
+            "input_file": self.input_file,
+            "output_file": self.output_file,
+            "stages": dict(self.stage_times),
+            **self.counts,
+        }
+
+
+def get_feature_vertices(feature):
+    # A list of nodes or a (array, metadata) tuple of read_txt_file(..., columnar=True)
+    return len(feature[0]) if isinstance(feature, tuple) else len(feature)
+
+
+def timed_call(function, item):
+    """Return function(item) and the seconds it took, module level so it can be sent to processes"""
+    start = time.perf_counter()
+    result = function(item)
+    return result, time.perf_counter() - start
+
+
+# Helpers taking the metrics of a worker, None when no metrics are recorded so the plain code path runs
+
+
+def measure_stage(metrics, name):
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def measure_reading(metrics, features):
+    return metrics.iterate(features, get_feature_vertices) if metrics is not None else features
+
+
+def measure_map(metrics, function, items, staged_options=None):
+    if metrics is None:
+        return map_items(function, items, staged_options)
+    return metrics.map(function, items, staged_options)
+
+
+def count_written(metrics, features, vertices):
+    if metrics is not None:
+        metrics.add_count("features_written", features)
+        metrics.add_count("vertices_written", vertices)
+
+
+def get_file_size(filepath):
+    try:
+        return os.path.getsize(filepath)
+    except (OSError, TypeError):
+        return None
+
+
+def measure_worker(worker, metrics_options, option):
+    """Run worker(option, metrics=...) and return (result, metrics record, cProfile stats or None)
+
+    Module level so it can be sent to processes with the worker.
+    """
+    metrics = FileMetrics(option["input_file"], option.get("output_file"))
+    bytes_read = get_file_size(option["input_file"])
+
+    if metrics_options["trace_memory"]:
+        if tracemalloc.is_tracing():
+            # The peak is shared by the files run at the same time in threads
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+
+    profiler = None
+    if metrics_options["profile"]:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another file of this process is being profiled, only one profiler can run at once on Python 3.12+
+            profiler = None
+
+    start = time.perf_counter()
+    try:
+        result = worker(option, metrics=metrics)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    wall_time = time.perf_counter() - start
+
+    record = metrics.to_dict()
+    record.update(
+        {
+            "wall_time": wall_time,
+            "bytes_read": bytes_read,
+            "bytes_written": get_file_size(option.get("output_file")),
+            "peak_memory": tracemalloc.get_traced_memory()[1] if metrics_options["trace_memory"] else None,
+        }
+    )
+
+    stats = None
+    if profiler is not None:
+        profiler.create_stats()
+        stats = profiler.stats
+
+    return result, record, stats
+
+
+def run_measured_workers(worker, options, args):
+    """run_workers_from_args(worker, options, args), recording the metrics asked for on the command line
+
+    worker is called as worker(option, metrics=FileMetrics(...)) when metrics are recorded.
+    """
+    metrics_options = get_metrics_options(args)
+    if metrics_options is None:
+        yield from run_workers_from_args(worker, options, args)
+        return
+
+    slowest = None
+    metrics_file = open(args.metrics_out, mode="a", encoding="utf-8") if args.metrics_out else None
+    try:
+        for option, (result, record, stats) in run_workers_from_args(
+            partial(measure_worker, worker, metrics_options), options, args
+        ):
+            if metrics_file:
+                metrics_file.write(json.dumps(record) + "\n")
+                metrics_file.flush()
+
+            if stats is not None and (slowest is None or record["wall_time"] > slowest[0]["wall_time"]):
+                slowest = (record, stats)
+
+            yield option, result
+    finally:
+        if metrics_file:
+            metrics_file.close()
+        if metrics_options["trace_memory"] and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    if args.profile and slowest is not None:
+        with open(args.profile, "wb") as fo:
+            marshal.dump(slowest[1], fo)
+        print(f"Profile of the slowest file {slowest[0]['input_file']} written to {args.profile}")
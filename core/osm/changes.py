@@ -0,0 +1,213 @@
+"""Apply osmChange (.osc) files, e.g. the daily diffs of a planet extract, to an osm_loader database
+
+The file is streamed and its elements are applied in batches in a single transaction, a failed update leaves the
+database as it was, the journal needed for that is turned back on when the connection has journal_mode OFF. An
+element written again by create or modify replaces the rows of the feature, so the last version of a feature in the
+file is kept.
+
+Touched features are marked in the dirty_features table with the last action applied to them. The ways of changed
+nodes and the relations of changed nodes and ways are marked modified too, as their geometry changed, so exports
+can regenerate the features of get_dirty_refs and clear_dirty_features once they are done.
+"""
+import xml.etree.ElementTree as ET
+
+from core.osm.loader import DEFAULT_BATCH_SIZE, OsmRowWriter, get_pragmas, set_pragmas
+from core.osm.spatial_index import has_spatial_index, update_spatial_index
+
+CREATE = "create"
+MODIFY = "modify"
+DELETE = "delete"
+ACTIONS = [CREATE, MODIFY, DELETE]
+
+# Rows of a feature removed before it is written again or deleted, feature type: [(table, ref column)]
+FEATURE_ROWS = {
+    "node": [("nodes", "ref")],
+    "way": [("ways", "ref"), ("way_node", "way_ref")],
+    "relation": [("relations", "ref"), ("relation_way", "relation_ref"), ("relation_node", "relation_ref")],
+}
+
+# Indexes finding the ways and relations of changed members, created by the first update of a database
+CHANGE_INDEXES = {
+    "way_node_node_ref": "way_node (node_ref)",
+    "relation_way_way_ref": "relation_way (way_ref)",
+    "relation_node_node_ref": "relation_node (node_ref)",
+}
+
+# action is the last action applied to the feature
+DIRTY_COLUMNS = (
+    "feature_type TEXT NOT NULL, ref INTEGER NOT NULL, action TEXT NOT NULL, PRIMARY KEY (feature_type, ref)"
+)
+
+# Ways and relations marked modified when their members changed:
+# (feature type, membership table, feature column, member column, member type), relations after the ways
+DEPENDENT_FEATURES = [
+    ("way", "way_node", "way_ref", "node_ref", "node"),
+    ("relation", "relation_node", "relation_ref", "node_ref", "node"),
+    ("relation", "relation_way", "relation_ref", "way_ref", "way"),
+]
+
+
+def create_change_tables(con):
+    """Create the dirty_features table and the CHANGE_INDEXES if the database has none yet"""
+    con.execute(f"CREATE TABLE IF NOT EXISTS dirty_features ({DIRTY_COLUMNS})")
+    for index, columns in CHANGE_INDEXES.items():
+        con.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {columns}")
+    con.commit()
+
+
+def get_feature_rows(elem):
+    """Return the (table, row) of the rows of a node, way or relation element and its tags"""
+    feature_type = elem.tag
+    ref = int(elem.attrib["id"])
+    if feature_type == "node":
+        rows = [("nodes", (ref, float(elem.attrib["lat"]), float(elem.attrib["lon"])))]
+    else:
+        rows = [(f"{feature_type}s", (ref,))]
+
+    sequence_id = 0
+    for child in elem:
+        if child.tag == "tag":
+            rows.append(("tags", (child.attrib["k"], child.attrib["v"], ref, feature_type)))
+        elif child.tag == "nd":
+            rows.append(("way_node", (int(child.attrib["ref"]), ref, sequence_id)))
+            sequence_id += 1
+        elif child.tag == "member" and child.attrib["type"] in ["node", "way"]:
+            member_row = (int(child.attrib["ref"]), ref, child.attrib.get("role", ""))
+            rows.append((f"relation_{child.attrib['type']}", member_row))
+
+    return rows
+
+
+def apply_batch(con, writer, batch):
+    """Remove the rows of the features of batch and write their new rows
+
+    :param batch: {(feature type, ref): (action, rows)} of the last version of every feature of the batch
+    """
+    for feature_type, tables in FEATURE_ROWS.items():
+        refs = [(ref,) for batch_type, ref in batch if batch_type == feature_type]
+        if not refs:
+            continue
+
+        for table, column in tables:
+            con.executemany(f"DELETE FROM {table} WHERE {column} = ?", refs)
+        con.executemany(
+            "DELETE FROM tags WHERE feature_ref = ? AND feature_type = ?", [(ref, feature_type) for ref, in refs]
+        )
+
+    for action, rows in batch.values():
+        if action != DELETE:
+            for table, row in rows:
+                writer.add(table, row)
+    writer.flush(commit=False)
+
+    con.executemany(
+        "INSERT OR REPLACE INTO changed_features VALUES(?, ?, ?)",
+        [(feature_type, ref, action) for (feature_type, ref), (action, _) in batch.items()],
+    )
+
+
+def apply_osm_changes(con, filepath, batch_size=DEFAULT_BATCH_SIZE, node_locations=None):
+    """Apply the create, modify and delete actions of an osmChange file to an osm_loader database
+
+    The boxes of the changed features are computed again when the database has a spatial index.
+
+    :param batch_size: features applied at once
+    :param node_locations: NodeLocationStore to add the coordinates of created and modified nodes to, it is not
+        rolled back with the database and keeps the coordinates of deleted nodes
+    :return: {action: number of elements applied}
+
+    The rollback of a failed update needs the rollback journal, a connection with journal_mode OFF, e.g. tuned as
+    BULK_INGEST_PRAGMAS, is switched to the DELETE journal mode first.
+    """
+    if get_pragmas(con, ["journal_mode"])["journal_mode"].lower() == "off":
+        set_pragmas(con, {"journal_mode": "DELETE"})
+        if get_pragmas(con, ["journal_mode"])["journal_mode"].lower() == "off":
+            raise ValueError("apply_osm_changes cannot run with journal_mode OFF, a failed update could not roll back")
+
+    create_change_tables(con)
+    con.execute(f"CREATE TEMP TABLE IF NOT EXISTS changed_features ({DIRTY_COLUMNS})")
+    con.execute("DELETE FROM changed_features")
+
+    writer = OsmRowWriter(con, batch_size=batch_size)
+    counts = {action: 0 for action in ACTIONS}
+    batch = {}
+    try:
+        # Open elements of the file: osmChange, action, feature, then its children
+        path = []
+        for event, elem in ET.iterparse(filepath, events=("start", "end")):
+            if event == "start":
+                path.append(elem)
+                continue
+
+            path.pop()
+            if len(path) != 2 or elem.tag not in FEATURE_ROWS:
+                continue
+
+            action = path[1].tag
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown osmChange action: {action}")
+
+            rows = get_feature_rows(elem) if action != DELETE else []
+            if node_locations is not None and elem.tag == "node" and action != DELETE:
+                node_locations.add(int(elem.attrib["id"]), float(elem.attrib["lon"]), float(elem.attrib["lat"]))
+
+            # A feature changed twice in a batch keeps its last version
+            batch[(elem.tag, int(elem.attrib["id"]))] = (action, rows)
+            counts[action] += 1
+            if len(batch) >= batch_size:
+                apply_batch(con, writer, batch)
+                batch = {}
+
+            # The feature and its children are applied, drop them from the tree
+            path[1].clear()
+
+        if batch:
+            apply_batch(con, writer, batch)
+
+        for feature_type, table, feature_column, member_column, member_type in DEPENDENT_FEATURES:
+            con.execute(
+                f"INSERT OR IGNORE INTO changed_features SELECT DISTINCT ?, {table}.{feature_column}, ? FROM {table} "
+                f"JOIN changed_features ON changed_features.ref = {table}.{member_column} "
+                "AND changed_features.feature_type = ?",
+                (feature_type, MODIFY, member_type),
+            )
+
+        if has_spatial_index(con):
+            update_spatial_index(
+                con,
+                [ref for ref, in con.execute("SELECT ref FROM changed_features WHERE feature_type = 'way'")],
+                [ref for ref, in con.execute("SELECT ref FROM changed_features WHERE feature_type = 'relation'")],
+            )
+
+        con.execute("INSERT OR REPLACE INTO dirty_features SELECT * FROM changed_features")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        if node_locations is not None:
+            node_locations.flush()
+
+    return counts
+
+
+def get_dirty_refs(con, feature_type, actions=(CREATE, MODIFY)):
+    """Return the refs of the dirty features of feature_type whose last action is in actions, ordered by ref
+
+    By default the features to export again, the deleted ones are returned with actions=[DELETE].
+    """
+    rows = con.execute(
+        f"SELECT ref FROM dirty_features WHERE feature_type = ? AND action IN ({', '.join('?' * len(actions))}) "
+        "ORDER BY ref",
+        [feature_type, *actions],
+    )
+    return [ref for ref, in rows]
+
+
+def clear_dirty_features(con, feature_type=None):
+    """Unmark the dirty features, of feature_type or of all types, once they are exported"""
+    if feature_type is None:
+        con.execute("DELETE FROM dirty_features")
+    else:
+        con.execute("DELETE FROM dirty_features WHERE feature_type = ?", (feature_type,))
+    con.commit()
@@ -4,95 +4,287 @@ import xml.etree.ElementTree as ET
 from contextlib import contextmanager
 from tempfile import TemporaryDirectory
 
+from core.osm.spatial_index import create_spatial_index
+from core.utilities import format_bytes, get_peak_memory_usage
+
+DEFAULT_BATCH_SIZE = 50000
+
+# PRAGMAs applied while bulk loading, durability is traded for speed as a failed load is started over anyway
+BULK_INGEST_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -262144,  # negative values are KiB, i.e. 256MB
+    "temp_store": "MEMORY",
+}
+
+# table name: (column definitions, primary key columns)
+TABLES = {
+    "nodes": (
+        "ref INTEGER NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP",  # noqa
+        "ref",
+    ),
+    "ways": ("ref INTEGER NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP", "ref"),
+    "relations": ("ref INTEGER NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP", "ref"),
+    # feature_type is node, way or relation, as the ids of different types overlap
+    "tags": ("key TEXT NOT NULL, value TEXT NOT NULL, feature_ref INTEGER NOT NULL, feature_type TEXT NOT NULL", None),
+    # sequence_id is the position of the node in the way, closed ways have their first node again at the end
+    "way_node": (
+        "node_ref INTEGER NOT NULL, way_ref INTEGER NOT NULL, sequence_id INTEGER NOT NULL, FOREIGN KEY (node_ref) REFERENCES nodes(ref), FOREIGN KEY (way_ref) REFERENCES ways(ref)",  # noqa
+        "way_ref, sequence_id",
+    ),
+    # role is the role of the member in the relation, e.g. outer or inner for multipolygons, empty when not given
+    "relation_way": (
+        "way_ref INTEGER NOT NULL, relation_ref INTEGER NOT NULL, role TEXT NOT NULL, FOREIGN KEY (way_ref) REFERENCES ways(ref), FOREIGN KEY (relation_ref) REFERENCES relations(ref)",  # noqa
+        "relation_ref, way_ref",
+    ),
+    "relation_node": (
+        "node_ref INTEGER NOT NULL, relation_ref INTEGER NOT NULL, role TEXT NOT NULL, FOREIGN KEY (node_ref) REFERENCES nodes(ref), FOREIGN KEY (relation_ref) REFERENCES relations(ref)",  # noqa
+        "relation_ref, node_ref",
+    ),
+}
+
+# The first row of a primary key is kept, as create_indexes does in bulk mode, so both modes load the same rows.
+# Ways of overpass exports repeat the coordinates of their nodes and relations can list a member twice.
+INSERT_STATEMENTS = {
+    "nodes": "INSERT OR IGNORE INTO nodes(ref, latitude, longitude) VALUES(?, ?, ?)",
+    "ways": "INSERT OR IGNORE INTO ways(ref) VALUES(?)",
+    "relations": "INSERT OR IGNORE INTO relations(ref) VALUES(?)",
+    "tags": "INSERT INTO tags VALUES(?, ?, ?, ?)",
+    "way_node": "INSERT OR IGNORE INTO way_node VALUES(?, ?, ?)",
+    "relation_way": "INSERT OR IGNORE INTO relation_way VALUES(?, ?, ?)",
+    "relation_node": "INSERT OR IGNORE INTO relation_node VALUES(?, ?, ?)",
+}
+
+# Secondary indexes, created after the load when indexes are deferred
+INDEXES = {
+    "tags_feature_ref": "tags (feature_ref, feature_type)",
+}
+
 
 def extract_node_data(elem):
-    elem_ref = elem.attrib["ref"]
+    # A node element or a way node with its coordinates
+    elem_ref = elem.attrib.get("ref", elem.attrib.get("id"))
     latitude = float(elem.attrib["lat"])
     longitude = float(elem.attrib["lon"])
 
     return elem_ref, latitude, longitude
 
 
+def create_tables(cur, defer_indexes=False):
+    """Create the loader tables, without primary keys and indexes if they are deferred to create_indexes"""
+    for table, (columns, primary_key) in TABLES.items():
+        if primary_key and not defer_indexes:
+            columns = f"{columns}, PRIMARY KEY ({primary_key})"
+        cur.execute(f"CREATE TABLE {table} ({columns})")
+
+    if not defer_indexes:
+        for index, columns in INDEXES.items():
+            cur.execute(f"CREATE INDEX {index} ON {columns}")
+
+
+def create_indexes(cur):
+    """Create the primary key indexes and secondary indexes skipped by create_tables(..., defer_indexes=True)
+
+    Duplicate rows for a primary key are dropped, keeping the first one loaded.
+    """
+    for table, (_, primary_key) in TABLES.items():
+        if not primary_key:
+            continue
+
+        cur.execute(f"DELETE FROM {table} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY {primary_key})")
+        cur.execute(f"CREATE UNIQUE INDEX {table}_pk ON {table} ({primary_key})")
+
+    for index, columns in INDEXES.items():
+        cur.execute(f"CREATE INDEX {index} ON {columns}")
+
+
+def get_pragmas(cur, names):
+    return {name: cur.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
+
+
+def set_pragmas(cur, pragmas):
+    for pragma, value in pragmas.items():
+        cur.execute(f"PRAGMA {pragma} = {value}")
+
+
+class OsmRowWriter:
+    """Buffer rows per table and insert them with executemany
+
+    :param batch_size: rows buffered for a table before they are inserted
+    :param commit_interval: rows inserted between commits, None to commit only on flush
+    """
+
+    def __init__(self, con, batch_size=DEFAULT_BATCH_SIZE, commit_interval=None):
+        self.con = con
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.rows = {table: [] for table in INSERT_STATEMENTS}
+        self.uncommitted = 0
+
+    def add(self, table, row):
+        rows = self.rows[table]
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.insert(table)
+
+    def insert(self, table):
+        rows = self.rows[table]
+        if not rows:
+            return
+
+        self.con.executemany(INSERT_STATEMENTS[table], rows)
+        self.uncommitted += len(rows)
+        rows.clear()
+
+        if self.commit_interval and self.uncommitted >= self.commit_interval:
+            self.con.commit()
+            self.uncommitted = 0
+
+    def flush(self, commit=True):
+        """Insert the rows of all tables, and commit unless the caller commits them with other changes"""
+        for table in self.rows:
+            self.insert(table)
+        if commit:
+            self.con.commit()
+            self.uncommitted = 0
+
+
 @contextmanager
-def osm_loader(filepath, output_folder, db_file=None):
+def osm_loader(
+    filepath,
+    output_folder,
+    db_file=None,
+    bulk=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    commit_interval=None,
+    pragmas=None,
+    defer_indexes=None,
+    report_memory=False,
+    node_locations=None,
+    spatial_index=False,
+):
+    """Load an osm xml file into an sqlite database and yield the connection to it
+
+    :param bulk: insert rows in batches of batch_size in a single transaction (or one per commit_interval rows)
+        with the BULK_INGEST_PRAGMAS, and create the primary keys and indexes after the load.
+        Otherwise every row is inserted and committed on its own.
+    :param pragmas: PRAGMAs to apply for the load, overrides BULK_INGEST_PRAGMAS in bulk mode. The previous values
+        are set back once the load is done
+    :param defer_indexes: override whether primary keys and indexes are created after the load
+    :param report_memory: print the peak memory usage of the process once the load is done
+    :param node_locations: NodeLocationStore to add the coordinates of the nodes to in the same pass, to resolve
+        the geometry of ways referencing their nodes by id without querying the nodes table
+    :param spatial_index: compute the bounding boxes of the ways and relations into R*Tree tables once the load is
+        done, to query the features of an area with query_ways_in_bbox and query_relations_in_bbox
+
+    Elements are released as soon as their rows are written so memory use does not grow with the file size.
+    """
+    if bulk:
+        pragmas = BULK_INGEST_PRAGMAS if pragmas is None else pragmas
+        defer_indexes = True if defer_indexes is None else defer_indexes
+    else:
+        batch_size = 1
+        commit_interval = 1
+
     with TemporaryDirectory() as temp_dir:
         db_path = db_file if db_file else os.path.join(temp_dir, "data.sqlite")
         con = sqlite3.connect(db_path)
         cur = con.cursor()
 
-        cur.execute(
-            "CREATE TABLE nodes (ref INTEGER PRIMARY KEY, latitude REAL NOT NULL, longitude REAL NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"  # noqa
-        )
-        cur.execute("CREATE TABLE ways (ref INTEGER PRIMARY KEY, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
-        cur.execute("CREATE TABLE relations (ref INTEGER PRIMARY KEY, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
-        cur.execute("CREATE TABLE tags (key TEXT NOT NULL, value TEXT NOT NULL, feature_ref INTEGER NOT NULL)")
-        cur.execute(
-            "CREATE TABLE way_node (node_ref INTEGER NOT NULL, way_ref INTEGER NOT NULL, PRIMARY KEY (way_ref, node_ref), FOREIGN KEY (node_ref) REFERENCES nodes(ref), FOREIGN KEY (way_ref) REFERENCES ways(ref))"
-        )
-        cur.execute(
-            "CREATE TABLE relation_way (way_ref INTEGER NOT NULL, relation_ref INTEGER NOT NULL, PRIMARY KEY (relation_ref, way_ref), FOREIGN KEY (way_ref) REFERENCES ways(ref), FOREIGN KEY (relation_ref) REFERENCES relations(ref))"
-        )
-        cur.execute(
-            "CREATE TABLE relation_node (node_ref INTEGER NOT NULL, relation_ref INTEGER NOT NULL, PRIMARY KEY (relation_ref, node_ref), FOREIGN KEY (node_ref) REFERENCES nodes(ref), FOREIGN KEY (relation_ref) REFERENCES relations(ref))"
-        )
+        # The load PRAGMAs are only meant for the load, later writes on the connection have to be durable
+        previous_pragmas = get_pragmas(cur, pragmas) if pragmas else None
+        if pragmas:
+            set_pragmas(cur, pragmas)
+
+        create_tables(cur, defer_indexes=defer_indexes)
         con.commit()
 
+        writer = OsmRowWriter(con, batch_size=batch_size, commit_interval=commit_interval)
+
         try:
+            # (tag, id) of the currently open elements, the elements themselves are released once processed
             path = []
+            root = None
+            # Position of the next node of the current way
+            way_sequence = 0
             for event, elem in ET.iterparse(filepath, events=("start", "end")):
                 if event == "start":
-                    path.append(elem)
+                    if root is None:
+                        root = elem
 
                     elem_id = elem.attrib.get("ref", elem.attrib.get("id", None))
                     if elem_id is not None:
                         elem_id = int(elem_id)
 
                     try:
-                        if elem.tag == "nd":
+                        # Way nodes only have coordinates in overpass "out geom" exports, deleted nodes of
+                        # history files have none
+                        if elem.tag in ["nd", "node"] and "lat" in elem.attrib:
                             _, lat, lon = extract_node_data(elem)
-                            cur.execute(f"INSERT INTO nodes(ref, latitude, longitude) VALUES({elem_id}, {lat}, {lon})")
+                            writer.add("nodes", (elem_id, lat, lon))
+                            if node_locations is not None:
+                                node_locations.add(elem_id, lon, lat)
                         elif elem.tag == "way":
-                            cur.execute(f"INSERT INTO ways(ref) VALUES({elem_id})")
+                            writer.add("ways", (elem_id,))
+                            way_sequence = 0
                         elif elem.tag == "relation":
-                            cur.execute(f"INSERT INTO relations(ref) VALUES({elem_id})")
+                            writer.add("relations", (elem_id,))
                     except Exception:
                         print(elem, elem.attrib)
                         raise
+
+                    path.append((elem.tag, elem.attrib.get("id", elem.attrib.get("ref"))))
                 elif event == "end":
                     if len(path) > 2:
-                        parent_elem = path[-2]
+                        parent_tag, parent_id = path[-2]
 
                         if elem.tag in ["tag", "nd", "member"]:
                             try:
-                                parent_id = int(parent_elem.attrib.get("id", parent_elem.attrib.get("ref")))
+                                parent_id = int(parent_id)
                             except Exception:
-                                print(
-                                    parent_elem,
-                                    parent_elem.attrib,
-                                    parent_elem.attrib.get("id"),
-                                    parent_elem.attrib.get("ref"),
-                                )
+                                print(parent_tag, parent_id)
                                 raise
 
                             if elem.tag == "tag":
                                 key = elem.attrib["k"]
                                 value = elem.attrib["v"]
-                                cur.execute(f'INSERT INTO tags VALUES("{key}", "{value}", {parent_id})')
+                                writer.add("tags", (key, value, parent_id, parent_tag))
                             elif elem.tag == "nd":
-                                if parent_elem.tag == "way":
-                                    node_ref, lat, lon = extract_node_data(elem)
-                                    cur.execute(f"INSERT INTO way_node VALUES({node_ref}, {parent_id})")
+                                if parent_tag == "way":
+                                    writer.add("way_node", (int(elem.attrib["ref"]), parent_id, way_sequence))
+                                    way_sequence += 1
                             elif elem.tag == "member":
-                                if parent_elem.tag == "relation":
+                                if parent_tag == "relation":
                                     elem_id = int(elem.attrib["ref"])
+                                    role = elem.attrib.get("role", "")
                                     if elem.attrib["type"] == "node":
-                                        cur.execute(f"INSERT INTO relation_node VALUES({elem_id}, {parent_id})")
+                                        writer.add("relation_node", (elem_id, parent_id, role))
                                     elif elem.attrib["type"] == "way":
-                                        cur.execute(f"INSERT INTO relation_way VALUES({elem_id}, {parent_id})")
-                    con.commit()
+                                        writer.add("relation_way", (elem_id, parent_id, role))
                     path.pop()
 
-            yield None
+                    if len(path) == 1:
+                        # A top level element and all of its children are written, drop them from the tree
+                        root.clear()
+
+            writer.flush()
+            if node_locations is not None:
+                node_locations.flush()
+
+            if defer_indexes:
+                create_indexes(cur)
+                con.commit()
+
+            if spatial_index:
+                create_spatial_index(con)
+
+            if previous_pragmas:
+                set_pragmas(cur, previous_pragmas)
+
+            if report_memory:
+                print(f"Loaded {filepath}, peak memory usage: {format_bytes(get_peak_memory_usage())}")
+
+            yield con
         except Exception as e:
             con.close()
             raise Exception() from e
@@ -0,0 +1,235 @@
+"""Coordinates of osm nodes by id, for resolving the geometry of ways that only reference their nodes
+
+Coordinates are stored as 32 bit integers of 1e-7 degrees, the precision of osm, so a coordinate given with up to 7
+decimals is returned as the same float it was parsed to. A node added twice keeps the last coordinates.
+
+The dense mode is a memory mapped file indexed by node id, 8 bytes per id up to the largest id whether the node
+exists or not. Unused ids are holes of the file on file systems supporting sparse files, so the memory used grows
+with the nodes stored rather than with the largest id. It suits extracts with large ids, up to the whole planet.
+The sparse mode keeps the ids and coordinates of the nodes in sorted arrays searched with a binary search, it needs
+16 bytes per node and suits small extracts.
+"""
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+DENSE = "dense"
+SPARSE = "sparse"
+NODE_LOCATION_MODES = [DENSE, SPARSE]
+DEFAULT_NODE_LOCATION_MODE = SPARSE
+
+COORDINATE_SCALE = 10**7
+# Added to the stored latitudes so no stored location is 0, which marks the ids without a node in dense mode
+LATITUDE_OFFSET = 10**9
+MISSING = 0
+
+# Nodes buffered by add before they are stored
+DEFAULT_NODE_BATCH_SIZE = 100000
+# Ids the dense file grows by at least
+DENSE_GROWTH = 1024 * 1024
+
+
+def encode_locations(longitudes, latitudes):
+    locations = np.empty((len(longitudes), 2), dtype=np.int32)
+    locations[:, 0] = np.rint(np.asarray(longitudes, dtype=np.float64) * COORDINATE_SCALE)
+    locations[:, 1] = np.rint(np.asarray(latitudes, dtype=np.float64) * COORDINATE_SCALE) + LATITUDE_OFFSET
+    return locations
+
+
+def decode_locations(locations):
+    """Return the (n, 2) float array of [longitude, latitude] of the stored locations"""
+    coordinates = np.empty((len(locations), 2), dtype=np.float64)
+    coordinates[:, 0] = locations[:, 0] / COORDINATE_SCALE
+    coordinates[:, 1] = (locations[:, 1].astype(np.int64) - LATITUDE_OFFSET) / COORDINATE_SCALE
+    return coordinates
+
+
+class NodeLocationStore:
+    """Coordinates of osm nodes by id in dense or sparse mode (see NODE_LOCATION_MODES)
+
+    :param filepath: file of the dense mode, opened again when it exists so a store can be reused across runs.
+        A temporary file removed on close is used when None.
+    """
+
+    def __init__(self, mode=DEFAULT_NODE_LOCATION_MODE, filepath=None, batch_size=DEFAULT_NODE_BATCH_SIZE):
+        if mode not in NODE_LOCATION_MODES:
+            raise ValueError(f"Unknown mode: {mode}, expected one of {NODE_LOCATION_MODES}")
+
+        self.mode = mode
+        self.batch_size = batch_size
+        self.pending_refs = []
+        self.pending_longitudes = []
+        self.pending_latitudes = []
+
+        # Sparse mode: sorted ids, their locations and the batches added since they were sorted
+        self.refs = np.empty(0, dtype=np.int64)
+        self.locations = np.empty((0, 2), dtype=np.int32)
+        self.unsorted = []
+
+        # Dense mode
+        self.temporary_folder = None
+        self.filepath = None
+        self.array = None
+        if mode == DENSE:
+            if filepath is None:
+                self.temporary_folder = tempfile.TemporaryDirectory(prefix="node_locations_")
+                filepath = os.path.join(self.temporary_folder.name, "node_locations.bin")
+            self.filepath = filepath
+            self.open_dense()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        # Scans the whole file in dense mode
+        self.flush()
+        if self.mode == DENSE:
+            return int(np.count_nonzero(self.array[:, 1])) if self.array is not None else 0
+        return len(self.refs)
+
+    def open_dense(self, capacity=0):
+        """Open the dense file as a memory map of at least capacity ids, growing the file when it is smaller"""
+        if not os.path.isfile(self.filepath):
+            open(self.filepath, "wb").close()
+
+        size = os.path.getsize(self.filepath)
+        if size < capacity * 8:
+            # Truncating to a larger size adds a hole read as zeros, i.e. MISSING
+            os.truncate(self.filepath, capacity * 8)
+            size = capacity * 8
+
+        self.array = np.memmap(self.filepath, dtype=np.int32, mode="r+", shape=(size // 8, 2)) if size else None
+
+    def get_capacity(self):
+        return len(self.array) if self.array is not None else 0
+
+    def add(self, ref, longitude, latitude):
+        self.pending_refs.append(ref)
+        self.pending_longitudes.append(longitude)
+        self.pending_latitudes.append(latitude)
+        if len(self.pending_refs) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, refs, longitudes, latitudes):
+        """Store the coordinates of the nodes of refs, later nodes replace earlier ones with the same id"""
+        refs = np.asarray(refs, dtype=np.int64)
+        if not len(refs):
+            return
+
+        locations = encode_locations(longitudes, latitudes)
+
+        if self.mode == SPARSE:
+            self.unsorted.append((refs, locations))
+            return
+
+        if refs.min() < 0:
+            raise ValueError("Negative node ids cannot be stored in dense mode, use the sparse mode")
+
+        largest = int(refs.max())
+        capacity = self.get_capacity()
+        if largest >= capacity:
+            if self.array is not None:
+                self.array.flush()
+                self.array = None
+            self.open_dense(max(largest + 1 + capacity // 2, DENSE_GROWTH))
+
+        # Assigned in order, the last of the repeated ids is kept
+        self.array[refs] = locations
+
+    def flush(self):
+        """Store the nodes buffered by add, and sort the nodes added in sparse mode"""
+        if self.pending_refs:
+            refs, longitudes, latitudes = self.pending_refs, self.pending_longitudes, self.pending_latitudes
+            self.pending_refs, self.pending_longitudes, self.pending_latitudes = [], [], []
+            self.add_many(refs, longitudes, latitudes)
+
+        if self.mode == SPARSE and self.unsorted:
+            refs = np.concatenate([self.refs] + [batch_refs for batch_refs, _ in self.unsorted])
+            locations = np.concatenate([self.locations] + [batch_locations for _, batch_locations in self.unsorted])
+            self.unsorted = []
+
+            # Stable so the positions of an id keep the order they were added in, the last one is kept
+            order = np.argsort(refs, kind="stable")
+            refs = refs[order]
+            is_last = np.ones(len(refs), dtype=bool)
+            is_last[:-1] = refs[1:] != refs[:-1]
+            self.refs = refs[is_last]
+            self.locations = locations[order][is_last]
+
+    def get_locations(self, refs):
+        """Return the (n, 2) float array of [longitude, latitude] of the nodes of refs and a mask of the ids found
+
+        The coordinates of the ids not found are nan.
+        """
+        self.flush()
+        refs = np.asarray(refs, dtype=np.int64)
+        locations = np.zeros((len(refs), 2), dtype=np.int32)
+
+        if self.mode == DENSE:
+            in_range = (refs >= 0) & (refs < self.get_capacity())
+            if self.array is not None:
+                locations[in_range] = self.array[refs[in_range]]
+            found = locations[:, 1] != MISSING
+        else:
+            positions = np.searchsorted(self.refs, refs)
+            positions[positions == len(self.refs)] = 0
+            found = (self.refs[positions] == refs) if len(self.refs) else np.zeros(len(refs), dtype=bool)
+            locations[found] = self.locations[positions[found]]
+
+        coordinates = decode_locations(locations)
+        coordinates[~found] = np.nan
+        return coordinates, found
+
+    def get_coordinates(self, refs):
+        """Return the (n, 2) float array of [longitude, latitude] of the nodes of refs, KeyError if one is missing"""
+        coordinates, found = self.get_locations(refs)
+        if not found.all():
+            missing = np.asarray(refs, dtype=np.int64)[~found]
+            raise KeyError(f"No location for {len(missing)} nodes: {missing[:10].tolist()}")
+        return coordinates
+
+    def get(self, ref, default=None):
+        coordinates, found = self.get_locations([ref])
+        return tuple(coordinates[0].tolist()) if found[0] else default
+
+    def close(self):
+        self.flush()
+        if self.array is not None:
+            self.array.flush()
+        self.array = None
+        if self.temporary_folder is not None:
+            self.temporary_folder.cleanup()
+            self.temporary_folder = None
+
+
+def load_node_locations(filepath, node_locations=None, mode=DEFAULT_NODE_LOCATION_MODE, store_filepath=None):
+    """Store the coordinates of all the node elements of an osm xml file in one pass and return the store
+
+    :param node_locations: NodeLocationStore to add the nodes to, a new one of mode is created when None
+    :param store_filepath: file of a new dense mode store
+    """
+    if node_locations is None:
+        node_locations = NodeLocationStore(mode=mode, filepath=store_filepath)
+
+    root = None
+    for event, elem in ET.iterparse(filepath, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        # Deleted nodes of history files have no coordinates
+        if elem.tag == "node" and "lat" in elem.attrib:
+            node_locations.add(int(elem.attrib["id"]), float(elem.attrib["lon"]), float(elem.attrib["lat"]))
+
+        if elem.tag in ["node", "way", "relation"]:
+            # Drop the finished top level element and its children from the tree
+            root.clear()
+
+    node_locations.flush()
+    return node_locations
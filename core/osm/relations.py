@@ -0,0 +1,217 @@
+"""Rings of the multipolygon relations of an osm_loader database
+
+The member ways of a batch of relations are read with one query ordered by relation, way and node sequence, and
+joined into rings with merge_rings in worker processes while the next batch is read. Member ways are joined by the
+ids of their end nodes, so ways split anywhere and in any direction form the same rings.
+"""
+from collections import deque
+from itertools import groupby
+
+import numpy as np
+
+from core.executor import get_executor
+from core.osm.ways import get_coordinates_feature, write_kml_features, write_txt_features
+from multipolygon_fixer.merge_rings import merge_rings
+
+# Values of the type tag of the relations assembled by default
+MULTIPOLYGON_TYPES = ["multipolygon", "boundary"]
+
+OUTER = "outer"
+INNER = "inner"
+# Role of the member ways: ring role, members without a role are outer rings as in old multipolygons
+MEMBER_ROLES = {"": OUTER, OUTER: OUTER, INNER: INNER}
+
+DEFAULT_RELATION_BATCH_SIZE = 1000
+# Batches read ahead of the batch being yielded
+DEFAULT_RELATION_QUEUE_SIZE = 4
+
+
+def select_multipolygon_relations(con, types=None):
+    """Return the refs of the relations with a type tag in types, MULTIPOLYGON_TYPES when None, ordered by ref"""
+    types = MULTIPOLYGON_TYPES if types is None else types
+    rows = con.execute(
+        "SELECT DISTINCT relations.ref FROM relations JOIN tags ON tags.feature_ref = relations.ref "
+        "AND tags.feature_type = 'relation' "
+        f"WHERE tags.key = 'type' AND tags.value IN ({', '.join('?' * len(types))}) ORDER BY relations.ref",
+        list(types),
+    )
+    return [ref for ref, in rows]
+
+
+def select_relations(con, relation_refs):
+    """Fill the temporary selected_relations table joined by the query of the members of relation_refs"""
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS selected_relations (ref INTEGER PRIMARY KEY)")
+    con.execute("DELETE FROM selected_relations")
+    con.executemany("INSERT OR IGNORE INTO selected_relations VALUES(?)", ((ref,) for ref in relation_refs))
+
+
+def query_relation_members(con, relation_refs, with_coordinates=True):
+    """Return the rows of the nodes of the outer and inner member ways of relation_refs
+
+    Rows are (relation ref, way ref, role, node ref[, longitude, latitude]) ordered by relation, way and node
+    sequence. The coordinates of nodes missing from the nodes table are None.
+    """
+    select_relations(con, relation_refs)
+    columns = "way_node.node_ref"
+    join = ""
+    if with_coordinates:
+        columns += ", nodes.longitude, nodes.latitude"
+        join = " LEFT JOIN nodes ON nodes.ref = way_node.node_ref"
+
+    return con.execute(
+        f"SELECT relation_way.relation_ref, relation_way.way_ref, relation_way.role, {columns} FROM relation_way "
+        "JOIN selected_relations ON relation_way.relation_ref = selected_relations.ref "
+        f"JOIN way_node ON way_node.way_ref = relation_way.way_ref{join} "
+        f"WHERE relation_way.role IN ({', '.join('?' * len(MEMBER_ROLES))}) "
+        "ORDER BY relation_way.relation_ref, relation_way.way_ref, way_node.sequence_id",
+        list(MEMBER_ROLES),
+    ).fetchall()
+
+
+def get_relation_batch(con, relation_refs, node_locations=None):
+    """Return [(relation ref, [(ring role, node refs, (n, 2) coordinates)])] of the member ways of relation_refs
+
+    The coordinates come from a NodeLocationStore, looked up at once for the batch, or from the nodes table.
+    Coordinates of missing nodes are nan.
+    """
+    rows = query_relation_members(con, relation_refs, with_coordinates=node_locations is None)
+
+    members = []
+    for (relation_ref, _, role), way_rows in groupby(rows, key=lambda row: row[:3]):
+        way_rows = list(way_rows)
+        node_refs = np.array([row[3] for row in way_rows], dtype=np.int64)
+        coordinates = None
+        if node_locations is None:
+            coordinates = np.array([row[4:] for row in way_rows], dtype=np.float64)
+        members.append((relation_ref, MEMBER_ROLES[role], node_refs, coordinates))
+
+    if node_locations is not None and members:
+        coordinates, _ = node_locations.get_locations(np.concatenate([node_refs for _, _, node_refs, _ in members]))
+        ends = np.cumsum([len(node_refs) for _, _, node_refs, _ in members])
+        members = [
+            (relation_ref, role, node_refs, way_coordinates)
+            for (relation_ref, role, node_refs, _), way_coordinates in zip(members, np.split(coordinates, ends[:-1]))
+        ]
+
+    relation_members = {relation_ref: [] for relation_ref in relation_refs}
+    for relation_ref, role, node_refs, coordinates in members:
+        relation_members[relation_ref].append((role, node_refs, coordinates))
+    return list(relation_members.items())
+
+
+def assemble_rings(members):
+    """Join the member ways of a relation into rings
+
+    :param members: [(ring role, node refs, (n, 2) coordinates)] of the member ways
+    :return: ({OUTER: [(n, 2) coordinates], INNER: [...]} of the closed rings, number of rings left open)
+        Rings with missing nodes or fewer than 4 nodes count as open.
+    """
+    members_by_role = {OUTER: [], INNER: []}
+    for role, node_refs, coordinates in members:
+        members_by_role[role].append((node_refs, coordinates))
+
+    rings = {OUTER: [], INNER: []}
+    open_rings = 0
+    for role, role_members in members_by_role.items():
+        if not role_members:
+            continue
+
+        node_refs = np.concatenate([member_node_refs for member_node_refs, _ in role_members]).tolist()
+        coordinates = np.concatenate([member_coordinates for _, member_coordinates in role_members])
+        ends = np.cumsum([len(member_node_refs) for member_node_refs, _ in role_members]).tolist()
+
+        # Merge rings of positions in the concatenated members, keyed by the node refs of the positions
+        complete, incomplete = merge_rings(
+            [range(end - len(member[0]), end) for member, end in zip(role_members, ends)],
+            key=node_refs.__getitem__,
+        )
+        open_rings += len(incomplete)
+        for ring in complete:
+            ring_coordinates = coordinates[ring]
+            if len(ring) < 4 or np.isnan(ring_coordinates).any():
+                open_rings += 1
+            else:
+                rings[role].append(ring_coordinates)
+
+    return rings, open_rings
+
+
+def assemble_relation_batch(batch):
+    """Return [(relation ref, rings, number of open rings)] of a get_relation_batch batch
+
+    Module level so it can be sent to processes.
+    """
+    return [(relation_ref, *assemble_rings(members)) for relation_ref, members in batch]
+
+
+def iter_multipolygons(
+    con,
+    node_locations=None,
+    relation_refs=None,
+    batch_size=DEFAULT_RELATION_BATCH_SIZE,
+    backend="process",
+    max_workers=None,
+    queue_size=DEFAULT_RELATION_QUEUE_SIZE,
+):
+    """Yield (relation ref, {OUTER: [(n, 2) coordinates], INNER: [...]}, number of open rings) of the relations
+
+    :param relation_refs: relations to assemble, the relations of select_multipolygon_relations when None
+    :param batch_size: relations read with one query and assembled by one worker call
+    :param backend: assemble the batches in an executor of this backend, in this thread when None
+    :param queue_size: batches read ahead of the batch being yielded
+
+    The batches are read in this thread, which owns the connection, and yielded in the order of the relations.
+    """
+    relation_refs = select_multipolygon_relations(con) if relation_refs is None else list(relation_refs)
+    batches = (
+        get_relation_batch(con, relation_refs[start : start + batch_size], node_locations)
+        for start in range(0, len(relation_refs), batch_size)
+    )
+
+    if backend is None:
+        for batch in batches:
+            yield from assemble_relation_batch(batch)
+        return
+
+    with get_executor(backend=backend, max_workers=max_workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(assemble_relation_batch, batch))
+            if len(pending) > queue_size:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_multipolygon_features(con, node_locations=None, relation_refs=None, assembly_options=None):
+    """Yield the closed rings of the relations as (array, metadata) features of read_txt_file(..., columnar=True)
+
+    Rings are named {relation ref}-{outer or inner}-{position}, outer rings first.
+
+    :param assembly_options: other iter_multipolygons arguments
+    """
+    for relation_ref, rings, _ in iter_multipolygons(con, node_locations, relation_refs, **(assembly_options or {})):
+        for role, role_rings in rings.items():
+            for position, coordinates in enumerate(role_rings):
+                yield get_coordinates_feature(f"{relation_ref}-{role}-{position}", coordinates)
+
+
+def export_multipolygons_to_txt(con, output_file, node_locations=None, relation_refs=None, assembly_options=None):
+    """Append the closed rings of the relations to a txt list file, one feature group per ring
+
+    Return the number of rings written.
+    """
+    features = iter_multipolygon_features(con, node_locations, relation_refs, assembly_options)
+    return write_txt_features(output_file, features)
+
+
+def export_multipolygons_to_kml(
+    con, output_file, node_locations=None, relation_refs=None, assembly_options=None, **kwargs
+):
+    """Write the closed rings of the relations to a kml file as polygons, return the number of rings written
+
+    :param kwargs: other kml_writer arguments
+    """
+    features = iter_multipolygon_features(con, node_locations, relation_refs, assembly_options)
+    return write_kml_features(output_file, features, is_area=True, **kwargs)
@@ -0,0 +1,100 @@
+"""Bounding boxes of the ways and relations of an osm_loader database in SQLite R*Tree tables
+
+Boxes are (min longitude, min latitude, max longitude, max latitude). The R*Tree tables store them as 32 bit floats
+rounded outwards, so a box always contains its feature. The box of a way covers its nodes found in the nodes table,
+the box of a relation the boxes of its member ways and its member nodes.
+"""
+from core.osm.relations import select_relations
+from core.osm.ways import select_ways
+
+RTREE_COLUMNS = "ref, min_longitude, max_longitude, min_latitude, max_latitude"
+SPATIAL_INDEX_TABLES = ["ways_rtree", "relations_rtree"]
+
+BBOX_QUERY = (
+    "SELECT ref FROM {table} WHERE min_longitude <= ? AND max_longitude >= ? AND min_latitude <= ? "
+    "AND max_latitude >= ? ORDER BY ref"
+)
+
+
+def insert_way_boxes(con, selected=False):
+    """Compute the boxes of the ways, or of the ways of the selected_ways table, into ways_rtree"""
+    join = " JOIN selected_ways ON selected_ways.ref = way_node.way_ref" if selected else ""
+    con.execute(
+        "INSERT INTO ways_rtree SELECT way_node.way_ref, MIN(nodes.longitude), MAX(nodes.longitude), "
+        f"MIN(nodes.latitude), MAX(nodes.latitude) FROM way_node{join} JOIN nodes ON nodes.ref = way_node.node_ref "
+        "GROUP BY way_node.way_ref"
+    )
+
+
+def insert_relation_boxes(con, selected=False):
+    """Compute the boxes of the relations, or of those of the selected_relations table, into relations_rtree
+
+    The boxes of the member ways are taken from ways_rtree.
+    """
+    join = " JOIN selected_relations ON selected_relations.ref = {table}.relation_ref" if selected else ""
+    con.execute(
+        "INSERT INTO relations_rtree SELECT relation_ref, MIN(min_longitude), MAX(max_longitude), MIN(min_latitude), "
+        "MAX(max_latitude) FROM ("
+        "SELECT relation_way.relation_ref, ways_rtree.min_longitude, ways_rtree.max_longitude, "
+        "ways_rtree.min_latitude, ways_rtree.max_latitude "
+        f"FROM relation_way{join.format(table='relation_way')} "
+        "JOIN ways_rtree ON ways_rtree.ref = relation_way.way_ref "
+        "UNION ALL "
+        "SELECT relation_node.relation_ref, nodes.longitude, nodes.longitude, nodes.latitude, nodes.latitude "
+        f"FROM relation_node{join.format(table='relation_node')} JOIN nodes ON nodes.ref = relation_node.node_ref"
+        ") GROUP BY relation_ref"
+    )
+
+
+def create_spatial_index(con):
+    """Compute the boxes of the ways and relations into the ways_rtree and relations_rtree tables
+
+    Tables of an earlier run are replaced, so the index of an existing database can be built or rebuilt without
+    loading it again.
+    """
+    for table in SPATIAL_INDEX_TABLES:
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.execute(f"CREATE VIRTUAL TABLE {table} USING rtree({RTREE_COLUMNS})")
+
+    insert_way_boxes(con)
+    insert_relation_boxes(con)
+    con.commit()
+
+
+def update_spatial_index(con, way_refs, relation_refs):
+    """Compute again the boxes of the ways of way_refs and the relations of relation_refs, without committing
+
+    The boxes of deleted features are removed. The relations of changed member ways have to be in relation_refs.
+    """
+    select_ways(con, way_refs)
+    con.execute("DELETE FROM ways_rtree WHERE ref IN (SELECT ref FROM selected_ways)")
+    insert_way_boxes(con, selected=True)
+
+    select_relations(con, relation_refs)
+    con.execute("DELETE FROM relations_rtree WHERE ref IN (SELECT ref FROM selected_relations)")
+    insert_relation_boxes(con, selected=True)
+
+
+def has_spatial_index(con):
+    tables = {name for name, in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return all(table in tables for table in SPATIAL_INDEX_TABLES)
+
+
+def query_bbox(con, table, bbox):
+    """Return the refs of the features of an R*Tree table whose boxes intersect bbox, ordered by ref"""
+    if not has_spatial_index(con):
+        raise ValueError("The database has no spatial index, load it with spatial_index=True or create_spatial_index")
+
+    min_longitude, min_latitude, max_longitude, max_latitude = bbox
+    rows = con.execute(BBOX_QUERY.format(table=table), (max_longitude, min_longitude, max_latitude, min_latitude))
+    return [ref for ref, in rows]
+
+
+def query_ways_in_bbox(con, bbox):
+    """Return the refs of the ways intersecting bbox, e.g. for export_ways_to_txt(..., way_refs=...)"""
+    return query_bbox(con, "ways_rtree", bbox)
+
+
+def query_relations_in_bbox(con, bbox):
+    """Return the refs of the relations intersecting bbox, e.g. for iter_multipolygons(..., relation_refs=...)"""
+    return query_bbox(con, "relations_rtree", bbox)
@@ -0,0 +1,151 @@
+"""Geometry of the ways of an osm_loader database
+
+Ways are read with one query over the way_node table ordered by way and sequence, their coordinates are taken from
+a NodeLocationStore in batches or joined from the nodes table in the same query.
+"""
+import numpy as np
+
+from core.kml_file.write_kml_file import kml_writer
+from core.txt_file.columnar import NO_SUB_NAME, build_feature_array, get_metadata
+from core.txt_file.write_txt_file import txt_list_session
+
+# Node references of the ways resolved with one lookup of the node location store
+DEFAULT_WAY_BATCH_SIZE = 100000
+
+
+def select_ways(con, way_refs):
+    """Fill the temporary selected_ways table joined by the queries of the ways of way_refs"""
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS selected_ways (ref INTEGER PRIMARY KEY)")
+    con.execute("DELETE FROM selected_ways")
+    con.executemany("INSERT OR IGNORE INTO selected_ways VALUES(?)", ((ref,) for ref in way_refs))
+
+
+def query_way_nodes(con, columns, way_refs=None, join=""):
+    if way_refs is not None:
+        select_ways(con, way_refs)
+        join += " JOIN selected_ways ON way_node.way_ref = selected_ways.ref"
+
+    return con.execute(
+        f"SELECT way_node.way_ref, {columns} FROM way_node{join} ORDER BY way_node.way_ref, way_node.sequence_id"
+    )
+
+
+def group_way_rows(rows):
+    """Yield (way ref, [row values]) of rows of (way ref, values...) ordered by way"""
+    this_way = None
+    values = []
+    for way_ref, *row in rows:
+        if way_ref != this_way:
+            if values:
+                yield this_way, values
+            this_way = way_ref
+            values = []
+        values.append(row)
+
+    if values:
+        yield this_way, values
+
+
+def iter_way_node_refs(con, way_refs=None):
+    """Yield (way ref, [node refs]) of the ways of the database, or of way_refs, in the order of their nodes"""
+    for way_ref, rows in group_way_rows(query_way_nodes(con, "way_node.node_ref", way_refs)):
+        yield way_ref, [node_ref for node_ref, in rows]
+
+
+def iter_way_coordinates(con, node_locations=None, way_refs=None, batch_size=DEFAULT_WAY_BATCH_SIZE):
+    """Yield (way ref, (n, 2) float array of [longitude, latitude]) of the ways of the database, or of way_refs
+
+    With a NodeLocationStore the node references of a batch of ways are looked up at once, otherwise the nodes
+    table is joined in the query. Coordinates of nodes missing from the store or the table are nan.
+    """
+    if node_locations is None:
+        rows = query_way_nodes(
+            con, "nodes.longitude, nodes.latitude", way_refs, join=" LEFT JOIN nodes ON nodes.ref = way_node.node_ref"
+        )
+        for way_ref, coordinates in group_way_rows(rows):
+            yield way_ref, np.array(coordinates, dtype=np.float64)
+        return
+
+    batch = []
+    batch_length = 0
+    for way_ref, node_refs in iter_way_node_refs(con, way_refs):
+        batch.append((way_ref, node_refs))
+        batch_length += len(node_refs)
+        if batch_length >= batch_size:
+            yield from resolve_way_batch(node_locations, batch)
+            batch = []
+            batch_length = 0
+
+    if batch:
+        yield from resolve_way_batch(node_locations, batch)
+
+
+def resolve_way_batch(node_locations, batch):
+    refs = np.fromiter((ref for _, node_refs in batch for ref in node_refs), dtype=np.int64)
+    coordinates, _ = node_locations.get_locations(refs)
+    ends = np.cumsum([len(node_refs) for _, node_refs in batch])
+    for (way_ref, _), way_coordinates in zip(batch, np.split(coordinates, ends[:-1])):
+        yield way_ref, way_coordinates
+
+
+def get_coordinates_feature(name, coordinates):
+    """Return the (array, metadata) feature of read_txt_file(..., columnar=True) of a (n, 2) array of coordinates"""
+    array = build_feature_array(
+        np.arange(len(coordinates)),
+        coordinates[:, 0],
+        coordinates[:, 1],
+        np.zeros(len(coordinates)),
+        np.full(len(coordinates), NO_SUB_NAME),
+    )
+    return array, get_metadata(name, [])
+
+
+def iter_way_features(con, node_locations=None, way_refs=None):
+    """Yield the ways as (array, metadata) features of read_txt_file(..., columnar=True), named by their ref
+
+    Ways with nodes missing from the database, e.g. cut at the border of an extract, are skipped.
+    """
+    for way_ref, coordinates in iter_way_coordinates(con, node_locations, way_refs):
+        if np.isnan(coordinates).any():
+            continue
+
+        yield get_coordinates_feature(str(way_ref), coordinates)
+
+
+def write_txt_features(output_file, features):
+    """Append (array, metadata) features to a txt list file, one feature group each, return the number written"""
+    number_of_features = 0
+    with txt_list_session(output_file) as txt_writer:
+        for array, metadata in features:
+            index = txt_writer.last_index + 1
+            for longitude, latitude in zip(array["longitude"].tolist(), array["latitude"].tolist()):
+                txt_writer.writerow([index, longitude, latitude, 0, metadata["name"]])
+                index += 1
+            number_of_features += 1
+
+    return number_of_features
+
+
+def write_kml_features(output_file, features, is_area=False, **kwargs):
+    """Write (array, metadata) features to a kml file as placemarks, return the number written"""
+    number_of_features = 0
+    with kml_writer(output_file, **kwargs) as write_node_group:
+        for array, metadata in features:
+            write_node_group(array, metadata=metadata, is_area=is_area)
+            number_of_features += 1
+
+    return number_of_features
+
+
+def export_ways_to_txt(con, output_file, node_locations=None, way_refs=None):
+    """Append the ways to a txt list file, one feature group per way, return the number of ways written"""
+    return write_txt_features(output_file, iter_way_features(con, node_locations, way_refs))
+
+
+def export_ways_to_kml(con, output_file, node_locations=None, way_refs=None, is_area=False, **kwargs):
+    """Write the ways to a kml file as placemarks, return the number of ways written
+
+    :param is_area: write closed ways as polygons
+    :param kwargs: other kml_writer arguments
+    """
+    return write_kml_features(output_file, iter_way_features(con, node_locations, way_refs), is_area, **kwargs)
@@ -0,0 +1,171 @@
+"""On disk cache of the parsed features of txt list files
+
+The features of a file are saved as one structured numpy array of all the nodes (see core.txt_file.columnar) with
+the offsets and metadata of the features in a json file next to it. Later reads memory map the array instead of
+parsing the text. Entries are keyed by the absolute path, size and modification time of the txt file, the least
+recently used entries are deleted once the cache grows over its maximum size.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from core.txt_file.columnar import NODE_DTYPE
+
+CACHE_VERSION = 1
+DEFAULT_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+CACHE_NODES_FILENAME = "nodes.npy"
+CACHE_FEATURES_FILENAME = "features.json"
+
+
+def add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "<Optional> Folder caching the parsed input files, later runs over the same unchanged files load the "
+            "cached features instead of parsing the text"
+        ),
+    )
+    parser.add_argument(
+        "--max-cache-size",
+        type=int,
+        default=DEFAULT_MAX_CACHE_SIZE,
+        help="<Optional> Size in bytes of the cache folder over which the least recently used files are removed",
+    )
+
+
+def get_source_signature(filepath):
+    stat = os.stat(filepath)
+    return {"source": os.path.abspath(filepath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def get_source_key(source):
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def get_cache_key(signature):
+    """Return the name of the entry folder, the key of the source path then the key of its size and modification time"""
+    version = hashlib.sha256(f"{signature['size']}\0{signature['mtime_ns']}".encode()).hexdigest()[:16]
+    return f"{get_source_key(signature['source'])}-{version}"
+
+
+def get_cache_entry_folder(filepath, cache_dir):
+    return os.path.join(cache_dir, get_cache_key(get_source_signature(filepath)))
+
+
+def load_cached_features(filepath, cache_dir):
+    """Return the cached [(array, metadata)] features of the txt file, None when the file is not cached
+
+    The arrays are read only views of a memory map of the cached nodes.
+    """
+    entry_folder = get_cache_entry_folder(filepath, cache_dir)
+    try:
+        with open(os.path.join(entry_folder, CACHE_FEATURES_FILENAME), "r", encoding="utf-8") as fi:
+            features = json.load(fi)
+    except (OSError, ValueError):
+        return None
+
+    if features.get("version") != CACHE_VERSION:
+        return None
+
+    offsets = features["offsets"]
+    if offsets[-1]:
+        nodes = np.load(os.path.join(entry_folder, CACHE_NODES_FILENAME), mmap_mode="r")
+    else:
+        nodes = np.empty(0, dtype=NODE_DTYPE)
+
+    # The modification time of the entry orders the entries from least to most recently used for eviction
+    touch(entry_folder)
+
+    return [
+        (nodes[start:end], metadata) for start, end, metadata in zip(offsets[:-1], offsets[1:], features["metadata"])
+    ]
+
+
+def save_cached_features(filepath, cache_dir, features, max_cache_size=DEFAULT_MAX_CACHE_SIZE):
+    """Cache the [(array, metadata)] features of the txt file read with read_txt_file(..., columnar=True)
+
+    Older entries of the same file are replaced, then least recently used entries are removed while the cache is
+    larger than max_cache_size.
+    """
+    signature = get_source_signature(filepath)
+    entry_folder = os.path.join(cache_dir, get_cache_key(signature))
+    os.makedirs(cache_dir, exist_ok=True)
+
+    lengths = [len(array) for array, _ in features]
+    nodes = np.concatenate([array for array, _ in features]) if features else np.empty(0, dtype=NODE_DTYPE)
+
+    # Written to a temporary folder first so readers never see a partial entry
+    temporary_folder = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+    try:
+        np.save(os.path.join(temporary_folder, CACHE_NODES_FILENAME), nodes)
+        with open(os.path.join(temporary_folder, CACHE_FEATURES_FILENAME), "w", encoding="utf-8") as fo:
+            json.dump(
+                {
+                    "version": CACHE_VERSION,
+                    **signature,
+                    "offsets": np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist(),
+                    "metadata": [metadata for _, metadata in features],
+                },
+                fo,
+            )
+        os.rename(temporary_folder, entry_folder)
+    except OSError:
+        # Another process cached the same file first
+        shutil.rmtree(temporary_folder, ignore_errors=True)
+
+    remove_stale_entries(cache_dir, signature)
+    evict_cache_entries(cache_dir, max_cache_size, keep=entry_folder)
+
+
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def get_cache_entries(cache_dir):
+    """Return [(entry folder, last used time, size in bytes)] of the entries of the cache"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_dir() or entry.name.startswith("."):
+            continue
+
+        try:
+            size = sum(os.path.getsize(os.path.join(entry.path, name)) for name in os.listdir(entry.path))
+            entries.append((entry.path, entry.stat().st_mtime_ns, size))
+        except OSError:
+            continue
+    return entries
+
+
+def remove_stale_entries(cache_dir, signature):
+    """Remove the entries of older versions of the source file of signature
+
+    Entry folders start with the key of their source path, so stale entries are found from the stat of the source
+    alone without reading their features.
+    """
+    current_key = get_cache_key(signature)
+    prefix = f"{get_source_key(signature['source'])}-"
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith(prefix) and entry.name != current_key:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def evict_cache_entries(cache_dir, max_cache_size=DEFAULT_MAX_CACHE_SIZE, keep=None):
+    """Remove the least recently used entries until the cache is at most max_cache_size bytes, except keep"""
+    entries = sorted(get_cache_entries(cache_dir), key=lambda entry: entry[1])
+    cache_size = sum(size for _, _, size in entries)
+
+    for entry_folder, _, size in entries:
+        if cache_size <= max_cache_size:
+            break
+        if entry_folder == keep:
+            continue
+
+        shutil.rmtree(entry_folder, ignore_errors=True)
+        cache_size -= size
@@ -0,0 +1,109 @@
+import numpy as np
+
+from core.txt_file.logic import Node, get_coordinate_id
+
+NODE_DTYPE = np.dtype(
+    [
+        ("longitude", np.float64),
+        ("latitude", np.float64),
+        ("altitude", np.float64),
+        ("index", np.int64),
+        ("name_code", np.int32),
+        ("sub_name_code", np.int32),
+    ]
+)
+
+# sub_name_code used for nodes without a sub name
+NO_SUB_NAME = -1
+
+
+def build_feature_array(indices, longitudes, latitudes, altitudes, sub_name_codes):
+    """Build a structured node array for one feature group from parsed column lists
+
+    Coordinate columns may be given as strings, they are converted to float in bulk by numpy.
+    """
+    array = np.empty(len(indices), dtype=NODE_DTYPE)
+    array["index"] = np.array(indices, dtype=np.int64)
+    array["longitude"] = np.array(longitudes, dtype=np.float64)
+    array["latitude"] = np.array(latitudes, dtype=np.float64)
+    array["altitude"] = np.array(altitudes, dtype=np.float64)
+    array["name_code"] = 0
+    array["sub_name_code"] = np.array(sub_name_codes, dtype=np.int32)
+    return array
+
+
+def get_metadata(feature_name, sub_names):
+    return {"name": feature_name, "names": [feature_name], "sub_names": sub_names}
+
+
+def get_coordinates(array):
+    """Return the (n, 3) float array of [longitude, latitude, altitude] for the nodes"""
+    coordinates = np.empty((len(array), 3), dtype=np.float64)
+    coordinates[:, 0] = array["longitude"]
+    coordinates[:, 1] = array["latitude"]
+    coordinates[:, 2] = array["altitude"]
+    return coordinates
+
+
+def get_array_ids(array, max_digits=8):
+    """Equivalent of logic.get_id for every node of the array"""
+    longitudes = array["longitude"].tolist()
+    latitudes = array["latitude"].tolist()
+    return [
+        get_coordinate_id(longitude, latitude, max_digits=max_digits)
+        for longitude, latitude in zip(longitudes, latitudes)
+    ]
+
+
+def is_array_ring_closed(array, max_digits=8):
+    ids = get_array_ids(array[[0, -1]], max_digits=max_digits)
+    return ids[0] == ids[-1]
+
+
+def get_sub_name(metadata, sub_name_code):
+    if sub_name_code == NO_SUB_NAME:
+        return None
+    return metadata["sub_names"][sub_name_code]
+
+
+def get_array_node_name(array, metadata, position=0):
+    """Equivalent of logic.get_node_name for the node at the given position of the array"""
+    name = metadata["names"][array["name_code"][position]]
+    sub_name = get_sub_name(metadata, array["sub_name_code"][position])
+    return name + ("-" + sub_name if sub_name else "")
+
+
+def get_array_nodes(array, metadata):
+    """Equivalent of the nodes read_txt_file yields for the feature"""
+    names = metadata["names"]
+    sub_names = [get_sub_name(metadata, code) for code in range(len(metadata["sub_names"]))] + [None]
+    return [
+        Node(longitude, latitude, altitude, names[name_code], sub_names[sub_name_code])
+        for longitude, latitude, altitude, name_code, sub_name_code in zip(
+            array["longitude"].tolist(),
+            array["latitude"].tolist(),
+            array["altitude"].tolist(),
+            array["name_code"].tolist(),
+            array["sub_name_code"].tolist(),
+        )
+    ]
+
+
+def iter_named_groups(array, metadata):
+    """Split a feature array into groups of nodes sharing the same full name
+
+    Groups are yielded in order of first appearance and keep the original node order, same as grouping
+    nodes by get_node_name into a dict.
+    """
+    codes = array["sub_name_code"]
+    if len(array) == 0:
+        return
+
+    if (codes == codes[0]).all():
+        yield get_array_node_name(array, metadata), array
+        return
+
+    _, first_positions = np.unique(codes, return_index=True)
+    for position in np.sort(first_positions):
+        group = array[codes == codes[position]]
+        yield get_array_node_name(group, metadata), group
@@ -0,0 +1,238 @@
+"""Sidecar index of the features of a txt list file for random access
+
+The index records the byte offset, size, line count and bounding box of every feature group, it is built in one
+pass over the file and saved next to it. The size and modification time of the txt file are saved with the index,
+a saved index is only reused while they are unchanged.
+"""
+import json
+import mmap
+import os
+
+import numpy as np
+
+from core.txt_file.constants import TXT_LIST_HEADERS
+from core.txt_file.logic import check_file_is_non_empty_txt_file, get_feature_name
+from core.txt_file.read_txt_file import parse_txt_lines, parse_txt_lines_columnar
+
+TXT_INDEX_EXTENSION = ".idx"
+TXT_INDEX_VERSION = 1
+
+
+def get_txt_index_filepath(filepath):
+    return filepath + TXT_INDEX_EXTENSION
+
+
+def get_file_signature(filepath):
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def add_indexed_feature(index, name, start, end, longitudes, latitudes):
+    longitudes = np.array(longitudes, dtype=np.float64)
+    latitudes = np.array(latitudes, dtype=np.float64)
+    index["names"].append(name)
+    index["offsets"].append(start)
+    index["sizes"].append(end - start)
+    index["line_counts"].append(len(longitudes))
+    index["bboxes"].append([longitudes.min(), latitudes.min(), longitudes.max(), latitudes.max()])
+
+
+def build_txt_index(filepath):
+    """Index the feature groups of a txt list file, grouped the same way as read_txt_file(columnar=True)
+
+    Return a dict of the file signature and one list per column: names, offsets, sizes (in bytes), line_counts and
+    bboxes (west, south, east, north).
+    """
+    check_file_is_non_empty_txt_file(filepath)
+    size, mtime_ns = get_file_signature(filepath)
+
+    index = {
+        "version": TXT_INDEX_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "names": [],
+        "offsets": [],
+        "sizes": [],
+        "line_counts": [],
+        "bboxes": [],
+    }
+
+    this_feature = None
+    feature_longitudes = None
+    feature_latitudes = None
+    start = end = offset = 0
+
+    with open(filepath, "rb") as fi:
+        for line in fi:
+            line_offset = offset
+            offset += len(line)
+
+            line = line.strip()
+            if not line or line[:2].lower() == b"id":
+                continue
+
+            line_items = line.split(b"\t")
+
+            feature_name, _ = get_feature_name(line_items[-1].strip().decode())
+
+            if this_feature != feature_name or not this_feature:
+                if feature_longitudes:
+                    add_indexed_feature(index, this_feature, start, end, feature_longitudes, feature_latitudes)
+
+                this_feature = feature_name
+                feature_longitudes = []
+                feature_latitudes = []
+                start = line_offset
+
+            feature_longitudes.append(line_items[1])
+            feature_latitudes.append(line_items[2])
+            end = offset
+
+    if feature_longitudes:
+        add_indexed_feature(index, this_feature, start, end, feature_longitudes, feature_latitudes)
+
+    index["bboxes"] = np.array(index["bboxes"], dtype=np.float64).reshape(-1, 4).tolist()
+    return index
+
+
+def save_txt_index(filepath, index):
+    index_filepath = get_txt_index_filepath(filepath)
+    temporary_filepath = f"{index_filepath}.{os.getpid()}.tmp"
+
+    with open(temporary_filepath, mode="w", encoding="utf-8") as fo:
+        json.dump(index, fo)
+    os.replace(temporary_filepath, index_filepath)
+
+
+def load_txt_index(filepath):
+    """Return the saved index of the txt file, None if there is none or the file changed since it was built"""
+    try:
+        with open(get_txt_index_filepath(filepath), "r", encoding="utf-8") as fi:
+            index = json.load(fi)
+    except (OSError, ValueError):
+        return None
+
+    if index.get("version") != TXT_INDEX_VERSION:
+        return None
+
+    if (index.get("size"), index.get("mtime_ns")) != get_file_signature(filepath):
+        return None
+
+    return index
+
+
+def get_txt_index(filepath, rebuild=False):
+    """Return the saved index of the txt file, building and saving it when missing or stale
+
+    The index is still returned when it cannot be saved, e.g. next to a file in a read only folder.
+    """
+    index = None if rebuild else load_txt_index(filepath)
+
+    if index is None:
+        index = build_txt_index(filepath)
+        try:
+            save_txt_index(filepath, index)
+        except OSError:
+            pass
+
+    return index
+
+
+class IndexedTxtFile:
+    """Random access to the features of a txt list file through its index and a memory map of the file
+
+    Features are addressed by their position in the file, get_positions gives the positions of the features with a
+    name. Use as a context manager or call close to release the memory map.
+    """
+
+    def __init__(self, filepath, rebuild_index=False):
+        self.filepath = filepath
+        self.index = get_txt_index(filepath, rebuild=rebuild_index)
+
+        self.positions_by_name = {}
+        for position, name in enumerate(self.index["names"]):
+            self.positions_by_name.setdefault(name, []).append(position)
+
+        with open(filepath, "rb") as fi:
+            self.map = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.index["names"])
+
+    def close(self):
+        self.map.close()
+
+    @property
+    def names(self):
+        return list(self.positions_by_name)
+
+    def get_positions(self, name):
+        return list(self.positions_by_name.get(name, []))
+
+    def get_bbox(self, position):
+        return tuple(self.index["bboxes"][position])
+
+    def query_bbox(self, bbox):
+        """Return the positions of the features whose bounding box intersects bbox (west, south, east, north)"""
+        if not len(self):
+            return []
+
+        west, south, east, north = bbox
+        bboxes = np.asarray(self.index["bboxes"], dtype=np.float64)
+        mask = (bboxes[:, 0] <= east) & (bboxes[:, 2] >= west) & (bboxes[:, 1] <= north) & (bboxes[:, 3] >= south)
+        return np.flatnonzero(mask).tolist()
+
+    def get_feature_bytes(self, position):
+        offset = self.index["offsets"][position]
+        return self.map[offset : offset + self.index["sizes"][position]]
+
+    def get_feature_lines(self, position):
+        return self.get_feature_bytes(position).decode().splitlines()
+
+    def read_feature(self, position, columnar=False):
+        """Return the nodes of the feature at position, as read_txt_file would yield them"""
+        lines = self.get_feature_lines(position)
+        if columnar:
+            return next(parse_txt_lines_columnar(lines))
+        return next(parse_txt_lines(lines))
+
+    def read_features(self, positions=None, names=None, bbox=None, columnar=False):
+        """Yield the features at the given positions, with the given names or intersecting bbox, in file order
+
+        Without any filter every feature is yielded.
+        """
+        selected = None
+        if positions is not None:
+            selected = set(positions)
+        if names is not None:
+            named = {position for name in names for position in self.positions_by_name.get(name, [])}
+            selected = named if selected is None else selected & named
+        if bbox is not None:
+            intersecting = set(self.query_bbox(bbox))
+            selected = intersecting if selected is None else selected & intersecting
+
+        for position in sorted(selected) if selected is not None else range(len(self)):
+            yield self.read_feature(position, columnar=columnar)
+
+    def extract_features(self, output_file, positions):
+        """Copy the lines of the features at positions to a new txt list file, return the number of lines written
+
+        The lines are copied as they are, keeping their ids.
+        """
+        lines_written = 0
+        with open(output_file, "wb") as fo:
+            fo.write(("\t".join(TXT_LIST_HEADERS) + "\n").encode())
+            for position in sorted(set(positions)):
+                data = self.get_feature_bytes(position)
+                fo.write(data)
+                if not data.endswith(b"\n"):
+                    fo.write(b"\n")
+                lines_written += self.index["line_counts"][position]
+
+        return lines_written
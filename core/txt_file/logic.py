@@ -1,5 +1,6 @@
 import os
 import math
+import sys
 
 from core.txt_file.constants import TXT_LIST_HEADERS
 from core.txt_file.exceptions import FileNotTXTListError, EmptyFileError
@@ -31,11 +32,54 @@ def is_ring_closed(ring):
     return ring[0]['id'] == ring[-1]['id']
 
 
+NODE_FIELDS = ("longitude", "latitude", "altitude", "name", "sub_name", "id")
+
+# Bits the quantized latitude takes in a coordinate id
+COORDINATE_ID_SHIFT = 64
+COORDINATE_ID_MASK = (1 << COORDINATE_ID_SHIFT) - 1
+
+
+class Node:
+    """Vertex of a txt list feature
+
+    Slotted replacement for the node dicts taking a fraction of their memory, node["longitude"] works the same as
+    node.longitude. Names are interned so the nodes of a feature share them.
+    """
+
+    __slots__ = NODE_FIELDS
+
+    def __init__(self, longitude, latitude, altitude, name, sub_name=None):
+        self.longitude = longitude
+        self.latitude = latitude
+        self.altitude = altitude
+        self.name = sys.intern(name)
+        self.sub_name = sys.intern(sub_name) if sub_name is not None else None
+        self.id = get_coordinate_id(longitude, latitude)
+
+    def __getitem__(self, key):
+        if key not in NODE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in NODE_FIELDS)
+
+    def __reduce__(self):
+        # Pickle the constructor arguments only, much smaller and faster than the default state of the slots
+        return Node, (self.longitude, self.latitude, self.altitude, self.name, self.sub_name)
+
+    def __repr__(self):
+        return f"Node({self.longitude}, {self.latitude}, {self.altitude}, {self.name!r}, {self.sub_name!r})"
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in NODE_FIELDS}
+
+
 def get_node(feature):
     feature_name, sub_name = get_feature_name(feature[-1].strip())
-    prepared_node = { "longitude": float(feature[1]), "latitude": float(feature[2]), "altitude": float(feature[3]), "name": feature_name, "sub_name": sub_name }
-    prepared_node["id"] = get_id(prepared_node)
-    return prepared_node
+    return Node(float(feature[1]), float(feature[2]), float(feature[3]), feature_name, sub_name)
 
 
 def get_feature_name(name):
@@ -55,8 +99,22 @@ def get_feature_name(name):
     return name_parts[0], name_parts[1]
 
 
+def get_coordinate_id(longitude, latitude, max_digits=8):
+    """Integer key of a coordinate rounded to max_digits, coordinates with the same rounded values share it
+
+    Non finite coordinates have no integer key, they get the string key of the rounded values instead.
+    """
+    if not (math.isfinite(longitude) and math.isfinite(latitude)):
+        return f"{round(longitude, max_digits)},{round(latitude, max_digits)}"
+
+    scale = 10**max_digits
+    quantized_longitude = round(round(longitude, max_digits) * scale)
+    quantized_latitude = round(round(latitude, max_digits) * scale)
+    return (quantized_longitude << COORDINATE_ID_SHIFT) | (quantized_latitude & COORDINATE_ID_MASK)
+
+
 def get_id(node, max_digits=8):
-    return f"{round(node['longitude'], max_digits)},{round(node['latitude'], max_digits)}"
+    return get_coordinate_id(node["longitude"], node["latitude"], max_digits=max_digits)
 
 
 def nodes_equal(one, other, check_name=True):
@@ -1,35 +1,248 @@
+import os
+from collections import deque
+
+from core.executor import get_executor
+from core.txt_file.cache import DEFAULT_MAX_CACHE_SIZE, load_cached_features, save_cached_features
+from core.txt_file.columnar import NO_SUB_NAME, build_feature_array, get_array_nodes, get_metadata
 from core.txt_file.logic import check_file_is_non_empty_txt_file, get_feature_name, get_node
 
+# Largest byte range of the file parsed by one worker process of read_txt_file(..., parse_workers=n), smaller
+# files are split so every worker gets a few ranges
+DEFAULT_PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+MIN_PARSE_CHUNK_SIZE = 1024 * 1024
+CHUNKS_PER_PARSE_WORKER = 4
+
+
+def read_txt_file(
+    filepath,
+    columnar=False,
+    parse_workers=None,
+    chunk_size=None,
+    cache_dir=None,
+    max_cache_size=DEFAULT_MAX_CACHE_SIZE,
+):
+    """Yield the nodes of a txt list file, one group per feature
+
+    :param columnar: yield each feature as a (structured numpy array, metadata) tuple instead of a list of nodes,
+        see core.txt_file.columnar
+    :param parse_workers: parse byte ranges of the file in this many processes, the features are still yielded in
+        the order of the file. Columnar features are much cheaper to send back from the processes than nodes
+    :param chunk_size: size in bytes of the ranges parsed by the processes, see get_parse_chunk_size
+    :param cache_dir: load the features from this cache folder when the file is cached there, cache them after
+        reading the whole file otherwise, see core.txt_file.cache
+    """
+    if cache_dir:
+        yield from read_txt_file_cached(filepath, cache_dir, columnar, max_cache_size, parse_workers, chunk_size)
+        return
+
+    if parse_workers and parse_workers > 1:
+        yield from read_txt_file_parallel(filepath, columnar, parse_workers, chunk_size=chunk_size)
+        return
+
+    if columnar:
+        yield from read_txt_file_columnar(filepath)
+        return
+
+    check_file_is_non_empty_txt_file(filepath)
+
+    with open(filepath, "r") as fi:
+        yield from parse_txt_lines(fi)
+
+
+def parse_txt_lines(lines):
+    this_feature = None
+    this_feature_nodes = []
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        if line.strip().lower().startswith("id"):
+            continue
+
+        line_items = line.strip().split("\t")
 
-def read_txt_file(filepath):
+        feature_name, _ = get_feature_name(line_items[-1].strip())
+
+        if not this_feature:
+            this_feature = feature_name
+            this_feature_nodes = [get_node(line_items)]
+        elif this_feature != feature_name:
+            # One group of items in the txt is fetched (excluding this node)
+            yield this_feature_nodes
+
+            # Start a new group with this iterations item
+            this_feature = feature_name
+            this_feature_nodes = [get_node(line_items)]
+        else:
+            this_feature_nodes.append(get_node(line_items))
+
+    yield this_feature_nodes
+
+
+def read_txt_file_columnar(filepath):
     check_file_is_non_empty_txt_file(filepath)
 
     with open(filepath, "r") as fi:
-        this_feature = None
-        this_feature_nodes = []
+        yield from parse_txt_lines_columnar(fi)
+
+
+def parse_txt_lines_columnar(lines):
+    this_feature = None
+    columns = None
+    sub_name_codes = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
 
-        for line in fi:
-            if not line.strip():
-                continue
+        if line.lower().startswith("id"):
+            continue
 
-            if line.strip().lower().startswith("id"):
-                continue
-            
-            line_items = line.strip().split("\t")
+        line_items = line.split("\t")
 
-            feature_name, _ = get_feature_name(line_items[-1].strip())
+        feature_name, sub_name = get_feature_name(line_items[-1].strip())
 
-            if not this_feature:
-                this_feature = feature_name
-                this_feature_nodes = [get_node(line_items)]
-            elif this_feature != feature_name:
+        if this_feature != feature_name or not this_feature:
+            if columns:
                 # One group of items in the txt is fetched (excluding this node)
-                yield this_feature_nodes
-                
-                # Start a new group with this iterations item
-                this_feature = feature_name
-                this_feature_nodes = [get_node(line_items)]
-            else:
-                this_feature_nodes.append(get_node(line_items))
-
-        yield this_feature_nodes
+                yield build_feature_array(*columns), get_metadata(this_feature, list(sub_name_codes))
+
+            # Start a new group with this iterations item
+            this_feature = feature_name
+            columns = ([], [], [], [], [])
+            sub_name_codes = {}
+
+        if sub_name is None:
+            sub_name_code = NO_SUB_NAME
+        else:
+            sub_name_code = sub_name_codes.setdefault(sub_name, len(sub_name_codes))
+
+        columns[0].append(line_items[0])
+        columns[1].append(line_items[1])
+        columns[2].append(line_items[2])
+        columns[3].append(line_items[3])
+        columns[4].append(sub_name_code)
+
+    if columns:
+        yield build_feature_array(*columns), get_metadata(this_feature, list(sub_name_codes))
+
+
+def get_line_feature_name(line):
+    """Feature name of a line of the file read in binary mode, None for blank and header lines"""
+    line = line.strip()
+    if not line or line[:2].lower() == b"id":
+        return None
+
+    feature_name, _ = get_feature_name(line.split(b"\t")[-1].strip().decode())
+    return feature_name
+
+
+def find_feature_boundary(fi, offset):
+    """Return the offset of the first line at or after offset starting a new feature group, the file size if none
+
+    :param fi: the file opened in binary mode
+    """
+    if offset > 0:
+        # Skip to the start of the next line unless offset already is one
+        fi.seek(offset - 1)
+        fi.readline()
+    else:
+        fi.seek(0)
+
+    previous_name = None
+    while True:
+        line_offset = fi.tell()
+        line = fi.readline()
+        if not line:
+            return line_offset
+
+        feature_name = get_line_feature_name(line)
+        if feature_name is None:
+            continue
+
+        if previous_name is not None and feature_name != previous_name:
+            return line_offset
+        previous_name = feature_name
+
+
+def get_parse_chunk_size(file_size, parse_workers):
+    chunk_size = file_size // (parse_workers * CHUNKS_PER_PARSE_WORKER)
+    return max(MIN_PARSE_CHUNK_SIZE, min(DEFAULT_PARSE_CHUNK_SIZE, chunk_size))
+
+
+def get_feature_chunks(filepath, chunk_size):
+    """Split the file in (start, end) byte ranges of about chunk_size bytes, each starting on a new feature group"""
+    file_size = os.path.getsize(filepath)
+    boundaries = [0]
+
+    with open(filepath, "rb") as fi:
+        while True:
+            boundary = find_feature_boundary(fi, boundaries[-1] + chunk_size)
+            if boundary >= file_size:
+                break
+            boundaries.append(boundary)
+
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def parse_txt_chunk(filepath, start, end, columnar=False):
+    """Return the features in a byte range of the file given by get_feature_chunks"""
+    with open(filepath, "rb") as fi:
+        fi.seek(start)
+        lines = fi.read(end - start).decode().split("\n")
+
+    if columnar:
+        return list(parse_txt_lines_columnar(lines))
+
+    return [nodes for nodes in parse_txt_lines(lines) if nodes]
+
+
+def read_txt_file_parallel(filepath, columnar, parse_workers, chunk_size=None):
+    check_file_is_non_empty_txt_file(filepath)
+
+    chunk_size = chunk_size or get_parse_chunk_size(os.path.getsize(filepath), parse_workers)
+    chunks = get_feature_chunks(filepath, chunk_size)
+    if len(chunks) < 2:
+        yield from read_txt_file(filepath, columnar=columnar)
+        return
+
+    # Only a few chunks per process are parsed ahead of the features yielded, so the parsed features of a large file
+    # do not pile up in memory when the consumer is slower than the parsing
+    max_pending = parse_workers * 2
+    executor = get_executor(backend="process", max_workers=parse_workers)
+    try:
+        pending = deque()
+        for start, end in chunks:
+            pending.append(executor.submit(parse_txt_chunk, filepath, start, end, columnar))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def read_txt_file_cached(filepath, cache_dir, columnar, max_cache_size, parse_workers=None, chunk_size=None):
+    check_file_is_non_empty_txt_file(filepath)
+
+    features = load_cached_features(filepath, cache_dir)
+    if features is not None:
+        for array, metadata in features:
+            yield (array, metadata) if columnar else get_array_nodes(array, metadata)
+        return
+
+    features = []
+    for array, metadata in read_txt_file(filepath, columnar=True, parse_workers=parse_workers, chunk_size=chunk_size):
+        features.append((array, metadata))
+        yield (array, metadata) if columnar else get_array_nodes(array, metadata)
+
+    save_cached_features(filepath, cache_dir, features, max_cache_size=max_cache_size)
+
+
+def get_read_options(args):
+    """read_txt_file arguments of the --parse-workers, --cache-dir and --max-cache-size command line options"""
+    return {"parse_workers": args.parse_workers, "cache_dir": args.cache_dir, "max_cache_size": args.max_cache_size}
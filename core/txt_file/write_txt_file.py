@@ -6,6 +6,9 @@ from core.txt_file.constants import TXT_LIST_HEADERS
 from core.txt_file.exceptions import EmptyFileError
 from core.txt_file.logic import check_file_is_non_empty_txt_file
 
+# Bytes buffered in memory by TxtListWriter before they are written to the file
+DEFAULT_WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
 
 def get_txt_last_index(filepath):
     check_file_is_non_empty_txt_file(filepath)
@@ -22,10 +25,7 @@ def get_txt_last_index(filepath):
     return int(data.decode().splitlines()[-1].split("\t")[0])
 
 
-@contextmanager
-def txt_list_writer(filepath):
-    mode = "w"
-
+def get_txt_output_filepath(filepath):
     if not filepath.endswith(".txt"):
         filepath = f"{filepath}.txt"
 
@@ -34,6 +34,15 @@ def txt_list_writer(filepath):
     if not os.path.isdir(os.path.dirname(filepath)):
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
+    return filepath
+
+
+@contextmanager
+def txt_list_writer(filepath):
+    mode = "w"
+
+    filepath = get_txt_output_filepath(filepath)
+
     if os.path.isfile(filepath):
         mode = "a"
 
@@ -53,3 +62,75 @@ def txt_list_writer(filepath):
             yield tsv_writer, last_index
         except Exception as e:
             raise Exception(f"CSV writing failed: {filepath}") from e
+
+
+class TxtListWriter:
+    """Writer for txt list files that keeps the file open between feature groups
+
+    Produces the same output as entering txt_list_writer once per group, but the file is opened and its last
+    index read only once, the running index is tracked in memory and rows are written in large buffered blocks.
+    The file is only created, with its header, when the first row is written.
+    """
+
+    def __init__(self, filepath, buffer_size=DEFAULT_WRITE_BUFFER_SIZE):
+        self.filepath = get_txt_output_filepath(filepath)
+        self.buffer_size = buffer_size
+        self.last_index = None
+        self._header_row = None
+        self._fo = None
+        self._tsv_writer = None
+
+    def open(self):
+        try:
+            self.last_index = get_txt_last_index(self.filepath)
+            self._header_row = None
+        except (FileNotFoundError, EmptyFileError):
+            # Written through the newline="" handle, so use the line separator text mode would have written
+            self._header_row = "\t".join(TXT_LIST_HEADERS) + os.linesep
+            self.last_index = -1
+        return self
+
+    def _open_file(self):
+        mode = "a" if os.path.isfile(self.filepath) else "w"
+        self._fo = open(self.filepath, mode=mode, encoding="utf-8", newline="", buffering=self.buffer_size)
+        if self._header_row:
+            self._fo.write(self._header_row)
+            self._header_row = None
+
+        self._tsv_writer = csv.writer(self._fo, delimiter="\t")
+
+    def close(self):
+        if self._fo is not None:
+            self._fo.close()
+            self._fo = None
+            self._tsv_writer = None
+
+    def writerow(self, row):
+        if self._tsv_writer is None:
+            self._open_file()
+
+        self._tsv_writer.writerow(row)
+        self.last_index = int(row[0])
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextmanager
+def txt_list_session(filepath, buffer_size=DEFAULT_WRITE_BUFFER_SIZE):
+    """Open a TxtListWriter for the whole lifetime of the context
+
+    Use writer.last_index the same way as the last_index given by txt_list_writer.
+    """
+    with TxtListWriter(filepath, buffer_size=buffer_size) as writer:
+        try:
+            yield writer
+        except Exception as e:
+            raise Exception(f"CSV writing failed: {writer.filepath}") from e
@@ -1,5 +1,6 @@
 import os
 import shutil
+import sys
 from uuid import uuid4
 from contextlib import contextmanager
 from tempfile import TemporaryDirectory
@@ -21,6 +22,30 @@ def replace_file_in_place(filepath, replace_with_filepath):
     return backup_original
 
 
+def get_peak_memory_usage():
+    """Return the peak resident set size of this process in bytes, None if the platform does not report it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_bytes(value):
+    if value is None:
+        return "unknown"
+
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+
+    return f"{value:.1f} TB"
+
+
 @contextmanager
 def file_handler(filepath, replace=False):
         if not replace:
@@ -1,60 +1,73 @@
 import argparse
-import json
 import os
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-
-from core.txt_file.logic import get_node_name
-from core.txt_file.read_txt_file import read_txt_file
-from core.txt_file.write_txt_file import txt_list_writer
+from functools import partial
+
+from core.executor import add_executor_arguments, get_staged_options
+from core.metrics import (
+    WRITE,
+    add_metrics_arguments,
+    count_written,
+    measure_map,
+    measure_reading,
+    measure_stage,
+    run_measured_workers,
+)
+from core.txt_file.cache import add_cache_arguments
+from core.txt_file.read_txt_file import get_read_options, read_txt_file
+from core.txt_file.write_txt_file import txt_list_session
 from core.utilities import file_handler
-from line_thinner.line_thinner import reduce_points_in_a_line
+from line_thinner.line_thinner import (
+    get_array_coordinate_groups,
+    get_node_coordinate_groups,
+    reduce_points_in_a_named_group,
+)
+from line_thinner.options import add_thinning_arguments, get_thinning_options
+
 
-DEFAULT_ALLOWED_ANGLE_DEVIATION = 1
-DEFAULT_USE_WEIGHTED_TOLERANCE = False
-DEFAULT_MAX_DISTANCE_FOR_WEIGHTING = 0.01
-DEFAULT_ANGLE_FOR_WEIGHTING = 15
-DEFAULT_REDUCE_AREA_TO_POINT = False
-DEFAULT_AREA_TO_POINT_THRESHOLD = 100
+def get_named_coordinate_groups(input_file, columnar=False, read_options=None, metrics=None):
+    read_options = read_options or {}
+    if columnar:
+        for array, metadata in measure_reading(metrics, read_txt_file(input_file, columnar=True, **read_options)):
+            yield from get_array_coordinate_groups(array, metadata)
+        return
 
-config_file = "config.json"
-if os.path.isfile(config_file):
-    with open("config.json", "r") as fi:
-        config_data = json.load(fi)
-else:
-    config_data = {}
+    for this_feature_nodes in measure_reading(metrics, read_txt_file(input_file, **read_options)):
+        yield from get_node_coordinate_groups(this_feature_nodes)
 
 
-def worker(option):
+def worker(option, metrics=None):
     with file_handler(option["output_file"], replace=option["replace"]) as filepath:
         counter = 0
-        for this_feature_nodes in read_txt_file(option["input_file"]):
-            feature_node_named_groups = defaultdict(list)
-
-            for node in this_feature_nodes:
-                name = get_node_name(node)
-                feature_node_named_groups[name].append(node)
-
-            for nodes in feature_node_named_groups.values():
-                group_name = nodes[0]["name"] + ("-" + nodes[0]["sub_name"] if nodes[0]["sub_name"] else "")
-
-                lon_lat_alt_coordinates = list(map(lambda x: [x["longitude"], x["latitude"], x["altitude"]], nodes))
-                reduced_coordinates = reduce_points_in_a_line(lon_lat_alt_coordinates, **option["thinning_options"])
-
-                with txt_list_writer(filepath) as (tsv_writer, last_index):
-                    current_write_counter = 0
-                    for coordinate in reduced_coordinates:
-                        row = []
-                        row.append(last_index + current_write_counter + 1)
-                        row.append(coordinate[0])
-                        row.append(coordinate[1])
-                        row.append(coordinate[2])
-                        row.append(group_name)
-                        tsv_writer.writerow(row)
-
-                        counter += 1
-                        current_write_counter += 1
-
+        group_counter = 0
+        with txt_list_session(filepath) as txt_writer, measure_stage(metrics, WRITE):
+            named_groups = get_named_coordinate_groups(
+                option["input_file"],
+                columnar=option["columnar"],
+                read_options=option["read_options"],
+                metrics=metrics,
+            )
+            reduce_points = partial(reduce_points_in_a_named_group, **option["thinning_options"])
+
+            # With --staged the groups are read and thinned ahead while the rows are written
+            for group_name, reduced_coordinates in measure_map(
+                metrics, reduce_points, named_groups, option["staged_options"]
+            ):
+                group_counter += 1
+                last_index = txt_writer.last_index
+                current_write_counter = 0
+                for coordinate in reduced_coordinates:
+                    row = []
+                    row.append(last_index + current_write_counter + 1)
+                    row.append(coordinate[0])
+                    row.append(coordinate[1])
+                    row.append(coordinate[2])
+                    row.append(group_name)
+                    txt_writer.writerow(row)
+
+                    counter += 1
+                    current_write_counter += 1
+
+    count_written(metrics, group_counter, counter)
     return counter
 
 
@@ -75,28 +88,12 @@ def get_file_options(input_item, args):
 
     return {
         "replace": args.replace,
+        "columnar": args.columnar,
+        "read_options": get_read_options(args),
+        "staged_options": get_staged_options(args),
         "input_file": filepath,
         "output_file": filepath if args.replace else os.path.join(output_folder, basename),
-        "thinning_options": {
-            "allowed_angle_deviation": args.allowed_angle_deviation
-            if args.allowed_angle_deviation
-            else config_data.get("allowed_angle_deviation", DEFAULT_ALLOWED_ANGLE_DEVIATION),
-            "use_weighted_tolerance": args.use_weighted_tolerance
-            if args.use_weighted_tolerance
-            else config_data.get("use_weighted_tolerance", DEFAULT_USE_WEIGHTED_TOLERANCE),
-            "max_distance_for_weighting": args.max_distance_for_weighting
-            if args.max_distance_for_weighting
-            else config_data.get("max_distance_for_weighting", DEFAULT_MAX_DISTANCE_FOR_WEIGHTING),
-            "max_angle_for_weighting": args.max_angle_for_weighting
-            if args.max_angle_for_weighting
-            else config_data.get("max_angle_for_weighting", DEFAULT_ANGLE_FOR_WEIGHTING),
-            "reduce_area_to_point": args.reduce_area_to_point
-            if args.reduce_area_to_point
-            else config_data.get("reduce_area_to_point", DEFAULT_REDUCE_AREA_TO_POINT),
-            "threshold_area_in_meter_square": args.area_to_point_threshold
-            if args.area_to_point_threshold
-            else config_data.get("area_to_point_threshold", DEFAULT_AREA_TO_POINT_THRESHOLD),
-        },
+        "thinning_options": get_thinning_options(args),
     }
 
 
@@ -116,28 +113,6 @@ def main():
         help="<Optional> Replace the input file with the output, if not append a suffix",
         action="store_true",
     )
-    parser.add_argument(
-        "--use-distance-weighted",
-        dest="use_weighted_tolerance",
-        help="<Optional> Smaller distance between the points allow for higher angle deviation",
-        action="store_true",
-    )
-    parser.add_argument(
-        "--allowed-angle-deviation", help="<Optional> Angular deviation allowed from straight line", type=float
-    )
-    parser.add_argument(
-        "--max-distance-for-weighting",
-        help=(
-            "<Optional> Distance under which lines get weighted, if using distance weighted.\n"
-            "Distances above this will use 'allowed-angle-deviation' angle"
-        ),
-        type=float,
-    )
-    parser.add_argument(
-        "--max-angle-for-weighting",
-        help="<Optional> When using distance weighted, this will be the maximum angle for distance close to zero",
-        type=float,
-    )
     parser.add_argument(
         "-s",
         "--output-suffix",
@@ -148,8 +123,15 @@ def main():
     parser.add_argument(
         "-o", "--output-folder", help="<Optional> Folder to put the output files in if replace is False", required=False
     )
-    parser.add_argument("--reduce-area-to-point", action="store_true")
-    parser.add_argument("--area-to-point-threshold", type=int, default=100)
+    parser.add_argument(
+        "--columnar",
+        help="<Optional> Read the input into numpy arrays instead of per node dicts, faster for large files",
+        action="store_true",
+    )
+    add_thinning_arguments(parser)
+    add_executor_arguments(parser)
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     options = []
@@ -164,13 +146,9 @@ def main():
                 if os.path.isfile(filepath) and filepath.endswith(".txt"):
                     options.append(get_file_options(filepath, args))
 
-    # Set up multithreading
-    number_of_threads = 10
-    with ThreadPoolExecutor(max_workers=number_of_threads) as executor:
-        results = executor.map(worker, options)
-
-    for result in results:
-        print(result)
+    # Results come back per file as the workers complete
+    for option, result in run_measured_workers(worker, options, args):
+        print(option["input_file"], result)
 
 
 if __name__ == "__main__":  # pragma: no cover
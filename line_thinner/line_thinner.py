@@ -1,10 +1,52 @@
 import math
+from collections import defaultdict
 from math import pi, sin
 
 import numpy as np
 
+from core.txt_file.columnar import get_coordinates, iter_named_groups
+from core.txt_file.logic import get_node_name
+from line_thinner.simplify import douglas_peucker, visvalingam_whyatt
+from line_thinner.vectorized import get_kept_positions, get_neighbour_angles
+
 WGS84_RADIUS = 6378137
 
+ENGINES = ["python", "numpy"]
+
+# "angle" is the three point angle check of reduce_points_in_a_line, the others take a tolerance or target_points
+SIMPLIFICATION_ALGORITHMS = {
+    "douglas-peucker": douglas_peucker,
+    "visvalingam-whyatt": visvalingam_whyatt,
+}
+ALGORITHMS = ["angle", *SIMPLIFICATION_ALGORITHMS]
+
+
+def get_node_coordinate_groups(feature_nodes):
+    """Yield (group name, [[longitude, latitude, altitude]]) of the nodes of a feature grouped by their full name"""
+    feature_node_named_groups = defaultdict(list)
+
+    for node in feature_nodes:
+        name = get_node_name(node)
+        feature_node_named_groups[name].append(node)
+
+    for nodes in feature_node_named_groups.values():
+        group_name = nodes[0]["name"] + ("-" + nodes[0]["sub_name"] if nodes[0]["sub_name"] else "")
+
+        lon_lat_alt_coordinates = list(map(lambda x: [x["longitude"], x["latitude"], x["altitude"]], nodes))
+        yield group_name, lon_lat_alt_coordinates
+
+
+def reduce_points_in_a_named_group(named_group, **kwargs):
+    """reduce_points_in_a_line for a (group name, coordinates) group, return (group name, reduced coordinates)"""
+    group_name, coordinates = named_group
+    return group_name, reduce_points_in_a_line(coordinates, **kwargs)
+
+
+def get_array_coordinate_groups(array, metadata):
+    """Same as get_node_coordinate_groups for a feature from read_txt_file(..., columnar=True)"""
+    for group_name, group in iter_named_groups(array, metadata):
+        yield group_name, get_coordinates(group).tolist()
+
 
 def rad(value):
     return value * pi / 180
@@ -86,7 +128,11 @@ def reduce_points_in_a_line(
     max_angle_for_weighting=25,
     reduce_area_to_point=False,
     threshold_area_in_meter_square=100,
-    **kwargs
+    engine="python",
+    algorithm="angle",
+    tolerance=None,
+    target_points=None,
+    **kwargs,
 ):
     """Given a list of coordinates remove redundant points in a line
 
@@ -97,26 +143,51 @@ def reduce_points_in_a_line(
     :param allowed_angle_deviation: allowed max deviation of a point from the line drawn by the 2
         previous points to still be considered straight
     :type allowed_angle_deviation: Optional[float]
+    :param engine: "python" checks the points one by one, "numpy" checks them in vectorised runs with the same result,
+        which is much faster for long lines
+    :type engine: Optional[str]
+    :param algorithm: "angle" removes points by the angle at each point, "douglas-peucker" keeps every removed point
+        within tolerance (coordinate units) of the line, "visvalingam-whyatt" removes points forming triangles smaller
+        than tolerance (coordinate units squared) with their neighbours
+    :type algorithm: Optional[str]
+    :param tolerance: tolerance of the douglas-peucker and visvalingam-whyatt algorithms, defaults to 0
+    :type tolerance: Optional[float]
+    :param target_points: number of points to keep with the douglas-peucker (at most) and visvalingam-whyatt
+        algorithms instead of using a tolerance
+    :type target_points: Optional[int]
     """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown thinning engine: {engine}, expected one of {ENGINES}")
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown thinning algorithm: {algorithm}, expected one of {ALGORITHMS}")
+
     if reduce_area_to_point and len(coordinates) >= 3:
         coordinates = reduce_small_areas_to_points(
             coordinates, threshold_area_in_meter_square=threshold_area_in_meter_square
         )
 
+    if len(coordinates) >= 3 and algorithm in SIMPLIFICATION_ALGORITHMS:
+        kept_positions = SIMPLIFICATION_ALGORITHMS[algorithm](
+            coordinates, tolerance=tolerance or 0, target_points=target_points
+        )
+        return [coordinates[i] for i in kept_positions]
+
     if len(coordinates) >= 3:
 
         prev_coordinate = None
         current_coordinate = None
         next_coordinate = None
-        thinning_approach = (
-            constant_angle_deviation_check if not use_weighted_tolerance else length_weighted_angle_deviation_check
-        )
-        thinning_function_kwargs = (
-            {}
-            if not use_weighted_tolerance
-            else {"max_distance_for_weighting": max_distance_for_weighting, "max_angle": max_angle_for_weighting}
+        thinning_approach, thinning_function_kwargs = get_thinning_approach(
+            use_weighted_tolerance, max_distance_for_weighting, max_angle_for_weighting
         )
 
+        if engine == "numpy":
+            kept_positions = get_kept_positions(
+                coordinates, allowed_angle_deviation, thinning_approach, thinning_function_kwargs
+            )
+            return [coordinates[i] for i in kept_positions]
+
         reduced_coordinates = []
 
         for i in range(len(coordinates)):
@@ -147,6 +218,50 @@ def reduce_points_in_a_line(
     return coordinates
 
 
+def get_thinning_approach(use_weighted_tolerance, max_distance_for_weighting, max_angle_for_weighting):
+    """Return the angle check of reduce_points_in_a_line and its extra arguments"""
+    if not use_weighted_tolerance:
+        return constant_angle_deviation_check, {}
+
+    return length_weighted_angle_deviation_check, {
+        "max_distance_for_weighting": max_distance_for_weighting,
+        "max_angle": max_angle_for_weighting,
+    }
+
+
+def get_thinning_levels(
+    coordinates,
+    allowed_angle_deviations,
+    use_weighted_tolerance=False,
+    max_distance_for_weighting=0.05,
+    max_angle_for_weighting=25,
+    **kwargs,
+):
+    """Return the positions of the coordinates reduce_points_in_a_line keeps for every allowed angle deviation
+
+    The angles at every point are computed once for all the levels, the levels are otherwise the same as
+    reduce_points_in_a_line with the "angle" algorithm (without reduce_area_to_point).
+    """
+    if len(coordinates) < 3:
+        return [list(range(len(coordinates))) for _ in allowed_angle_deviations]
+
+    thinning_approach, thinning_function_kwargs = get_thinning_approach(
+        use_weighted_tolerance, max_distance_for_weighting, max_angle_for_weighting
+    )
+    neighbour_angles = get_neighbour_angles(coordinates)
+
+    return [
+        get_kept_positions(
+            coordinates,
+            allowed_angle_deviation,
+            thinning_approach,
+            thinning_function_kwargs,
+            neighbour_angles=neighbour_angles,
+        )
+        for allowed_angle_deviation in allowed_angle_deviations
+    ]
+
+
 def constant_angle_deviation_check(
     prev_coordinate, current_coordinate, next_coordinate, allowed_angle_deviation=1, **kwargs
 ):
@@ -0,0 +1,105 @@
+"""Thinning options of the command line shared by line_thinner, the pipeline and txt_to_kml --lod-levels
+
+Options not given on the command line are taken from config.json in the working directory, then the defaults.
+"""
+import json
+import os
+
+from line_thinner.line_thinner import ALGORITHMS, ENGINES
+
+DEFAULT_ALLOWED_ANGLE_DEVIATION = 1
+DEFAULT_USE_WEIGHTED_TOLERANCE = False
+DEFAULT_MAX_DISTANCE_FOR_WEIGHTING = 0.01
+DEFAULT_ANGLE_FOR_WEIGHTING = 15
+DEFAULT_REDUCE_AREA_TO_POINT = False
+DEFAULT_AREA_TO_POINT_THRESHOLD = 100
+DEFAULT_ENGINE = "python"
+DEFAULT_ALGORITHM = "angle"
+
+config_file = "config.json"
+if os.path.isfile(config_file):
+    with open("config.json", "r") as fi:
+        config_data = json.load(fi)
+else:
+    config_data = {}
+
+
+def add_thinning_arguments(parser):
+    parser.add_argument(
+        "--use-distance-weighted",
+        dest="use_weighted_tolerance",
+        help="<Optional> Smaller distance between the points allow for higher angle deviation",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--allowed-angle-deviation", help="<Optional> Angular deviation allowed from straight line", type=float
+    )
+    parser.add_argument(
+        "--max-distance-for-weighting",
+        help=(
+            "<Optional> Distance under which lines get weighted, if using distance weighted.\n"
+            "Distances above this will use 'allowed-angle-deviation' angle"
+        ),
+        type=float,
+    )
+    parser.add_argument(
+        "--max-angle-for-weighting",
+        help="<Optional> When using distance weighted, this will be the maximum angle for distance close to zero",
+        type=float,
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        help="<Optional> 'numpy' gives the same result as 'python' in vectorised runs, faster for long lines",
+    )
+    parser.add_argument(
+        "--algorithm",
+        choices=ALGORITHMS,
+        help=(
+            "<Optional> 'angle' checks the angle at every point, 'douglas-peucker' keeps the line within 'tolerance' "
+            "of the input and 'visvalingam-whyatt' removes points adding less than 'tolerance' area"
+        ),
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        help=(
+            "<Optional> Distance (douglas-peucker) or area (visvalingam-whyatt) in coordinate units under which "
+            "points are removed"
+        ),
+    )
+    parser.add_argument(
+        "--target-points",
+        type=int,
+        help="<Optional> Number of points to keep per line with douglas-peucker or visvalingam-whyatt",
+    )
+    parser.add_argument("--reduce-area-to-point", action="store_true")
+    parser.add_argument("--area-to-point-threshold", type=int, default=100)
+
+
+def get_thinning_options(args):
+    """reduce_points_in_a_line arguments of the command line arguments added by add_thinning_arguments"""
+    return {
+        "allowed_angle_deviation": args.allowed_angle_deviation
+        if args.allowed_angle_deviation
+        else config_data.get("allowed_angle_deviation", DEFAULT_ALLOWED_ANGLE_DEVIATION),
+        "use_weighted_tolerance": args.use_weighted_tolerance
+        if args.use_weighted_tolerance
+        else config_data.get("use_weighted_tolerance", DEFAULT_USE_WEIGHTED_TOLERANCE),
+        "max_distance_for_weighting": args.max_distance_for_weighting
+        if args.max_distance_for_weighting
+        else config_data.get("max_distance_for_weighting", DEFAULT_MAX_DISTANCE_FOR_WEIGHTING),
+        "max_angle_for_weighting": args.max_angle_for_weighting
+        if args.max_angle_for_weighting
+        else config_data.get("max_angle_for_weighting", DEFAULT_ANGLE_FOR_WEIGHTING),
+        "reduce_area_to_point": args.reduce_area_to_point
+        if args.reduce_area_to_point
+        else config_data.get("reduce_area_to_point", DEFAULT_REDUCE_AREA_TO_POINT),
+        "threshold_area_in_meter_square": args.area_to_point_threshold
+        if args.area_to_point_threshold
+        else config_data.get("area_to_point_threshold", DEFAULT_AREA_TO_POINT_THRESHOLD),
+        "engine": args.engine if args.engine else config_data.get("engine", DEFAULT_ENGINE),
+        "algorithm": args.algorithm if args.algorithm else config_data.get("algorithm", DEFAULT_ALGORITHM),
+        "tolerance": args.tolerance if args.tolerance is not None else config_data.get("tolerance"),
+        "target_points": args.target_points if args.target_points else config_data.get("target_points"),
+    }
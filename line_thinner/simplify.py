@@ -0,0 +1,227 @@
+"""Douglas-Peucker and Visvalingam-Whyatt simplification for reduce_points_in_a_line
+
+Both work on the longitude, latitude and altitude of the points and return the positions of the points kept, the
+first and last point are always kept. Distances are in coordinate units (degrees), areas in coordinate units squared.
+"""
+import heapq
+from struct import Struct
+
+import numpy as np
+
+# Segments of Douglas-Peucker with more points are split one by one rather than in the batch of their pass
+MIN_UNBATCHED_SEGMENT_POINTS = 4096
+
+
+def get_points(coordinates):
+    return np.asarray(coordinates, dtype=np.float64)[:, :3]
+
+
+def get_offset_distances(offsets, segments):
+    """Distances of points to their segments, given per axis with the points as offsets from their segment start
+
+    Computed axis by axis the same way for one segment or a batch of them, so both give the same distances.
+    """
+    length_squared = 0
+    dot = 0
+    for offset, segment in zip(offsets, segments):
+        length_squared = length_squared + segment * segment
+        dot = dot + offset * segment
+
+    # Closed rings start and end on the same point, their distances are to the start point
+    t = np.divide(dot, length_squared, out=np.zeros_like(dot), where=length_squared != 0)
+    np.clip(t, 0, 1, out=t)
+
+    distances = 0
+    for offset, segment in zip(offsets, segments):
+        projected = offset - t * segment
+        distances = distances + projected * projected
+    return np.sqrt(distances)
+
+
+def get_segment_distances(points, start, end):
+    """Distances of the points between start and end to the segment from points[start] to points[end]"""
+    offsets = [points[start + 1 : end, axis] - points[start, axis] for axis in range(3)]
+    return get_offset_distances(offsets, points[end] - points[start])
+
+
+def get_farthest_point(points, start, end):
+    """Return (distance, position) of the point between start and end farthest from their segment"""
+    distances = get_segment_distances(points, start, end)
+    farthest = int(np.argmax(distances))
+    return distances[farthest], start + 1 + farthest
+
+
+def get_farthest_points(columns, starts, ends):
+    """Same as get_farthest_point for many segments at once, return (distances, positions) arrays
+
+    Every segment needs at least one point between its start and end.
+
+    :param columns: contiguous longitude, latitude and altitude arrays of the points
+    """
+    lengths = ends - starts - 1
+    first_inner = np.cumsum(lengths) - lengths
+    segment_ids = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.arange(len(segment_ids)) + (starts + 1 - first_inner)[segment_ids]
+    point_starts = starts[segment_ids]
+
+    offsets = [column[positions] - column[point_starts] for column in columns]
+    segments = [(column[ends] - column[starts])[segment_ids] for column in columns]
+    distances = get_offset_distances(offsets, segments)
+
+    farthest_distances = np.maximum.reduceat(distances, first_inner)
+    # The first farthest point of each segment, as np.argmax picks
+    farthest = np.flatnonzero(distances == farthest_distances[segment_ids])
+    first = farthest[np.diff(segment_ids[farthest], prepend=-1) != 0]
+    return farthest_distances, positions[first]
+
+
+def douglas_peucker(coordinates, tolerance=0, target_points=None):
+    """Return the positions kept by the Douglas-Peucker algorithm
+
+    Segments are split at their farthest point while it is further than tolerance from the segment. With
+    target_points the segment with the farthest point is split first, until target_points points are kept or no
+    point is further than tolerance.
+    """
+    points = get_points(coordinates)
+    last = len(points) - 1
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, last]] = True
+
+    if target_points is not None:
+        # Max heap on the distance of the farthest point of each segment
+        segments = []
+        if last > 1:
+            distance, position = get_farthest_point(points, 0, last)
+            segments.append((-distance, 0, last, position))
+
+        kept = 2
+        while segments and kept < target_points:
+            negative_distance, start, end, position = heapq.heappop(segments)
+            if -negative_distance <= tolerance:
+                break
+
+            keep[position] = True
+            kept += 1
+            for segment_start, segment_end in ((start, position), (position, end)):
+                if segment_end - segment_start > 1:
+                    distance, farthest = get_farthest_point(points, segment_start, segment_end)
+                    heapq.heappush(segments, (-distance, segment_start, segment_end, farthest))
+    else:
+        # The kept points do not depend on the order the segments are split in, so all the segments of a pass are
+        # split at once, one vectorized computation per pass instead of several numpy calls per segment
+        columns = [np.ascontiguousarray(points[:, axis]) for axis in range(3)]
+        starts = np.array([0])
+        ends = np.array([last])
+        while True:
+            has_inner = ends - starts > 1
+            starts, ends = starts[has_inner], ends[has_inner]
+            if not len(starts):
+                break
+
+            # Large segments are as fast on their own and skip the indexing of the batch
+            distances = np.empty(len(starts))
+            positions = np.empty(len(starts), dtype=np.int64)
+            large = ends - starts > MIN_UNBATCHED_SEGMENT_POINTS
+            for i in np.flatnonzero(large).tolist():
+                distances[i], positions[i] = get_farthest_point(points, int(starts[i]), int(ends[i]))
+            if not large.all():
+                small = ~large
+                distances[small], positions[small] = get_farthest_points(columns, starts[small], ends[small])
+
+            split = distances > tolerance
+            keep[positions[split]] = True
+            starts, ends = (
+                np.concatenate([starts[split], positions[split]]),
+                np.concatenate([positions[split], ends[split]]),
+            )
+
+    return np.flatnonzero(keep).tolist()
+
+
+def get_triangle_areas(points_a, points_b, points_c):
+    cross = np.cross(points_a - points_b, points_c - points_b)
+    return 0.5 * np.sqrt(np.einsum("ij,ij->i", cross, cross))
+
+
+def get_triangle_area(xs, ys, zs, a, b, c):
+    """Area of the triangle between points a, b and c of the xs, ys and zs coordinate lists"""
+    ax, ay, az = xs[a] - xs[b], ys[a] - ys[b], zs[a] - zs[b]
+    cx, cy, cz = xs[c] - xs[b], ys[c] - ys[b], zs[c] - zs[b]
+    x, y, z = ay * cz - az * cy, az * cx - ax * cz, ax * cy - ay * cx
+    return 0.5 * (x * x + y * y + z * z) ** 0.5
+
+
+def visvalingam_whyatt(coordinates, tolerance=0, target_points=None):
+    """Return the positions kept by the Visvalingam-Whyatt algorithm
+
+    The point forming the smallest triangle with its neighbours is removed until every triangle is larger than
+    tolerance, or when target_points is given until that many points are left whatever their areas. The area of a
+    point never drops below the area of a point removed before it, so removals stay in order of importance.
+    """
+    points = get_points(coordinates)
+    count = len(points)
+    last = count - 1
+
+    areas = np.full(count, np.inf)
+    if count > 2:
+        areas[1:last] = get_triangle_areas(points[:-2], points[1:-1], points[2:])
+
+    # Heap keys are ints ordering by area then position, the bits of a positive float order the same as the float
+    # and ints compare much faster than (area, position) tuples
+    shift = max(count.bit_length(), 1)
+    mask = (1 << shift) - 1
+    pack_area = Struct("<d").pack
+    unpack_bits = Struct("<q").unpack
+
+    candidates = np.arange(1, last)
+    if target_points is None:
+        # Points above the tolerance are only removed once their area is updated to one below it
+        candidates = candidates[areas[1:last] <= tolerance]
+    keys = [(bits << shift) | i for bits, i in zip(areas.view(np.int64)[candidates].tolist(), candidates.tolist())]
+    heap = list(keys)
+    heapq.heapify(heap)
+
+    current_keys = [None] * count
+    for key in keys:
+        current_keys[key & mask] = key
+
+    # Single triangles are faster in plain python than in numpy, flat lists keep the objects allocated to a minimum
+    xs, ys, zs = (points[:, axis].tolist() for axis in range(3))
+    areas = areas.tolist()
+    previous = list(range(-1, count - 1))
+    following = list(range(1, count + 1))
+
+    removed = [False] * count
+    remaining = count
+    min_remaining = max(target_points, 2) if target_points is not None else 2
+    while heap and remaining > min_remaining:
+        key = heapq.heappop(heap)
+        i = key & mask
+        if key != current_keys[i]:
+            # Stale entry, the area of the point changed since it was pushed
+            continue
+
+        area = areas[i]
+        if target_points is None and area > tolerance:
+            break
+
+        removed[i] = True
+        current_keys[i] = None
+        remaining -= 1
+
+        before = previous[i]
+        after = following[i]
+        following[before] = after
+        previous[after] = before
+
+        for neighbour in (before, after):
+            if neighbour == 0 or neighbour == last:
+                continue
+
+            neighbour_area = get_triangle_area(xs, ys, zs, previous[neighbour], neighbour, following[neighbour])
+            neighbour_area = areas[neighbour] = max(neighbour_area, area)
+            key = (unpack_bits(pack_area(neighbour_area))[0] << shift) | neighbour
+            current_keys[neighbour] = key
+            heapq.heappush(heap, key)
+
+    return [i for i in range(count) if not removed[i]]
@@ -0,0 +1,281 @@
+"""Numpy engine for reduce_points_in_a_line
+
+The python engine checks every point against the last kept point (prev) and the point after it, resetting prev
+whenever a point is kept. That makes every decision depend on the previous ones, so the decisions are made in
+runs instead of one by one:
+
+- While the previous point was kept, prev is simply the point before, so the checks against the direct
+  neighbours (computed for all points at once) decide every point up to the first one that is dropped.
+- After a drop prev stays fixed at the point before the drop, so the points after it are checked against that
+  prev until one is kept. The runs after the first drop of consecutive drops are checked up front for all of
+  them at once, other runs point by point and then in growing windows.
+
+The vectorised maths follows the python functions operation by operation. Where numpy and python could still
+round differently (values on a rounding boundary, or outside the domain of acos) the python check is used, so
+the result is always identical to the python engine.
+"""
+from bisect import bisect_left
+
+import numpy as np
+
+# Points after every drop checked up front against the point before the drop, the run grows by RUN_GROWTH for
+# drops without a kept point while the checks stay within RUN_CHECKS_BUDGET times the number of points
+SHORT_RUN = 16
+RUN_GROWTH = 4
+RUN_CHECKS_BUDGET = 8
+DROPS_CHUNK_SIZE = 1 << 14
+
+# Points checked one by one against a fixed prev point before checking them in windows
+SCALAR_RUN = 16
+
+# Size of the first window of points checked against a fixed prev point once the budget is spent, doubled while
+# nothing is kept
+INITIAL_WINDOW = 256
+MAX_WINDOW = 1 << 16
+
+# Distance to a rounding boundary under which numpy and python rounding are not trusted to agree
+ROUNDING_MARGIN = 1e-6
+
+
+def get_distances(points_a, points_b):
+    dx = points_b[:, 0] - points_a[:, 0]
+    dy = points_b[:, 1] - points_a[:, 1]
+    dz = points_b[:, 2] - points_a[:, 2]
+    return np.sqrt(dx * dx + dy * dy + dz * dz)
+
+
+def near_rounding_boundary(values, digits):
+    scaled = values * 10.0**digits
+    return np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_MARGIN
+
+
+def get_angles(points_a, points_b, points_c, round_to=5):
+    """Vectorised angle_between_3_points, also returning a mask of angles that may not match it exactly"""
+    distance_a_b = get_distances(points_a, points_b)
+    distance_b_c = get_distances(points_b, points_c)
+    distance_a_c = get_distances(points_a, points_c)
+
+    sum_of_squares = distance_a_b * distance_a_b + distance_b_c * distance_b_c - distance_a_c * distance_a_c
+    denominator = 2 * distance_a_b * distance_b_c
+    duplicates = denominator == 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_angle = sum_of_squares / denominator
+        rounded_cos_angle = np.round(cos_angle, 6)
+        degrees = np.degrees(np.arccos(rounded_cos_angle))
+
+    angles = np.round(degrees, round_to)
+    uncertain = near_rounding_boundary(cos_angle, 6) | near_rounding_boundary(degrees, round_to)
+    uncertain |= ~np.isfinite(angles)
+
+    angles[duplicates] = 180
+    uncertain[duplicates] = False
+
+    return angles, uncertain, distance_a_c
+
+
+def get_neighbour_angles(coordinates):
+    """get_angles at every inner point with the points before and after it
+
+    These do not depend on the allowed deviation, so they can be shared by the thinning of a line at several levels.
+    """
+    points = np.asarray(coordinates, dtype=np.float64)[:, :3]
+    return get_angles(points[:-2], points[1:-1], points[2:])
+
+
+class ThinningChecks:
+    """Vectorised constant_angle_deviation_check / length_weighted_angle_deviation_check over point positions"""
+
+    def __init__(self, coordinates, allowed_angle_deviation, thinning_approach, thinning_function_kwargs):
+        self.coordinates = coordinates
+        self.points = np.asarray(coordinates, dtype=np.float64)[:, :3]
+        self.allowed_angle_deviation = allowed_angle_deviation
+        self.thinning_approach = thinning_approach
+        self.thinning_function_kwargs = thinning_function_kwargs
+        # length_weighted_angle_deviation_check is the only approach taking extra arguments
+        self.use_weighted_tolerance = bool(thinning_function_kwargs)
+
+    def get_allowed_deviations(self, distance_prev_next):
+        if not self.use_weighted_tolerance:
+            return self.allowed_angle_deviation
+
+        max_distance_for_weighting = self.thinning_function_kwargs["max_distance_for_weighting"]
+        max_angle = self.thinning_function_kwargs["max_angle"]
+
+        if max_distance_for_weighting - 0 == 0:
+            weighted = np.full(len(distance_prev_next), max_angle, dtype=np.float64)
+        else:
+            # Same operations as linear_conversion(distance, 0, max_distance_for_weighting, max_angle, allowed)
+            weighted = (
+                ((distance_prev_next - 0) * (self.allowed_angle_deviation - max_angle))
+                / (max_distance_for_weighting - 0)
+            ) + max_angle
+
+        return np.where(distance_prev_next <= max_distance_for_weighting, weighted, self.allowed_angle_deviation)
+
+    def check(self, prev_positions, current_positions):
+        """Return whether each current point is kept given its prev point, the next point is the one after it"""
+        points = self.points
+        prev_positions = np.atleast_1d(prev_positions)
+        angles = get_angles(points[prev_positions], points[current_positions], points[current_positions + 1])
+        return self.decide(angles, prev_positions, current_positions)
+
+    def check_neighbours(self, neighbour_angles=None):
+        """check for every inner point with the point before it as prev, from get_neighbour_angles if given"""
+        inner_positions = np.arange(1, len(self.points) - 1)
+        if neighbour_angles is None:
+            return self.check(inner_positions - 1, inner_positions)
+        return self.decide(neighbour_angles, inner_positions - 1, inner_positions)
+
+    def decide(self, angles, prev_positions, current_positions):
+        angles, uncertain, distance_prev_next = angles
+        keep = (180 - angles) > self.get_allowed_deviations(distance_prev_next)
+
+        if uncertain.any():
+            prev_positions = np.broadcast_to(prev_positions, current_positions.shape)
+            for j in np.flatnonzero(uncertain).tolist():
+                keep[j] = self.check_one(int(prev_positions[j]), int(current_positions[j]))
+
+        return keep
+
+    def check_one(self, prev_position, current_position):
+        coordinates = self.coordinates
+        return self.thinning_approach(
+            coordinates[prev_position],
+            coordinates[current_position],
+            coordinates[current_position + 1],
+            allowed_angle_deviation=self.allowed_angle_deviation,
+            **self.thinning_function_kwargs,
+        )
+
+
+def check_runs_after_drops(checks, drops, start_offset, end_offset, last):
+    """Check the points from drop + start_offset up to drop + end_offset against the point before each drop
+
+    Return the first kept position for every drop, -1 where none of the points is kept.
+    """
+    next_kept = np.full(len(drops), -1, dtype=np.int64)
+    offsets = np.arange(start_offset, end_offset)
+
+    for start in range(0, len(drops), DROPS_CHUNK_SIZE):
+        chunk = drops[start : start + DROPS_CHUNK_SIZE]
+        current_positions = chunk[:, None] + offsets[None, :]
+        prev_positions = np.broadcast_to(chunk[:, None] - 1, current_positions.shape)
+
+        valid = current_positions < last
+        keep = np.zeros(current_positions.shape, dtype=bool)
+        keep[valid] = checks.check(prev_positions[valid], current_positions[valid])
+
+        found = keep.any(axis=1)
+        first = np.argmax(keep, axis=1)
+        next_kept[start : start + DROPS_CHUNK_SIZE] = np.where(
+            found, current_positions[np.arange(len(chunk)), first], -1
+        )
+
+    return next_kept
+
+
+def get_next_kept_positions(checks, drops, last):
+    """For every drop, the first point kept after it when prev is the point before the drop
+
+    Runs are checked for all drops at once with growing lengths while the number of checks stays within
+    RUN_CHECKS_BUDGET times the number of points. Returns the kept positions (-1 if not found yet) and the position
+    the search stopped at for every drop.
+    """
+    next_kept = np.full(len(drops), -1, dtype=np.int64)
+    searched_until = drops + 1
+    budget = RUN_CHECKS_BUDGET * (last + 1)
+
+    start_offset = 1
+    run_length = SHORT_RUN
+    unresolved = np.arange(len(drops))
+    while len(unresolved) and len(unresolved) * run_length <= budget:
+        end_offset = start_offset + run_length
+        found = check_runs_after_drops(checks, drops[unresolved], start_offset, end_offset, last)
+
+        next_kept[unresolved] = found
+        searched_until[unresolved] = drops[unresolved] + end_offset
+
+        budget -= len(unresolved) * run_length
+        unresolved = unresolved[(found == -1) & (drops[unresolved] + end_offset < last)]
+        start_offset = end_offset
+        run_length *= RUN_GROWTH
+
+    return next_kept, searched_until
+
+
+def find_next_kept_position(checks, prev, i, last):
+    """Check the points from i against a fixed prev, return the first kept one or None
+
+    The first points are checked one by one as the kept point is usually close, the rest in growing windows.
+    """
+    for current in range(i, min(i + SCALAR_RUN, last)):
+        if checks.check_one(prev, current):
+            return current
+    i += SCALAR_RUN
+
+    window = INITIAL_WINDOW
+    while i < last:
+        current_positions = np.arange(i, min(i + window, last))
+        keep = checks.check(prev, current_positions)
+        if keep.any():
+            return int(current_positions[np.argmax(keep)])
+
+        i = int(current_positions[-1]) + 1
+        window = min(window * 2, MAX_WINDOW)
+
+    return None
+
+
+def get_kept_positions(
+    coordinates, allowed_angle_deviation, thinning_approach, thinning_function_kwargs, neighbour_angles=None
+):
+    """Return the positions of the coordinates kept by the sequential thinning of reduce_points_in_a_line
+
+    :param thinning_approach: check used for points numpy and python may disagree on, see ThinningChecks
+    :param neighbour_angles: get_neighbour_angles of the coordinates, computed if not given
+    """
+    last = len(coordinates) - 1
+
+    checks = ThinningChecks(coordinates, allowed_angle_deviation, thinning_approach, thinning_function_kwargs)
+
+    # Decisions for every inner point when the point before it was kept
+    inner_positions = np.arange(1, last)
+    drops = inner_positions[~checks.check_neighbours(neighbour_angles)]
+
+    # Runs after a drop start with the point before the drop as prev. Only some drops are actually reached, mostly
+    # the first of consecutive drops, so the runs after those are checked for all of them at once
+    next_kept = np.full(len(drops), -1, dtype=np.int64)
+    searched_until = drops + 1
+    first_drops = np.flatnonzero(np.diff(drops, prepend=-1) != 1)
+    next_kept[first_drops], searched_until[first_drops] = get_next_kept_positions(checks, drops[first_drops], last)
+
+    next_kept = next_kept.tolist()
+    searched_until = searched_until.tolist()
+    drops = drops.tolist()
+
+    kept = [0]
+    i = 1
+    drop_index = 0
+    while i < last:
+        # The point before i was kept, keep everything up to the next drop with respect to its neighbour
+        drop_index = bisect_left(drops, i, lo=drop_index)
+        if drop_index == len(drops):
+            kept.extend(range(i, last))
+            break
+
+        drop = drops[drop_index]
+        kept.extend(range(i, drop))
+
+        # prev is now fixed at drop - 1 until a point after the drop is kept
+        k = next_kept[drop_index]
+        if k == -1:
+            k = find_next_kept_position(checks, drop - 1, searched_until[drop_index], last)
+            if k is None:
+                break
+
+        kept.append(k)
+        i = k + 1
+
+    kept.append(last)
+    return kept
@@ -1,11 +1,21 @@
 import os
 import argparse
-
-from concurrent.futures import ThreadPoolExecutor
-
-from core.txt_file.write_txt_file import txt_list_writer
-from multipolygon_fixer.merge_rings import process_feature_nodes
-from core.txt_file.read_txt_file import read_txt_file
+from functools import partial
+
+from core.executor import add_executor_arguments, get_staged_options
+from core.metrics import (
+    WRITE,
+    add_metrics_arguments,
+    count_written,
+    measure_map,
+    measure_reading,
+    measure_stage,
+    run_measured_workers,
+)
+from core.txt_file.cache import add_cache_arguments
+from core.txt_file.write_txt_file import txt_list_session
+from multipolygon_fixer.merge_rings import get_fixed_groups
+from core.txt_file.read_txt_file import get_read_options, read_txt_file
 from core.utilities import file_handler
 
 
@@ -13,32 +23,38 @@ def get_txt_row(index, longitude, latitude, altitude, name):
     return [index, longitude, latitude, altitude, name]
 
 
-def worker(option):
+def get_feature_node_groups(input_file, columnar=False, read_options=None, staged_options=None, metrics=None):
+    # yield [(name, [(longitude, latitude, altitude)])] of the completed and incomplete rings of every feature
+    # With staged_options the features are read and fixed ahead while the caller writes the groups
+    read_options = read_options or {}
+    features = measure_reading(metrics, read_txt_file(input_file, columnar=columnar, **read_options))
+    yield from measure_map(metrics, partial(get_fixed_groups, columnar=columnar), features, staged_options)
+
+
+def worker(option, metrics=None):
     with file_handler(option["output_file"], replace=option["replace"]) as filepath:
         counter = 0
-        for this_feature_nodes in read_txt_file(option["input_file"]):
-            completed_rings, incomplete_groups = process_feature_nodes(this_feature_nodes)
-            with txt_list_writer(filepath) as (tsv_writer, last_index):
+        group_counter = 0
+        with txt_list_session(filepath) as txt_writer, measure_stage(metrics, WRITE):
+            for groups in get_feature_node_groups(
+                option["input_file"],
+                columnar=option["columnar"],
+                read_options=option["read_options"],
+                staged_options=option["staged_options"],
+                metrics=metrics,
+            ):
+                group_counter += len(groups)
                 current_write_counter = 0
-                this_index = last_index + current_write_counter + 1
-                for nodes in completed_rings:
-                    name = nodes[0]['sub_name'] if nodes[0]['sub_name'] else nodes[0]['name']
-                    for node in nodes:
-                        row = get_txt_row(this_index, node['longitude'], node['latitude'], node['altitude'], name)
-                        tsv_writer.writerow(row)
-                        
-                        counter += 1
-                        current_write_counter += 1
-                
-                for nodes in incomplete_groups:
-                    name = nodes[0]['name'] + ("-" + nodes[0]['sub_name'] if nodes[0]['sub_name'] else "")
-                    for node in nodes:
-                        row = get_txt_row(this_index, node['longitude'], node['latitude'], node['altitude'], name)
-                        tsv_writer.writerow(row)
-                        
+                this_index = txt_writer.last_index + current_write_counter + 1
+                for name, coordinates in groups:
+                    for longitude, latitude, altitude in coordinates:
+                        row = get_txt_row(this_index, longitude, latitude, altitude, name)
+                        txt_writer.writerow(row)
+
                         counter += 1
                         current_write_counter += 1
 
+    count_written(metrics, group_counter, counter)
     return counter
 
 
@@ -53,6 +69,9 @@ def get_file_options(input_item, args):
 
     return {
         "replace": args.replace,
+        "columnar": args.columnar,
+        "read_options": get_read_options(args),
+        "staged_options": get_staged_options(args),
         "input_file": filepath,
         "output_file": filepath if args.replace else os.path.join(output_folder, basename)
     }
@@ -75,6 +94,14 @@ def main():
         help='<Optional> Folder to put the output files in if replace is False',
         required=False
     )
+    parser.add_argument(
+        "--columnar",
+        help='<Optional> Read the input into numpy arrays instead of per node dicts, faster for large files',
+        action="store_true"
+    )
+    add_executor_arguments(parser)
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     options = []
@@ -89,13 +116,9 @@ def main():
                 if os.path.isfile(filepath) and filepath.endswith('.txt'):
                     options.append(get_file_options(filepath, args))
 
-    # Set up multithreading
-    number_of_threads = 10
-    with ThreadPoolExecutor(max_workers = number_of_threads) as executor:
-        results = executor.map(worker, options)
-
-    for result in results:
-        print(result)
+    # Results come back per file as the workers complete
+    for option, result in run_measured_workers(worker, options, args):
+        print(option["input_file"], result)
 
 if __name__ == "__main__":  # pragma: no cover
     main()
@@ -1,5 +1,15 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 
+import numpy as np
+
+from core.txt_file.columnar import (
+    NO_SUB_NAME,
+    get_array_ids,
+    get_array_node_name,
+    get_coordinates,
+    get_sub_name,
+    is_array_ring_closed,
+)
 from core.txt_file.logic import is_ring_closed
 
 
@@ -20,77 +30,205 @@ def process_feature_nodes(feature_nodes):
         return merge_rings(rings.values())
 
 
-def merge_rings(rings):
+def process_feature_array(array, metadata):
+    # Same as process_feature_nodes for a feature from read_txt_file(..., columnar=True)
+    # return [[completed_rings], [incomplete_rings, points]] as arrays
+    if len(array) < 3:
+        return [[], [array]]
+
+    if array["sub_name_code"][0] == NO_SUB_NAME:
+        return [[], [array]]
+    elif is_array_ring_closed(array):
+        return [[array], []]
+    else:
+        # Merge rings of row positions, keyed by the node ids of the rows
+        ids = get_array_ids(array)
+        codes = array["sub_name_code"]
+        _, first_positions = np.unique(codes, return_index=True)
+        rings = [np.flatnonzero(codes == codes[position]).tolist() for position in np.sort(first_positions)]
+
+        complete, incomplete = merge_rings(rings, key=ids.__getitem__)
+        return [array[ring] for ring in complete], [array[ring] for ring in incomplete]
+
+
+def get_fixed_node_groups(feature_nodes):
+    # return [(name, [(longitude, latitude, altitude)])] of the completed and incomplete rings of the feature, named
+    # the way multipolygon_fixer writes them
+    completed_rings, incomplete_groups = process_feature_nodes(feature_nodes)
+    groups = []
+    for nodes in completed_rings:
+        name = nodes[0]['sub_name'] if nodes[0]['sub_name'] else nodes[0]['name']
+        groups.append((name, [(node['longitude'], node['latitude'], node['altitude']) for node in nodes]))
+
+    for nodes in incomplete_groups:
+        name = nodes[0]['name'] + ("-" + nodes[0]['sub_name'] if nodes[0]['sub_name'] else "")
+        groups.append((name, [(node['longitude'], node['latitude'], node['altitude']) for node in nodes]))
+    return groups
+
+
+def get_fixed_array_groups(array, metadata):
+    # Same as get_fixed_node_groups for a feature from read_txt_file(..., columnar=True)
+    completed_rings, incomplete_groups = process_feature_array(array, metadata)
+    groups = []
+    for ring in completed_rings:
+        sub_name = get_sub_name(metadata, ring["sub_name_code"][0])
+        name = sub_name if sub_name else metadata["names"][ring["name_code"][0]]
+        groups.append((name, get_coordinates(ring).tolist()))
+
+    for nodes in incomplete_groups:
+        groups.append((get_array_node_name(nodes, metadata), get_coordinates(nodes).tolist()))
+    return groups
+
+
+def get_fixed_groups(feature, columnar=False):
+    # get_fixed_node_groups or get_fixed_array_groups of a feature from read_txt_file
+    if columnar:
+        array, metadata = feature
+        return get_fixed_array_groups(array, metadata)
+    return get_fixed_node_groups(feature)
+
+
+def get_node_id(node):
+    return node["id"]
+
+
+class RingChain:
+    """Ring joined from segments of the input rings without copying them
+
+    Segments are (sequence, start, stop, reversed) slices of the input rings, reversing the chain only flips a flag
+    and joining moves the segments of the shorter chain, the items are copied once by materialize.
+    """
+
+    def __init__(self, ring):
+        self.segments = deque([(ring, 0, len(ring), False)])
+        self.is_reversed = False
+        self.first = ring[0]
+        self.last = ring[-1]
+
+    def reverse(self):
+        self.is_reversed = not self.is_reversed
+        self.first, self.last = self.last, self.first
+
+    def logical_segments(self):
+        if not self.is_reversed:
+            return iter(self.segments)
+        return (flip_segment(segment) for segment in reversed(self.segments))
+
+    def push_back(self, segment):
+        if self.is_reversed:
+            self.segments.appendleft(flip_segment(segment))
+        else:
+            self.segments.append(segment)
+
+    def push_front(self, segment):
+        if self.is_reversed:
+            self.segments.append(flip_segment(segment))
+        else:
+            self.segments.appendleft(segment)
+
+    def drop_first(self):
+        sequence, start, stop, is_reversed = next(self.logical_segments())
+        if is_reversed:
+            segment = (sequence, start, stop - 1, is_reversed)
+        else:
+            segment = (sequence, start + 1, stop, is_reversed)
+
+        if self.is_reversed:
+            self.segments.pop()
+        else:
+            self.segments.popleft()
+
+        if segment[1] < segment[2]:
+            self.push_front(segment)
+
+    def join(self, other):
+        """Append other without its first item, which is the same node as the last item of this chain"""
+        other.drop_first()
+        if not other.segments:
+            return
+
+        if len(self.segments) >= len(other.segments):
+            for segment in other.logical_segments():
+                self.push_back(segment)
+        else:
+            for segment in reversed(list(self.logical_segments())):
+                other.push_front(segment)
+            self.segments = other.segments
+            self.is_reversed = other.is_reversed
+
+        self.last = other.last
+
+    def materialize(self):
+        items = []
+        for sequence, start, stop, is_reversed in self.logical_segments():
+            segment = sequence[start:stop]
+            items.extend(reversed(segment) if is_reversed else segment)
+        return items
+
+
+def flip_segment(segment):
+    sequence, start, stop, is_reversed = segment
+    return sequence, start, stop, not is_reversed
+
+
+def merge_rings(rings, key=get_node_id):
+    """Join rings sharing endpoints into complete (closed) and incomplete rings
+
+    :param key: function returning the id of a ring item, items with the same id are joined
+    """
     complete = []
     incomplete = []
 
     endpoints = {}
 
     for ring in rings:
-        left = ring[0]
-        left_id = left['id']
-        
-        right = ring[-1]
-        right_id = right['id']
+        ring = RingChain(ring)
+        left_id = key(ring.first)
+        right_id = key(ring.last)
 
         if left_id in endpoints or right_id in endpoints:
             if right_id in endpoints and left_id not in endpoints:
                 # Reverse this so it becomes a left connected ring
                 # We can avoid duplicate code in 'right_id in endpoints' case
-                ring = ring[::-1]
-                
-                left = ring[0]
-                left_id = left['id']
-                
-                right = ring[-1]
-                right_id = right['id']
+                ring.reverse()
+                left_id, right_id = right_id, left_id
 
             this_ring = endpoints.pop(left_id)
- 
-            if left_id == this_ring[-1]["id"]:
-                this_ring = this_ring + ring[1:]
-            else:
-                this_ring = this_ring[::-1]
-                this_ring = this_ring + ring[1:]
-
-            if right_id in endpoints and not is_ring_closed(this_ring):
+
+            if left_id != key(this_ring.last):
+                this_ring.reverse()
+            this_ring.join(ring)
+
+            if right_id in endpoints and key(this_ring.first) != key(this_ring.last):
                 right_ring = endpoints.pop(right_id)
-                if right_id == right_ring[0]['id']:
-                    this_ring = this_ring + right_ring[1:]
-                else:
-                    right_ring = right_ring[::-1]
-                    this_ring = this_ring + right_ring[1:]
+                if right_id != key(right_ring.first):
+                    right_ring.reverse()
+                this_ring.join(right_ring)
 
             if right_id in endpoints:
                 endpoints.pop(right_id)
 
-            endpoints[this_ring[-1]["id"]] = this_ring
-            endpoints[this_ring[0]["id"]] = this_ring    
+            endpoints[key(this_ring.last)] = this_ring
+            endpoints[key(this_ring.first)] = this_ring
         else:
             endpoints[left_id] = ring
             endpoints[right_id] = ring
+            this_ring = ring
 
-        endpoint_ids = list(endpoints.keys())
-        for key in endpoint_ids:
-            if endpoints[key][0]['id'] == endpoints[key][-1]['id']:
-                complete.append(endpoints.pop(key))
-                try:
-                    del endpoints[endpoints[key][0]['id']]
-                except:
-                    pass
-                try:
-                    del endpoints[endpoints[key][-1]['id']]
-                except:
-                    pass
-    
-    endpoint_ids = list(endpoints.keys())
-    written_ids = []
-    for key in endpoint_ids:
-        if key not in written_ids:
-            written_ids.append(key)
-            written_ids.append(endpoints[key][-1]['id'])
-            
-            incomplete.append(endpoints[key])
-            endpoints.pop(endpoints[key][-1]['id'])
+        # Only the ring stored in this iteration can be closed, the others were checked when they were stored
+        first_id = key(this_ring.first)
+        if first_id == key(this_ring.last):
+            complete.append(endpoints.pop(first_id).materialize())
+
+    written_ids = set()
+    for endpoint_id in list(endpoints.keys()):
+        if endpoint_id not in written_ids:
+            ring = endpoints[endpoint_id]
+            last_id = key(ring.last)
+            written_ids.add(endpoint_id)
+            written_ids.add(last_id)
+
+            incomplete.append(ring.materialize())
+            endpoints.pop(last_id)
 
     return complete, incomplete
@@ -0,0 +1,152 @@
+import argparse
+import os
+
+from core.executor import add_executor_arguments, get_staged_options, run_workers_from_args
+from core.kml_file.logic import get_is_area
+from core.kml_file.write_kml_file import DEFAULT_KMZ_COMPRESSION_LEVEL
+from core.txt_file.cache import add_cache_arguments
+from core.txt_file.read_txt_file import get_read_options
+from line_thinner.options import add_thinning_arguments, get_thinning_options
+from pipeline.stages import FIX, KML, STAGES, THIN, TXT_STAGES, run_pipeline
+
+# Suffixes the tools add to their output files by default
+TXT_OUTPUT_SUFFIXES = {FIX: "_mutlipolygon_fixed", THIN: "_points_reduced"}
+
+
+def worker(option):
+    return run_pipeline(
+        option["input_file"],
+        stages=option["stages"],
+        kml_output=option["kml_output"],
+        txt_outputs=option["txt_outputs"],
+        thinning_options=option["thinning_options"],
+        # Taken from the input file name, txt_to_kml would take it from the name of the thinned file
+        is_area=get_is_area(option["input_file"]),
+        kml_options=option["kml_options"],
+        read_options=option["read_options"],
+        staged_options=option["staged_options"],
+    )
+
+
+def get_file_options(input_item, args):
+    filepath = os.path.join(input_item)
+
+    if args.output_folder and not os.path.isdir(args.output_folder):
+        os.makedirs(args.output_folder, exist_ok=True)
+
+    output_folder = (
+        args.output_folder if args.output_folder and os.path.isdir(args.output_folder) else os.path.dirname(filepath)
+    )
+
+    # Outputs are named the way running the tools one after the other names them, the txt output of the last stage
+    # is always written when the kml stage is not run
+    basename = os.path.basename(filepath).replace(".txt", "")
+    txt_outputs = {}
+    for stage in args.stages:
+        if stage in TXT_STAGES:
+            basename += TXT_OUTPUT_SUFFIXES[stage]
+            if args.write_txt or stage == args.stages[-1]:
+                txt_outputs[stage] = os.path.join(output_folder, basename + ".txt")
+
+    kml_output = None
+    if KML in args.stages:
+        kml_output = os.path.join(output_folder, basename + args.output_suffix + (".kmz" if args.kmz else ".kml"))
+
+    return {
+        "stages": args.stages,
+        "read_options": get_read_options(args),
+        "staged_options": get_staged_options(args),
+        "thinning_options": get_thinning_options(args),
+        "kml_options": {
+            "compact": args.compact or args.precision is not None,
+            "precision": args.precision,
+            "kmz": args.kmz,
+            "compression_level": args.compression_level,
+        },
+        "input_file": filepath,
+        "kml_output": kml_output,
+        "txt_outputs": txt_outputs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("Pipeline")
+    parser.add_argument(
+        "-i",
+        "--inputs",
+        nargs="+",
+        help="<Required> TXT filepaths or folders containing files to run through the stages",
+        required=True,
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help=(
+            "<Optional> Stages to run in this order: fix (multipolygon_fixer), thin (line_thinner) and kml "
+            "(txt_to_kml), defaults to all of them"
+        ),
+    )
+    parser.add_argument(
+        "--write-txt",
+        help="<Optional> Also write the txt output of every fix and thin stage run, as the tools would",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-s",
+        "--output-suffix",
+        help="<Optional> Suffix to add to the kml file name based on the input file name",
+        default="",
+        required=False,
+    )
+    parser.add_argument("-o", "--output-folder", help="<Optional> Folder to put the output files in", required=False)
+    parser.add_argument(
+        "--compact",
+        help="<Optional> Write placemarks without indentation and format coordinates in bulk, smaller and faster",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        help="<Optional> Decimals to round the coordinates to, implies --compact",
+    )
+    parser.add_argument(
+        "--kmz",
+        help="<Optional> Write a compressed .kmz instead of a .kml, the kml is compressed while it is written",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_KMZ_COMPRESSION_LEVEL,
+        help=f"<Optional> Compression level of --kmz, 0 to 9, defaults to {DEFAULT_KMZ_COMPRESSION_LEVEL}",
+    )
+    add_thinning_arguments(parser)
+    add_executor_arguments(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    if args.stages != sorted(set(args.stages), key=STAGES.index):
+        parser.error(f"--stages have to be given once each in the order of {STAGES}")
+
+    options = []
+
+    for input_item in args.inputs:
+        if os.path.isfile(input_item) and input_item.endswith(".txt"):
+            options.append(get_file_options(input_item, args))
+        elif os.path.isdir(input_item):
+            folder_items = os.listdir(input_item)
+            for item in folder_items:
+                filepath = os.path.join(input_item, item)
+                if os.path.isfile(filepath) and filepath.endswith(".txt"):
+                    options.append(get_file_options(filepath, args))
+
+    # Results come back per file as the workers complete
+    for option, result in run_workers_from_args(worker, options, args):
+        print(option["input_file"], result)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,159 @@
+"""multipolygon_fixer, line_thinner and txt_to_kml chained over the features of a txt file in memory
+
+Every stage gets the features the previous tool would have written to its txt file and the next tool read back, so
+a run gives the same output as running the tools one after the other without writing and parsing the intermediate
+txt files, which are only written when asked for.
+"""
+from contextlib import ExitStack
+from functools import partial
+
+from core.executor import map_items
+from core.kml_file.write_kml_file import kml_writer
+from core.txt_file.logic import Node, get_feature_name
+from core.txt_file.read_txt_file import read_txt_file
+from core.txt_file.write_txt_file import txt_list_session
+from line_thinner.line_thinner import get_node_coordinate_groups, reduce_points_in_a_named_group
+from multipolygon_fixer.merge_rings import get_fixed_node_groups
+
+FIX = "fix"
+THIN = "thin"
+KML = "kml"
+STAGES = [FIX, THIN, KML]
+TXT_STAGES = [FIX, THIN]
+
+
+def check_stages(stages):
+    if not stages:
+        raise ValueError(f"No stages given, expected some of {STAGES}")
+
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}, expected one of {STAGES}")
+
+    if list(stages) != sorted(set(stages), key=STAGES.index):
+        raise ValueError(f"Stages have to be given once each in the order of {STAGES}: {stages}")
+
+
+def fix_features(features, staged_options=None):
+    """Yield the [(name, coordinates)] groups multipolygon_fixer writes for every feature
+
+    :param staged_options: staged_map arguments to fix the features ahead of the next stage
+    """
+    yield from map_items(get_fixed_node_groups, features, staged_options)
+
+
+def thin_features(features, thinning_options=None, staged_options=None):
+    """Yield the [(name, coordinates)] group line_thinner writes for every named group of every feature
+
+    :param staged_options: staged_map arguments to thin the groups ahead of the next stage
+    """
+    named_groups = (group for feature_nodes in features for group in get_node_coordinate_groups(feature_nodes))
+    reduce_points = partial(reduce_points_in_a_named_group, **(thinning_options or {}))
+    for named_group in map_items(reduce_points, named_groups, staged_options):
+        yield [named_group]
+
+
+def write_txt_groups(txt_writer, batches, shared_index=False):
+    """Write the groups of every batch to a txt list file the way the stage tool writes them, yield the batches
+
+    :param shared_index: give all the rows of a batch the same index, as multipolygon_fixer does for a feature
+    """
+    for groups in batches:
+        last_index = txt_writer.last_index
+        current_write_counter = 0
+        for name, coordinates in groups:
+            for longitude, latitude, altitude in coordinates:
+                index = last_index + 1 if shared_index else last_index + current_write_counter + 1
+                txt_writer.writerow([index, longitude, latitude, altitude, name])
+                current_write_counter += 1
+        yield groups
+
+
+def read_back_features(batches):
+    """Yield the features read_txt_file reads from a txt file with the groups of the batches
+
+    The nodes are built from the values directly, grouped the same way as writing the groups to a txt list file
+    and reading it back.
+    """
+    this_feature = None
+    this_feature_nodes = []
+
+    for groups in batches:
+        for name, coordinates in groups:
+            feature_name, sub_name = get_feature_name(str(name))
+
+            for longitude, latitude, altitude in coordinates:
+                node = Node(float(longitude), float(latitude), float(altitude), feature_name, sub_name)
+
+                if not this_feature:
+                    this_feature = feature_name
+                    this_feature_nodes = [node]
+                elif this_feature != feature_name:
+                    yield this_feature_nodes
+
+                    this_feature = feature_name
+                    this_feature_nodes = [node]
+                else:
+                    this_feature_nodes.append(node)
+
+    yield this_feature_nodes
+
+
+def run_pipeline(
+    input_file,
+    stages=STAGES,
+    kml_output=None,
+    txt_outputs=None,
+    thinning_options=None,
+    is_area=False,
+    kml_options=None,
+    read_options=None,
+    staged_options=None,
+):
+    """Run the stages over the features of input_file, reading it once and writing only the requested outputs
+
+    Return the number of nodes out of the last stage.
+
+    :param kml_output: kml file written by the kml stage
+    :param txt_outputs: {stage: txt filepath} of the fix and thin stages to write as the tools would
+    :param thinning_options: reduce_points_in_a_line arguments of the thin stage
+    :param kml_options: other kml_writer arguments of the kml stage
+    :param read_options: other read_txt_file arguments to read the input with
+    :param staged_options: staged_map arguments, the fix and thin stages then compute ahead in an executor while the
+        next stages consume their results, so the stages overlap
+    """
+    check_stages(stages)
+    txt_outputs = txt_outputs or {}
+
+    if KML in stages and not kml_output:
+        raise ValueError("The kml stage needs a kml output")
+
+    for stage in txt_outputs:
+        if stage not in TXT_STAGES or stage not in stages:
+            raise ValueError(f"No txt output for stage {stage}, expected some of the stages run in {TXT_STAGES}")
+
+    with ExitStack() as stack:
+        features = read_txt_file(input_file, **(read_options or {}))
+
+        for stage in stages:
+            if stage == KML:
+                write_node_group = stack.enter_context(kml_writer(kml_output, **(kml_options or {})))
+                features = write_kml_features(write_node_group, features, is_area)
+                continue
+
+            if stage == FIX:
+                batches = fix_features(features, staged_options)
+            else:
+                batches = thin_features(features, thinning_options, staged_options)
+            if stage in txt_outputs:
+                txt_writer = stack.enter_context(txt_list_session(txt_outputs[stage]))
+                batches = write_txt_groups(txt_writer, batches, shared_index=stage == FIX)
+            features = read_back_features(batches)
+
+        return sum(len(feature_nodes) for feature_nodes in features)
+
+
+def write_kml_features(write_node_group, features, is_area=False):
+    for feature_nodes in features:
+        write_node_group(feature_nodes, is_area=is_area)
+        yield feature_nodes
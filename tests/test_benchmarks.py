@@ -0,0 +1,74 @@
+import filecmp
+import json
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from benchmarks.generators import MULTIPOLYGON_PARTS, POINTS, TXT_KINDS, generate_osm_file, generate_txt_file
+from benchmarks.suite import BENCHMARKS, compare_results, run_benchmarks
+from core.osm.loader import osm_loader
+from core.txt_file.read_txt_file import read_txt_file
+from multipolygon_fixer.merge_rings import process_feature_nodes
+
+
+class TestGenerators(unittest.TestCase):
+    def test_txt_file_is_deterministic(self):
+        with TemporaryDirectory() as tempdir:
+            seeds = [0, 0, 1]
+            files = [os.path.join(tempdir, f"{position}.txt") for position in range(len(seeds))]
+            vertices = [
+                generate_txt_file(filepath, TXT_KINDS, 10, 20, seed=seed) for filepath, seed in zip(files, seeds)
+            ]
+
+            self.assertTrue(filecmp.cmp(files[0], files[1], shallow=False))
+            self.assertFalse(filecmp.cmp(files[0], files[2], shallow=False))
+            self.assertEqual(vertices[0], sum(len(feature_nodes) for feature_nodes in read_txt_file(files[0])))
+
+            points_file = os.path.join(tempdir, "points.txt")
+            self.assertEqual(generate_txt_file(points_file, [POINTS], 10, 20), 10)
+
+    def test_multipolygon_parts_merge_into_rings(self):
+        with TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, "parts.txt")
+            generate_txt_file(filepath, [MULTIPOLYGON_PARTS], 10, 20, parts=5)
+
+            for feature_nodes in read_txt_file(filepath):
+                complete, incomplete = process_feature_nodes(feature_nodes)
+                self.assertEqual(len(complete), 1)
+                self.assertListEqual(incomplete, [])
+
+    def test_osm_file_loads(self):
+        with TemporaryDirectory() as tempdir:
+            filepath = os.path.join(tempdir, "features.osm")
+            vertices = generate_osm_file(filepath, number_of_ways=8, vertices_per_way=10)
+
+            with osm_loader(filepath, None, os.path.join(tempdir, "osm.sqlite"), bulk=True) as con:
+                self.assertEqual(con.execute("SELECT COUNT(*) FROM ways").fetchone()[0], 8)
+                self.assertEqual(con.execute("SELECT COUNT(*) FROM relations").fetchone()[0], 2)
+                # The closed ways repeat their first node at the end
+                self.assertEqual(con.execute("SELECT COUNT(*) FROM way_node").fetchone()[0], vertices)
+
+
+class TestSuite(unittest.TestCase):
+    def test_run_benchmarks(self):
+        with TemporaryDirectory() as tempdir:
+            results = run_benchmarks(tempdir, size="small", repeats=1)
+
+        # The results are written as json
+        results = json.loads(json.dumps(results))
+        self.assertListEqual(list(results["benchmarks"]), list(BENCHMARKS))
+        for result in results["benchmarks"].values():
+            self.assertGreater(result["vertices"], 0)
+            self.assertGreater(result["vertices_per_second"], 0)
+            self.assertGreaterEqual(result["peak_memory"], 0)
+        self.assertGreater(results["benchmarks"]["read_txt_file"]["megabytes_per_second"], 0)
+
+        ratios = compare_results(results, results)
+        self.assertDictEqual(ratios, {name: 1.0 for name in BENCHMARKS})
+
+        with self.assertRaises(ValueError):
+            run_benchmarks(tempdir, names=["unknown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import random
+import time
+import unittest
+
+from core.executor import run_workers, schedule_options, staged_map
+
+
+def square_worker(option):
+    return option["value"] ** 2
+
+
+def slow_square(value):
+    time.sleep(random.random() / 1000)
+    return value**2
+
+
+def failing_square(value):
+    if value == 5:
+        raise ValueError(value)
+    return value**2
+
+
+class TestRunWorkers(unittest.TestCase):
+    def test_run_workers_backends(self):
+        options = [{"input_file": f"missing_{i}.txt", "value": i} for i in range(7)]
+
+        for backend in ["thread", "process"]:
+            for chunksize in [1, 3]:
+                results = list(run_workers(square_worker, options, backend=backend, max_workers=2, chunksize=chunksize))
+
+                self.assertEqual(len(results), len(options))
+                for option, result in results:
+                    self.assertEqual(result, option["value"] ** 2)
+
+    def test_schedule_options(self):
+        options = [{"input_file": __file__}, {"input_file": "missing.txt"}]
+
+        self.assertListEqual(schedule_options(options[::-1], schedule="largest-first"), options)
+        self.assertListEqual(schedule_options(options[::-1], schedule="input-order"), options[::-1])
+
+        with self.assertRaises(ValueError):
+            schedule_options(options, schedule="unknown")
+
+
+class TestStagedMap(unittest.TestCase):
+    def test_results_in_order(self):
+        for backend in ["thread", "process"]:
+            results = list(staged_map(slow_square, range(50), backend=backend, max_workers=3, queue_size=4))
+            self.assertListEqual(results, [value**2 for value in range(50)])
+
+    def test_reader_waits_for_the_consumer(self):
+        read = []
+
+        def items():
+            for value in range(100):
+                read.append(value)
+                yield value
+
+        results = staged_map(slow_square, items(), max_workers=2, queue_size=3)
+        self.assertEqual(next(results), 0)
+        time.sleep(0.2)
+        # The queue, the item put once a slot frees and the item being yielded
+        self.assertLessEqual(len(read), 3 + 2)
+
+        results.close()
+        self.assertLess(len(read), 100)
+
+    def test_errors_are_raised_in_order(self):
+        results = staged_map(failing_square, range(10), max_workers=2, queue_size=2)
+        self.assertListEqual([next(results) for _ in range(5)], [value**2 for value in range(5)])
+        with self.assertRaises(ValueError):
+            next(results)
+
+        def failing_items():
+            yield 1
+            raise KeyError("read")
+
+        with self.assertRaises(KeyError):
+            list(staged_map(slow_square, failing_items()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import math
+import os
+import random
+import unittest
+
+import numpy as np
+
+from core.txt_file.read_txt_file import read_txt_file
+from line_thinner.line_thinner import get_thinning_levels, reduce_points_in_a_line
+from line_thinner.simplify import douglas_peucker, get_segment_distances
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+
+THINNING_OPTIONS = [
+    {},
+    {"allowed_angle_deviation": 0.5},
+    {"allowed_angle_deviation": 5},
+    {"use_weighted_tolerance": True, "max_distance_for_weighting": 0.001, "max_angle_for_weighting": 15},
+]
+
+
+def get_random_line(number_of_points, seed, turn_deviation):
+    generator = random.Random(seed)
+    coordinates = []
+    longitude, latitude, bearing = 77.0, 17.0, 0.0
+    for _ in range(number_of_points):
+        bearing += generator.gauss(0, turn_deviation)
+        step = generator.choice([0.0, 1e-5, 1e-4, 1e-3])
+        longitude += step * math.cos(bearing)
+        latitude += step * math.sin(bearing)
+        coordinates.append([longitude, latitude, generator.choice([0.0, 0.0, 1.0])])
+    return coordinates
+
+
+class TestReducePointsInALine(unittest.TestCase):
+    def test_numpy_engine_matches_python_engine(self):
+        lines = [get_random_line(n, seed, 0.05) for seed, n in enumerate([3, 4, 10, 500, 5000])]
+        lines += [get_random_line(2000, 10, 0.01), get_random_line(2000, 11, 1)]
+        lines += [[[77 + i * 1e-5, 17 + i * 1e-5, 0.0] for i in range(1000)]]
+
+        for coordinates in lines:
+            for options in THINNING_OPTIONS:
+                expected = reduce_points_in_a_line(coordinates, **options)
+                result = reduce_points_in_a_line(coordinates, engine="numpy", **options)
+                self.assertListEqual(result, expected)
+
+    def test_numpy_engine_dense_line(self):
+        test_file = os.path.join(DATA_FOLDER, "dense_line.txt")
+
+        for nodes in read_txt_file(test_file):
+            coordinates = [[node["longitude"], node["latitude"], node["altitude"]] for node in nodes]
+            for options in THINNING_OPTIONS:
+                expected = reduce_points_in_a_line(coordinates, **options)
+                result = reduce_points_in_a_line(coordinates, engine="numpy", **options)
+                self.assertListEqual(result, expected)
+
+    def test_thinning_levels_match_reduce_points_in_a_line(self):
+        deviations = [10, 2, 0.5]
+        lines = [get_random_line(n, seed, 0.05) for seed, n in enumerate([2, 3, 500, 5000])]
+
+        for coordinates in lines:
+            for options in THINNING_OPTIONS[:1] + THINNING_OPTIONS[3:]:
+                levels = get_thinning_levels(coordinates, deviations, **options)
+                for deviation, positions in zip(deviations, levels):
+                    expected = reduce_points_in_a_line(coordinates, allowed_angle_deviation=deviation, **options)
+                    self.assertListEqual([coordinates[i] for i in positions], expected)
+
+    def test_douglas_peucker_within_tolerance(self):
+        coordinates = get_random_line(5000, 3, 0.05)
+        points = np.asarray(coordinates)
+        tolerance = 1e-3
+
+        kept = douglas_peucker(coordinates, tolerance=tolerance)
+        result = reduce_points_in_a_line(coordinates, algorithm="douglas-peucker", tolerance=tolerance)
+
+        self.assertListEqual(result, [coordinates[i] for i in kept])
+        self.assertLess(len(result), len(coordinates))
+        self.assertEqual(kept[0], 0)
+        self.assertEqual(kept[-1], len(coordinates) - 1)
+        for start, end in zip(kept, kept[1:]):
+            if end - start > 1:
+                self.assertLessEqual(get_segment_distances(points, start, end).max(), tolerance)
+
+    def test_douglas_peucker_passes_match_segment_by_segment(self):
+        # Long enough for both the segments split one by one and the batched ones
+        lines = [get_random_line(n, seed, 0.05) for seed, n in enumerate([3, 500, 5000])]
+        lines.append(lines[1] + [lines[1][0]])
+
+        for coordinates in lines:
+            for tolerance in [0, 1e-4, 1e-3]:
+                # target_points splits one segment at a time, enough target points leave only the tolerance
+                expected = douglas_peucker(coordinates, tolerance=tolerance, target_points=len(coordinates))
+                self.assertListEqual(douglas_peucker(coordinates, tolerance=tolerance), expected)
+
+    def test_target_points(self):
+        coordinates = get_random_line(5000, 4, 0.05)
+
+        result = reduce_points_in_a_line(coordinates, algorithm="visvalingam-whyatt", target_points=100)
+        self.assertEqual(len(result), 100)
+        self.assertEqual(result[0], coordinates[0])
+        self.assertEqual(result[-1], coordinates[-1])
+
+        result = reduce_points_in_a_line(coordinates, algorithm="douglas-peucker", target_points=100)
+        self.assertLessEqual(len(result), 100)
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            reduce_points_in_a_line([[0, 0, 0], [1, 1, 0], [2, 0, 0]], algorithm="unknown")
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            reduce_points_in_a_line([[0, 0, 0], [1, 1, 0], [2, 0, 0]], engine="unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import random
+import unittest
+from tempfile import TemporaryDirectory
+
+from core.txt_file.read_txt_file import read_txt_file
+from multipolygon_fixer.merge_rings import get_fixed_groups, merge_rings
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+
+# An open feature whose first rows have no sub name, followed by rows of sub name 1
+MIXED_NAMES_TXT = """ID\tLongitude(x)\tLatitude(y)\tAltitude\tName
+0\t0.0\t0.0\t0\t12
+1\t1.0\t0.0\t0\t12
+2\t1.0\t1.0\t0\t12-1
+3\t0.0\t1.0\t0\t12-1
+4\t0.5\t0.5\t0\t12-1
+"""
+
+
+def get_segments(node_ids, segment_length, seed=0):
+    rnd = random.Random(seed)
+    segments = []
+    for start in range(0, len(node_ids) - 1, segment_length):
+        segment = [{"id": node_id} for node_id in node_ids[start : start + segment_length + 1]]
+        segments.append(segment if rnd.random() < 0.5 else segment[::-1])
+
+    rnd.shuffle(segments)
+    return segments
+
+
+def get_group_lists(groups):
+    return [(name, [list(coordinates) for coordinates in group]) for name, group in groups]
+
+
+class TestMergeRings(unittest.TestCase):
+    def test_merge_shuffled_segments(self):
+        node_ids = list(range(5000)) + [0]
+        complete, incomplete = merge_rings(get_segments(node_ids, 7))
+
+        self.assertEqual(len(complete), 1)
+        self.assertEqual(incomplete, [])
+
+        ring = [node["id"] for node in complete[0]]
+        self.assertEqual(ring[0], ring[-1])
+        self.assertEqual(sorted(ring[:-1]), list(range(5000)))
+        # Consecutive ids stay neighbours in one direction or the other
+        start = ring.index(0)
+        rotated = ring[start:-1] + ring[:start]
+        self.assertIn(rotated[1:], [list(range(1, 5000)), list(range(4999, 0, -1))])
+
+    def test_merge_open_line(self):
+        node_ids = list(range(100))
+        complete, incomplete = merge_rings(get_segments(node_ids, 3, seed=1))
+
+        self.assertEqual(complete, [])
+        self.assertEqual(len(incomplete), 1)
+        line = [node["id"] for node in incomplete[0]]
+        self.assertIn(line, [node_ids, node_ids[::-1]])
+
+    def test_merge_with_key(self):
+        rings = [[1, 2, 3], [5, 4, 3], [5, 6, 1]]
+        complete, incomplete = merge_rings(rings, key=lambda node_id: node_id)
+
+        self.assertEqual(complete, [[1, 2, 3, 4, 5, 6, 1]])
+        self.assertEqual(incomplete, [])
+
+
+class TestFixedGroups(unittest.TestCase):
+    def test_columnar_matches_nodes(self):
+        with TemporaryDirectory() as tempdir:
+            mixed_names_file = os.path.join(tempdir, "mixed_names.txt")
+            with open(mixed_names_file, "w", encoding="utf-8") as fo:
+                fo.write(MIXED_NAMES_TXT)
+
+            for test_file in [os.path.join(DATA_FOLDER, "TouristAreas.txt"), mixed_names_file]:
+                features = list(read_txt_file(test_file))
+                columnar_features = list(read_txt_file(test_file, columnar=True))
+
+                self.assertEqual(len(features), len(columnar_features))
+                for feature, columnar_feature in zip(features, columnar_features):
+                    self.assertListEqual(
+                        get_group_lists(get_fixed_groups(feature)),
+                        get_group_lists(get_fixed_groups(columnar_feature, columnar=True)),
+                    )
+
+            groups = get_fixed_groups(list(read_txt_file(mixed_names_file, columnar=True))[0], columnar=True)
+            self.assertListEqual([name for name, _ in groups], ["12"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import pstats
+import time
+import tracemalloc
+import unittest
+from argparse import Namespace
+from tempfile import TemporaryDirectory
+
+from core.metrics import COMPUTE, READ, WRITE, FileMetrics, count_written, measure_worker, run_measured_workers
+from core.txt_file.read_txt_file import read_txt_file
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+
+
+def slow_length(feature):
+    time.sleep(0.01)
+    return len(feature)
+
+
+def sleeping_features(features):
+    for feature in features:
+        time.sleep(0.01)
+        yield feature
+
+
+def copy_worker(option, metrics=None):
+    # Reads the input features, computes their lengths and writes them
+    with open(option["output_file"], "w", encoding="utf-8") as fo, metrics.stage(WRITE):
+        features = metrics.iterate(sleeping_features(read_txt_file(option["input_file"])))
+        lengths = list(metrics.map(slow_length, features, option["staged_options"]))
+        for length in lengths:
+            time.sleep(0.01)
+            fo.write(f"{length}\n")
+
+    count_written(metrics, len(lengths), sum(lengths))
+    return len(lengths)
+
+
+def get_args(metrics_out=None, profile=None, trace_memory=False):
+    return Namespace(
+        backend="thread",
+        workers=None,
+        chunksize=1,
+        schedule="input-order",
+        metrics_out=metrics_out,
+        profile=profile,
+        trace_memory=trace_memory,
+    )
+
+
+class TestMetrics(unittest.TestCase):
+    def test_stage_times_are_exclusive(self):
+        metrics = FileMetrics("input.txt")
+        with metrics.stage(WRITE):
+            time.sleep(0.02)
+            with metrics.stage(READ):
+                time.sleep(0.05)
+            with metrics.stage(None):
+                time.sleep(0.05)
+
+        self.assertGreaterEqual(metrics.stage_times[READ], 0.05)
+        self.assertGreaterEqual(metrics.stage_times[WRITE], 0.02)
+        self.assertLess(metrics.stage_times[WRITE], 0.05)
+        self.assertEqual(metrics.stage_times[COMPUTE], 0)
+
+    def test_measure_worker(self):
+        input_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+        features = list(read_txt_file(input_file))
+        # measure_worker leaves tracing on for the next files of the process
+        self.addCleanup(tracemalloc.stop)
+
+        for staged_options in [None, {"backend": "thread", "max_workers": 2, "queue_size": 2}]:
+            with TemporaryDirectory() as tempdir:
+                option = {
+                    "input_file": input_file,
+                    "output_file": os.path.join(tempdir, "lengths.txt"),
+                    "staged_options": staged_options,
+                }
+                result, record, stats = measure_worker(copy_worker, {"trace_memory": True, "profile": True}, option)
+
+            self.assertEqual(result, len(features))
+            self.assertIsNotNone(stats)
+            self.assertEqual(record["features_read"], len(features))
+            self.assertEqual(record["vertices_read"], sum(len(feature) for feature in features))
+            self.assertEqual(record["vertices_written"], record["vertices_read"])
+            self.assertEqual(record["bytes_read"], os.path.getsize(input_file))
+            self.assertGreater(record["bytes_written"], 0)
+            self.assertGreater(record["peak_memory"], 0)
+
+            minimum_time = 0.01 * len(features)
+            for stage in [READ, COMPUTE, WRITE]:
+                self.assertGreaterEqual(record["stages"][stage], minimum_time)
+            self.assertGreaterEqual(record["wall_time"], minimum_time * 2)
+
+    def test_run_measured_workers(self):
+        options_list = []
+        with TemporaryDirectory() as tempdir:
+            for filename in ["TouristAreas.txt", "dense_line.txt"]:
+                options_list.append(
+                    {
+                        "input_file": os.path.join(DATA_FOLDER, filename),
+                        "output_file": os.path.join(tempdir, filename),
+                        "staged_options": None,
+                    }
+                )
+
+            metrics_out = os.path.join(tempdir, "metrics.jsonl")
+            profile = os.path.join(tempdir, "profile.prof")
+            args = get_args(metrics_out, profile)
+            results = {
+                option["input_file"]: result for option, result in run_measured_workers(copy_worker, options_list, args)
+            }
+
+            with open(metrics_out, "r", encoding="utf-8") as fi:
+                records = [json.loads(line) for line in fi]
+
+            self.assertEqual(len(records), 2)
+            for record in records:
+                self.assertEqual(record["features_written"], results[record["input_file"]])
+                self.assertIsNone(record["peak_memory"])
+
+            self.assertGreater(pstats.Stats(profile).total_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,157 @@
+import io
 import os
 import unittest
+import xml.etree.ElementTree as ET
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
 
+import numpy as np
+
+from benchmarks.generators import generate_osm_file
+from core.osm.changes import DELETE, apply_osm_changes, clear_dirty_features, get_dirty_refs
 from core.osm.loader import osm_loader
+from core.osm.nodes import NODE_LOCATION_MODES, NodeLocationStore, load_node_locations
+from core.osm.relations import (
+    INNER,
+    OUTER,
+    export_multipolygons_to_kml,
+    export_multipolygons_to_txt,
+    iter_multipolygons,
+    select_multipolygon_relations,
+)
+from core.osm.spatial_index import create_spatial_index, query_relations_in_bbox, query_ways_in_bbox
+from core.osm.ways import export_ways_to_kml, export_ways_to_txt, iter_way_coordinates, iter_way_node_refs
+from core.txt_file.read_txt_file import read_txt_file
 
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
 
+# Ways referencing their nodes by id only, as in planet extracts
+STANDARD_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="27.5762924" lon="-99.4593439"/>
+  <node id="2" lat="27.5761676" lon="-99.4592339"><tag k="amenity" v="bench"/></node>
+  <node id="3000000000" lat="-0.0000001" lon="179.9999999"/>
+  <node id="4" version="2" visible="false"/>
+  <way id="100"><nd ref="3000000000"/><nd ref="1"/><nd ref="2"/><tag k="highway" v="footway"/></way>
+  <way id="101"><nd ref="2"/><nd ref="9"/></way>
+  <way id="102"><nd ref="1"/><nd ref="2"/><nd ref="3000000000"/><nd ref="1"/></way>
+</osm>
+"""
+
+# Relation 300 has an outer ring split in two ways, one of them reversed, and a closed inner way.
+# Relation 301 misses its second outer way and relation 302 is not a multipolygon.
+MULTIPOLYGON_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="0" lon="0"/>
+  <node id="2" lat="0" lon="10"/>
+  <node id="3" lat="10" lon="10"/>
+  <node id="4" lat="10" lon="0"/>
+  <node id="5" lat="2" lon="2"/>
+  <node id="6" lat="2" lon="4"/>
+  <node id="7" lat="4" lon="4"/>
+  <way id="200"><nd ref="1"/><nd ref="2"/><nd ref="3"/></way>
+  <way id="201"><nd ref="1"/><nd ref="4"/><nd ref="3"/></way>
+  <way id="202"><nd ref="5"/><nd ref="6"/><nd ref="7"/><nd ref="5"/></way>
+  <relation id="300">
+    <member type="way" ref="200" role="outer"/>
+    <member type="way" ref="201" role=""/>
+    <member type="way" ref="202" role="inner"/>
+    <member type="node" ref="1" role="label"/>
+    <tag k="type" v="multipolygon"/>
+  </relation>
+  <relation id="301">
+    <member type="way" ref="200" role="outer"/>
+    <member type="way" ref="999" role="outer"/>
+    <tag k="type" v="boundary"/>
+  </relation>
+  <relation id="302">
+    <member type="way" ref="200" role="outer"/>
+    <tag k="type" v="route"/>
+  </relation>
+</osm>
+"""
+
+# Applied to MULTIPOLYGON_OSM. Node 8 is created and modified in the same batch, node 300 shares the id of a
+# relation and is deleted in a later batch.
+MULTIPOLYGON_OSC = """<?xml version="1.0" encoding="UTF-8"?>
+<osmChange version="0.6">
+  <modify>
+    <node id="7" lat="5" lon="5"/>
+  </modify>
+  <create>
+    <node id="8" lat="20" lon="20"><tag k="amenity" v="bench"/></node>
+    <way id="203"><nd ref="8"/><nd ref="3"/><tag k="highway" v="path"/></way>
+  </create>
+  <modify>
+    <node id="8" lat="21" lon="21"/>
+  </modify>
+  <create>
+    <node id="300" lat="1" lon="1"><tag k="name" v="Node"/></node>
+  </create>
+  <delete>
+    <relation id="302"/>
+    <node id="300"/>
+  </delete>
+</osmChange>
+"""
+
+# Relation 200 lists way 100 twice with different roles and node 1 is repeated
+DUPLICATES_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="1" lon="1"/>
+  <node id="1" lat="2" lon="2"/>
+  <way id="100"><nd ref="1"/><nd ref="1"/></way>
+  <relation id="200">
+    <member type="way" ref="100" role="outer"/>
+    <member type="way" ref="100" role="inner"/>
+    <member type="node" ref="1" role="label"/>
+    <member type="node" ref="1" role="admin_centre"/>
+  </relation>
+</osm>
+"""
+
+TABLE_QUERIES = {
+    "nodes": "SELECT ref, latitude, longitude FROM nodes ORDER BY ref",
+    "ways": "SELECT ref FROM ways ORDER BY ref",
+    "relations": "SELECT ref FROM relations ORDER BY ref",
+    "tags": "SELECT * FROM tags ORDER BY feature_ref, key",
+    "way_node": "SELECT * FROM way_node ORDER BY way_ref, node_ref",
+    "relation_way": "SELECT * FROM relation_way ORDER BY relation_ref, way_ref",
+    "relation_node": "SELECT * FROM relation_node ORDER BY relation_ref, node_ref",
+}
+
+
+def get_tables(con):
+    return {table: con.execute(query).fetchall() for table, query in TABLE_QUERIES.items()}
+
+
+def get_parsed_tables(filepath):
+    """Rows of the tables of an osm file parsed as a whole tree, without releasing any element"""
+    tables = {table: [] for table in TABLE_QUERIES}
+    nodes = {}
+    for elem in ET.parse(filepath).getroot():
+        ref = int(elem.attrib["id"])
+        if elem.tag == "node":
+            nodes.setdefault(ref, (ref, float(elem.attrib["lat"]), float(elem.attrib["lon"])))
+        elif elem.tag == "way":
+            tables["ways"].append((ref,))
+            for sequence_id, nd in enumerate(elem.findall("nd")):
+                node_ref = int(nd.attrib["ref"])
+                nodes.setdefault(node_ref, (node_ref, float(nd.attrib["lat"]), float(nd.attrib["lon"])))
+                tables["way_node"].append((node_ref, ref, sequence_id))
+        elif elem.tag == "relation":
+            tables["relations"].append((ref,))
+            for member in elem.findall("member"):
+                tables[f"relation_{member.attrib['type']}"].append(
+                    (int(member.attrib["ref"]), ref, member.attrib["role"])
+                )
+
+        for tag in elem.findall("tag"):
+            tables["tags"].append((tag.attrib["k"], tag.attrib["v"], ref, elem.tag))
+
+    tables["nodes"] = list(nodes.values())
+    return {table: sorted(rows) for table, rows in tables.items()}
+
 
 class TestOsmLoader(unittest.TestCase):
     def test_osm_loader(self):
@@ -12,3 +159,343 @@ class TestOsmLoader(unittest.TestCase):
 
         with osm_loader(file, None, "sample.sqlite") as con:
             print(con)
+
+    def test_osm_loader_sample(self):
+        file = os.path.join(DATA_FOLDER, "sample.osm")
+
+        with osm_loader(file, None) as con:
+            tables = get_tables(con)
+
+        self.assertEqual(len(tables["nodes"]), 5)
+        self.assertListEqual(tables["ways"], [(100,), (101,)])
+        self.assertIn(("name", "O'Neil \"Park\"", 100, "way"), tables["tags"])
+        self.assertListEqual(tables["relation_way"], [(100, 200, "outer"), (101, 200, "inner")])
+        self.assertListEqual(tables["relation_node"], [(5, 200, "label")])
+
+    def test_osm_loader_bulk(self):
+        file = os.path.join(DATA_FOLDER, "sample.osm")
+
+        with osm_loader(file, None) as con:
+            expected_tables = get_tables(con)
+
+        with TemporaryDirectory() as tempdir:
+            db_file = os.path.join(tempdir, "bulk.sqlite")
+            with osm_loader(file, None, db_file, bulk=True, batch_size=2, commit_interval=3) as con:
+                tables = get_tables(con)
+                indexes = [row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+                # The bulk PRAGMAs are set back to the defaults once loaded
+                journal_mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+                synchronous = con.execute("PRAGMA synchronous").fetchone()[0]
+
+        self.assertDictEqual(tables, expected_tables)
+        self.assertIn("nodes_pk", indexes)
+        self.assertIn("tags_feature_ref", indexes)
+        self.assertEqual(journal_mode, "delete")
+        self.assertEqual(synchronous, 2)
+
+    def test_generated_file(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "generated.osm")
+            generate_osm_file(file, number_of_ways=20, vertices_per_way=10)
+            expected_tables = get_parsed_tables(file)
+
+            for bulk in [False, True]:
+                with osm_loader(file, None, bulk=bulk, batch_size=7) as con:
+                    tables = {table: sorted(rows) for table, rows in get_tables(con).items()}
+
+                self.assertDictEqual(tables, expected_tables)
+
+        self.assertEqual(len(tables["relation_way"]), 10)
+        self.assertEqual(len(tables["tags"]), 45)
+
+    def test_report_memory(self):
+        file = os.path.join(DATA_FOLDER, "sample.osm")
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            with osm_loader(file, None, report_memory=True):
+                pass
+
+        self.assertRegex(output.getvalue(), r"Loaded .*sample\.osm, peak memory usage: \d+\.\d (B|KB|MB|GB|TB)")
+
+    def test_duplicates(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "duplicates.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(DUPLICATES_OSM)
+
+            with osm_loader(file, None) as con:
+                tables = get_tables(con)
+            with osm_loader(file, None, bulk=True) as con:
+                bulk_tables = get_tables(con)
+
+        # Both modes keep the first row of a primary key
+        self.assertDictEqual(bulk_tables, tables)
+        self.assertListEqual(tables["nodes"], [(1, 1.0, 1.0)])
+        self.assertListEqual(tables["relation_way"], [(100, 200, "outer")])
+        self.assertListEqual(tables["relation_node"], [(1, 200, "label")])
+
+    def test_osm_loader_node_locations(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "standard.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(STANDARD_OSM)
+
+            for bulk in [False, True]:
+                with NodeLocationStore() as node_locations:
+                    with osm_loader(file, None, bulk=bulk, node_locations=node_locations) as con:
+                        tables = get_tables(con)
+                        ways = dict(iter_way_coordinates(con, node_locations))
+                        selected_ways = dict(iter_way_coordinates(con, node_locations, way_refs=[101, 103]))
+
+                self.assertListEqual(
+                    tables["nodes"],
+                    [(1, 27.5762924, -99.4593439), (2, 27.5761676, -99.4592339), (3000000000, -0.0000001, 179.9999999)],
+                )
+                self.assertIn(("amenity", "bench", 2, "node"), tables["tags"])
+                np.testing.assert_array_equal(
+                    ways[100], [[179.9999999, -0.0000001], [-99.4593439, 27.5762924], [-99.4592339, 27.5761676]]
+                )
+                self.assertListEqual(list(selected_ways), [101])
+                # Node 9 is not in the file
+                self.assertTrue(np.isnan(selected_ways[101][1]).all())
+
+    def test_export_ways(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "standard.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(STANDARD_OSM)
+
+            with NodeLocationStore() as node_locations:
+                with osm_loader(file, None, bulk=True, node_locations=node_locations) as con:
+                    way_node_refs = dict(iter_way_node_refs(con))
+                    joined_ways = dict(iter_way_coordinates(con))
+                    stored_ways = dict(iter_way_coordinates(con, node_locations))
+
+                    txt_file = os.path.join(tempdir, "ways.txt")
+                    self.assertEqual(export_ways_to_txt(con, txt_file, node_locations), 2)
+                    kml_file = os.path.join(tempdir, "ways.kml")
+                    self.assertEqual(export_ways_to_kml(con, kml_file, way_refs=[102], is_area=True), 1)
+
+            # The nodes keep their order and the closed way its last node
+            self.assertListEqual(way_node_refs[102], [1, 2, 3000000000, 1])
+            for way_ref in way_node_refs:
+                np.testing.assert_array_equal(joined_ways[way_ref], stored_ways[way_ref])
+
+            # Way 101 has a node missing from the file
+            features = list(read_txt_file(txt_file))
+            self.assertListEqual([feature_nodes[0].name for feature_nodes in features], ["100", "102"])
+            self.assertListEqual([[node.longitude, node.latitude] for node in features[1]], stored_ways[102].tolist())
+
+            with open(kml_file, "r", encoding="utf-8") as fi:
+                kml = fi.read()
+            self.assertIn("<Polygon>", kml)
+            self.assertIn("<name>102</name>", kml)
+
+
+class TestNodeLocationStore(unittest.TestCase):
+    def test_modes(self):
+        rng = np.random.default_rng(0)
+        # Even ids, so odd ones are missing
+        refs = rng.choice(10**6, size=1000, replace=False) * 2
+        longitudes = np.round(rng.uniform(-180, 180, size=1000), 7)
+        latitudes = np.round(rng.uniform(-90, 90, size=1000), 7)
+        missing_ref = 12345
+
+        for mode in NODE_LOCATION_MODES:
+            with TemporaryDirectory() as tempdir:
+                filepath = os.path.join(tempdir, "nodes.bin")
+                with NodeLocationStore(mode, filepath=filepath, batch_size=64) as store:
+                    for ref, longitude, latitude in zip(refs[:500].tolist(), longitudes, latitudes):
+                        store.add(ref, longitude, latitude)
+                    store.add_many(refs[500:], longitudes[500:], latitudes[500:])
+                    # Added again, the last coordinates are kept
+                    store.add(int(refs[0]), 0.0, 0.0)
+
+                    self.assertEqual(len(store), 1000)
+                    self.assertEqual(store.get(int(refs[0])), (0.0, 0.0))
+                    self.assertIsNone(store.get(-1))
+
+                    coordinates = store.get_coordinates(refs[1:])
+                    # Coordinates of 7 decimals are returned as they were given
+                    self.assertListEqual(coordinates[:, 0].tolist(), longitudes[1:].tolist())
+                    self.assertListEqual(coordinates[:, 1].tolist(), latitudes[1:].tolist())
+
+                    _, found = store.get_locations([missing_ref, refs[1]])
+                    self.assertListEqual(found.tolist(), [False, True])
+                    with self.assertRaises(KeyError):
+                        store.get_coordinates([missing_ref])
+
+                if mode == "dense":
+                    # The file of a dense store is opened again by the next run
+                    with NodeLocationStore(mode, filepath=filepath) as store:
+                        self.assertEqual(len(store), 1000)
+                        with self.assertRaises(ValueError):
+                            store.add_many([-1], [0], [0])
+
+    def test_load_node_locations(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "standard.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(STANDARD_OSM)
+
+            with load_node_locations(file) as node_locations:
+                self.assertEqual(len(node_locations), 3)
+                self.assertEqual(node_locations.get(3000000000), (179.9999999, -0.0000001))
+                self.assertIsNone(node_locations.get(4))
+
+
+class TestMultipolygons(unittest.TestCase):
+    def test_iter_multipolygons(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "multipolygons.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSM)
+
+            results = []
+            with NodeLocationStore() as node_locations:
+                with osm_loader(file, None, bulk=True, node_locations=node_locations) as con:
+                    self.assertListEqual(select_multipolygon_relations(con), [300, 301])
+                    for store, backend in [(None, None), (node_locations, None), (None, "process")]:
+                        results.append(list(iter_multipolygons(con, store, backend=backend, batch_size=1)))
+
+                    txt_file = os.path.join(tempdir, "rings.txt")
+                    self.assertEqual(export_multipolygons_to_txt(con, txt_file, assembly_options={"backend": None}), 2)
+                    kml_file = os.path.join(tempdir, "rings.kml")
+                    self.assertEqual(export_multipolygons_to_kml(con, kml_file, relation_refs=[300]), 2)
+
+            for relations in results:
+                self.assertListEqual([relation_ref for relation_ref, _, _ in relations], [300, 301])
+                _, rings, open_rings = relations[0]
+                self.assertEqual(open_rings, 0)
+                self.assertListEqual(
+                    rings[OUTER][0].tolist(), [[10.0, 10.0], [10.0, 0.0], [0.0, 0.0], [0.0, 10.0], [10.0, 10.0]]
+                )
+                self.assertListEqual(rings[INNER][0].tolist(), [[2.0, 2.0], [4.0, 2.0], [4.0, 4.0], [2.0, 2.0]])
+
+                _, rings, open_rings = relations[1]
+                self.assertEqual(open_rings, 1)
+                self.assertDictEqual(rings, {OUTER: [], INNER: []})
+
+            features = list(read_txt_file(txt_file))
+            self.assertListEqual([feature_nodes[0].name for feature_nodes in features], ["300-outer-0", "300-inner-0"])
+            with open(kml_file, "r", encoding="utf-8") as fi:
+                self.assertEqual(fi.read().count("<Polygon>"), 2)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def test_query_bbox(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "multipolygons.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSM)
+
+            for bulk in [False, True]:
+                with osm_loader(file, None, bulk=bulk, spatial_index=True) as con:
+                    self.assertListEqual(query_ways_in_bbox(con, (5, 5, 6, 6)), [200, 201])
+                    self.assertListEqual(query_ways_in_bbox(con, (3, 3, 3.5, 3.5)), [200, 201, 202])
+                    # Boxes touching the box of way 200 at its corner
+                    self.assertListEqual(query_ways_in_bbox(con, (10, 10, 20, 20)), [200, 201])
+                    self.assertListEqual(query_ways_in_bbox(con, (11, 11, 20, 20)), [])
+                    self.assertListEqual(query_relations_in_bbox(con, (-1, -1, 0.5, 0.5)), [300, 301, 302])
+                    self.assertListEqual(query_relations_in_bbox(con, (20, 20, 30, 30)), [])
+
+                    # The index is rebuilt on an existing database
+                    create_spatial_index(con)
+                    self.assertListEqual(query_ways_in_bbox(con, (3, 3, 3.5, 3.5)), [200, 201, 202])
+
+            with osm_loader(file, None) as con:
+                with self.assertRaises(ValueError):
+                    query_ways_in_bbox(con, (0, 0, 1, 1))
+
+
+class TestOsmChanges(unittest.TestCase):
+    def test_apply_osm_changes(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "multipolygons.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSM)
+            change_file = os.path.join(tempdir, "changes.osc")
+            with open(change_file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSC)
+
+            with NodeLocationStore() as node_locations:
+                with osm_loader(file, None, spatial_index=True, node_locations=node_locations) as con:
+                    counts = apply_osm_changes(con, change_file, batch_size=3, node_locations=node_locations)
+                    tables = get_tables(con)
+                    dirty_refs = {
+                        feature_type: (get_dirty_refs(con, feature_type), get_dirty_refs(con, feature_type, [DELETE]))
+                        for feature_type in ["node", "way", "relation"]
+                    }
+                    multipolygon_relations = select_multipolygon_relations(con)
+                    ways_in_bbox = query_ways_in_bbox(con, (19, 19, 22, 22))
+                    changed_ways_in_bbox = query_ways_in_bbox(con, (4.5, 4.5, 5, 5))
+                    way_203 = dict(iter_way_coordinates(con, node_locations, way_refs=[203]))[203]
+
+                    clear_dirty_features(con)
+                    self.assertListEqual(get_dirty_refs(con, "way"), [])
+
+        self.assertDictEqual(counts, {"create": 3, "modify": 2, "delete": 2})
+        self.assertIn((7, 5.0, 5.0), tables["nodes"])
+        self.assertIn((8, 21.0, 21.0), tables["nodes"])
+        self.assertNotIn(300, [ref for ref, _, _ in tables["nodes"]])
+        self.assertListEqual(tables["relations"], [(300,), (301,)])
+        self.assertNotIn(302, [relation_ref for _, relation_ref, _ in tables["relation_way"]])
+        # The tags of node 8 are replaced, the tags of relation 300 are kept
+        self.assertListEqual(
+            [row for row in tables["tags"] if row[2] in [8, 203, 300]],
+            [("highway", "path", 203, "way"), ("type", "multipolygon", 300, "relation")],
+        )
+        self.assertListEqual(multipolygon_relations, [300, 301])
+
+        self.assertDictEqual(
+            dirty_refs, {"node": ([7, 8], [300]), "way": ([202, 203], []), "relation": ([300], [302])}
+        )
+        self.assertListEqual(ways_in_bbox, [203])
+        self.assertListEqual(changed_ways_in_bbox, [200, 201, 202])
+        self.assertListEqual(way_203.tolist(), [[21.0, 21.0], [10.0, 10.0]])
+
+    def test_failed_update_is_rolled_back(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "multipolygons.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSM)
+            change_file = os.path.join(tempdir, "changes.osc")
+            with open(change_file, "w", encoding="utf-8") as fo:
+                fo.write(
+                    '<osmChange version="0.6"><modify><node id="7" lat="5" lon="5"/></modify>'
+                    '<modify><way id="202"><nd/></way></modify></osmChange>'
+                )
+
+            with osm_loader(file, None) as con:
+                expected_tables = get_tables(con)
+                with self.assertRaises(KeyError):
+                    apply_osm_changes(con, change_file, batch_size=1)
+
+                self.assertDictEqual(get_tables(con), expected_tables)
+                self.assertListEqual(get_dirty_refs(con, "node"), [])
+
+    def test_failed_update_of_bulk_database_is_rolled_back(self):
+        with TemporaryDirectory() as tempdir:
+            file = os.path.join(tempdir, "multipolygons.osm")
+            with open(file, "w", encoding="utf-8") as fo:
+                fo.write(MULTIPOLYGON_OSM)
+            change_file = os.path.join(tempdir, "changes.osc")
+            with open(change_file, "w", encoding="utf-8") as fo:
+                fo.write(
+                    '<osmChange version="0.6"><modify><node id="7" lat="5" lon="5"/></modify>'
+                    '<delete><way id="200"/></delete><modify><way id="202"><nd/></way></modify></osmChange>'
+                )
+
+            db_file = os.path.join(tempdir, "bulk.sqlite")
+            with osm_loader(file, None, db_file, bulk=True, spatial_index=True) as con:
+                expected_tables = get_tables(con)
+                # A connection still tuned for bulk loading, with a cache small enough to write the update to the file
+                con.execute("PRAGMA journal_mode = OFF")
+                con.execute("PRAGMA cache_size = 1")
+                with self.assertRaises(KeyError):
+                    apply_osm_changes(con, change_file, batch_size=1)
+
+                self.assertEqual(con.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+                self.assertDictEqual(get_tables(con), expected_tables)
+                self.assertListEqual(get_dirty_refs(con, "way"), [])
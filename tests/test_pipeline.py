@@ -0,0 +1,81 @@
+import filecmp
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from pipeline.stages import FIX, KML, THIN, check_stages, run_pipeline
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+
+THINNING_OPTIONS = {"allowed_angle_deviation": 5}
+
+
+class TestPipeline(unittest.TestCase):
+    def test_chained_stages_match_separate_runs(self):
+        for filename in ["TouristAreas.txt", "Battery Abandoned_RenewMap_point.txt", "dense_line.txt"]:
+            test_file = os.path.join(DATA_FOLDER, filename)
+
+            with TemporaryDirectory() as tempdir:
+                fixed_file = os.path.join(tempdir, "fixed.txt")
+                thinned_file = os.path.join(tempdir, "thinned.txt")
+                kml_file = os.path.join(tempdir, "separate.kml")
+
+                # Every stage reading the txt file written by the previous one, as running the tools does
+                run_pipeline(test_file, stages=[FIX], txt_outputs={FIX: fixed_file})
+                run_pipeline(
+                    fixed_file, stages=[THIN], txt_outputs={THIN: thinned_file}, thinning_options=THINNING_OPTIONS
+                )
+                run_pipeline(thinned_file, stages=[KML], kml_output=kml_file, is_area=True)
+
+                chained_outputs = {FIX: os.path.join(tempdir, "chained_fixed.txt")}
+                chained_kml_file = os.path.join(tempdir, "chained.kml")
+                number_of_nodes = run_pipeline(
+                    test_file,
+                    kml_output=chained_kml_file,
+                    txt_outputs=chained_outputs,
+                    thinning_options=THINNING_OPTIONS,
+                    is_area=True,
+                )
+
+                self.assertGreater(number_of_nodes, 0)
+                self.assertTrue(filecmp.cmp(fixed_file, chained_outputs[FIX], shallow=False))
+                self.assertTrue(filecmp.cmp(kml_file, chained_kml_file, shallow=False))
+                self.assertFalse(os.path.exists(os.path.join(tempdir, "chained_thinned.txt")))
+
+    def test_staged_stages_match_unstaged(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+        with TemporaryDirectory() as tempdir:
+            outputs = []
+            for staged_options in [
+                None,
+                {"backend": "thread", "max_workers": 2, "queue_size": 2},
+                {"backend": "process", "max_workers": 2, "queue_size": 2},
+            ]:
+                kml_file = os.path.join(tempdir, f"{len(outputs)}.kml")
+                fixed_file = os.path.join(tempdir, f"{len(outputs)}_fixed.txt")
+                run_pipeline(
+                    test_file,
+                    kml_output=kml_file,
+                    txt_outputs={FIX: fixed_file},
+                    thinning_options=THINNING_OPTIONS,
+                    is_area=True,
+                    staged_options=staged_options,
+                )
+                outputs.append((kml_file, fixed_file))
+
+            for output_files in outputs[1:]:
+                for expected_file, output_file in zip(outputs[0], output_files):
+                    self.assertTrue(filecmp.cmp(expected_file, output_file, shallow=False))
+
+    def test_stage_order(self):
+        check_stages([FIX, KML])
+        with self.assertRaises(ValueError):
+            check_stages([KML, FIX])
+        with self.assertRaises(ValueError):
+            check_stages([THIN, THIN])
+        with self.assertRaises(ValueError):
+            run_pipeline(os.path.join(DATA_FOLDER, "dense_line.txt"), stages=[THIN, KML])
+
+
+if __name__ == "__main__":
+    unittest.main()
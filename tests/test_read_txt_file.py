@@ -0,0 +1,223 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+
+from core.txt_file.cache import CACHE_FEATURES_FILENAME, get_cache_entries, load_cached_features
+from core.txt_file.columnar import get_array_ids, get_array_node_name, iter_named_groups
+from core.txt_file.logic import dedupe_nodes, get_node, get_node_name, is_ring_closed
+from core.txt_file.index import IndexedTxtFile, get_txt_index_filepath, load_txt_index
+from core.txt_file.read_txt_file import get_feature_chunks, read_txt_file
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+
+
+class TestReadTxtFileColumnar(unittest.TestCase):
+    def test_columnar_matches_nodes(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        features = list(read_txt_file(test_file))
+        columnar_features = list(read_txt_file(test_file, columnar=True))
+
+        self.assertEqual(len(features), len(columnar_features))
+
+        for nodes, (array, metadata) in zip(features, columnar_features):
+            self.assertEqual(len(nodes), len(array))
+            self.assertListEqual([node["longitude"] for node in nodes], array["longitude"].tolist())
+            self.assertListEqual([node["latitude"] for node in nodes], array["latitude"].tolist())
+            self.assertListEqual([node["altitude"] for node in nodes], array["altitude"].tolist())
+            self.assertListEqual(
+                [get_node_name(node) for node in nodes],
+                [get_array_node_name(array, metadata, position=i) for i in range(len(array))],
+            )
+
+    def test_iter_named_groups(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        for nodes, (array, metadata) in zip(read_txt_file(test_file), read_txt_file(test_file, columnar=True)):
+            names = list(dict.fromkeys(get_node_name(node) for node in nodes))
+            groups = list(iter_named_groups(array, metadata))
+
+            self.assertListEqual(names, [name for name, _ in groups])
+            self.assertEqual(len(nodes), sum(len(group) for _, group in groups))
+
+    def test_array_ids_match_node_ids(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        for nodes, (array, _) in zip(read_txt_file(test_file), read_txt_file(test_file, columnar=True)):
+            self.assertListEqual([node["id"] for node in nodes], get_array_ids(array))
+
+
+class TestReadTxtFileParallel(unittest.TestCase):
+    def test_parallel_matches_serial(self):
+        for filename in ["TouristAreas.txt", "Battery Abandoned_RenewMap_point.txt"]:
+            test_file = os.path.join(DATA_FOLDER, filename)
+            features = list(read_txt_file(test_file))
+            columnar_features = list(read_txt_file(test_file, columnar=True))
+
+            for chunk_size in [1, 500, 10**9]:
+                self.assertListEqual(list(read_txt_file(test_file, parse_workers=2, chunk_size=chunk_size)), features)
+
+                parallel_features = list(
+                    read_txt_file(test_file, columnar=True, parse_workers=2, chunk_size=chunk_size)
+                )
+                self.assertEqual(len(parallel_features), len(columnar_features))
+                for (array, metadata), (expected_array, expected_metadata) in zip(parallel_features, columnar_features):
+                    self.assertEqual(array.tolist(), expected_array.tolist())
+                    self.assertEqual(metadata, expected_metadata)
+
+    def test_chunks_start_on_features(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+        chunks = get_feature_chunks(test_file, 1)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], os.path.getsize(test_file))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+
+
+class TestTxtCache(unittest.TestCase):
+    def test_cached_features_match_read_txt_file(self):
+        with TemporaryDirectory() as tempdir:
+            cache_dir = os.path.join(tempdir, "cache")
+            test_file = shutil.copy(os.path.join(DATA_FOLDER, "TouristAreas.txt"), tempdir)
+            features = list(read_txt_file(test_file))
+            columnar_features = list(read_txt_file(test_file, columnar=True))
+
+            self.assertIsNone(load_cached_features(test_file, cache_dir))
+            for _ in range(2):
+                self.assertListEqual(list(read_txt_file(test_file, cache_dir=cache_dir)), features)
+
+                cached_features = list(read_txt_file(test_file, columnar=True, cache_dir=cache_dir))
+                self.assertEqual(len(cached_features), len(columnar_features))
+                for (array, metadata), (expected_array, expected_metadata) in zip(cached_features, columnar_features):
+                    self.assertEqual(array.tolist(), expected_array.tolist())
+                    self.assertEqual(metadata, expected_metadata)
+
+                self.assertIsNotNone(load_cached_features(test_file, cache_dir))
+
+            # Stale entries are removed without reading their features
+            stale_entry = get_cache_entries(cache_dir)[0][0]
+            os.remove(os.path.join(stale_entry, CACHE_FEATURES_FILENAME))
+            with open(test_file, "a") as fo:
+                fo.write("999999\t1.0\t2.0\t0\tAppended\n")
+            self.assertIsNone(load_cached_features(test_file, cache_dir))
+
+            self.assertEqual(len(list(read_txt_file(test_file, cache_dir=cache_dir))), len(features) + 1)
+            self.assertEqual(len(get_cache_entries(cache_dir)), 1)
+            self.assertFalse(os.path.exists(stale_entry))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with TemporaryDirectory() as tempdir:
+            cache_dir = os.path.join(tempdir, "cache")
+            test_files = [
+                shutil.copy(os.path.join(DATA_FOLDER, filename), tempdir)
+                for filename in ["TouristAreas.txt", "Battery Abandoned_RenewMap_point.txt", "dense_line.txt"]
+            ]
+
+            for test_file in test_files:
+                list(read_txt_file(test_file, cache_dir=cache_dir, max_cache_size=0))
+                self.assertEqual(len(get_cache_entries(cache_dir)), 1)
+                self.assertIsNotNone(load_cached_features(test_file, cache_dir))
+
+            self.assertIsNone(load_cached_features(test_files[0], cache_dir))
+
+
+class TestNode(unittest.TestCase):
+    def test_node_access(self):
+        node = get_node(["0", "76.98378438728284", "17.80511169716623", "0.0", "12-3"])
+
+        self.assertEqual(node["longitude"], 76.98378438728284)
+        self.assertEqual(node.latitude, 17.80511169716623)
+        self.assertEqual(node["name"], "12")
+        self.assertEqual(node["sub_name"], "3")
+        self.assertEqual(get_node_name(node), "12-3")
+        self.assertEqual(node.to_dict()["altitude"], 0.0)
+        with self.assertRaises(KeyError):
+            node["index"]
+
+    def test_node_names_interned(self):
+        one = get_node(["0", "1.0", "2.0", "0.0", "".join(["Tourist", "Area"])])
+        other = get_node(["1", "1.5", "2.5", "0.0", "".join(["Tourist", "Area"])])
+        self.assertIs(one.name, other.name)
+
+    def test_node_ids(self):
+        one = get_node(["0", "1.000000001", "-2.0", "0.0", "1"])
+        same = get_node(["1", "1.0000000012", "-2.0000000001", "0.0", "1"])
+        other = get_node(["2", "1.00000001", "-2.0", "0.0", "1"])
+
+        self.assertIsInstance(one["id"], int)
+        self.assertEqual(one["id"], same["id"])
+        self.assertNotEqual(one["id"], other["id"])
+        self.assertTrue(is_ring_closed([one, other, same]))
+        self.assertListEqual(dedupe_nodes([one, one, other]), [one, other])
+
+    def test_non_finite_node_ids(self):
+        nan = get_node(["0", "nan", "0.0", "0.0", "1"])
+        self.assertEqual(nan["id"], "nan,0.0")
+        self.assertEqual(get_node(["1", "inf", "-inf", "0.0", "1"])["id"], "inf,-inf")
+        self.assertNotEqual(nan["id"], get_node(["2", "0.0", "0.0", "0.0", "1"])["id"])
+
+        with TemporaryDirectory() as tempdir:
+            test_file = os.path.join(tempdir, "non_finite.txt")
+            with open(test_file, "w", encoding="utf-8") as fo:
+                fo.write("ID\tLongitude(x)\tLatitude(y)\tAltitude\tName\n")
+                fo.write("0\tnan\t0.0\t0\t1\n1\t1.0\tinf\t0\t1\n2\tnan\t0.0\t0\t1\n")
+
+            features = list(read_txt_file(test_file))
+            array, _ = next(read_txt_file(test_file, columnar=True))
+
+        self.assertListEqual([node["id"] for node in features[0]], ["nan,0.0", "1.0,inf", "nan,0.0"])
+        self.assertListEqual(get_array_ids(array), ["nan,0.0", "1.0,inf", "nan,0.0"])
+        self.assertTrue(is_ring_closed(features[0]))
+
+
+class TestTxtIndex(unittest.TestCase):
+    def test_indexed_features_match_read_txt_file(self):
+        with TemporaryDirectory() as tempdir:
+            test_file = shutil.copy(os.path.join(DATA_FOLDER, "TouristAreas.txt"), tempdir)
+            features = list(read_txt_file(test_file))
+            columnar_features = list(read_txt_file(test_file, columnar=True))
+
+            with IndexedTxtFile(test_file) as indexed:
+                self.assertEqual(len(indexed), len(features))
+                self.assertTrue(os.path.isfile(get_txt_index_filepath(test_file)))
+
+                for position in reversed(range(len(indexed))):
+                    self.assertListEqual(indexed.read_feature(position), features[position])
+                    array, metadata = indexed.read_feature(position, columnar=True)
+                    self.assertEqual(array.tolist(), columnar_features[position][0].tolist())
+                    self.assertEqual(metadata, columnar_features[position][1])
+
+                name = columnar_features[2][1]["name"]
+                self.assertListEqual(list(indexed.read_features(names=[name])), [features[2]])
+
+                west, south, east, north = indexed.get_bbox(3)
+                self.assertIn(3, indexed.query_bbox((west, south, west, south)))
+                for node in features[3]:
+                    self.assertTrue(west <= node["longitude"] <= east and south <= node["latitude"] <= north)
+
+                extracted_file = os.path.join(tempdir, "extracted.txt")
+                self.assertEqual(indexed.extract_features(extracted_file, [4, 1]), len(features[1]) + len(features[4]))
+                self.assertListEqual(list(read_txt_file(extracted_file)), [features[1], features[4]])
+
+    def test_stale_index_is_rebuilt(self):
+        with TemporaryDirectory() as tempdir:
+            test_file = shutil.copy(os.path.join(DATA_FOLDER, "TouristAreas.txt"), tempdir)
+
+            with IndexedTxtFile(test_file) as indexed:
+                number_of_features = len(indexed)
+            self.assertIsNotNone(load_txt_index(test_file))
+
+            with open(test_file, "a") as fo:
+                fo.write("999999\t1.0\t2.0\t0\tAppended\n")
+            self.assertIsNone(load_txt_index(test_file))
+
+            with IndexedTxtFile(test_file) as indexed:
+                self.assertEqual(len(indexed), number_of_features + 1)
+                self.assertListEqual(indexed.get_positions("Appended"), [number_of_features])
+
+
+if __name__ == "__main__":
+    unittest.main()
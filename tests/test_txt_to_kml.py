@@ -1,10 +1,41 @@
+import argparse
 import os
 import unittest
+import xml.etree.ElementTree as ET
+import zipfile
+from tempfile import TemporaryDirectory
 
+from core.kml_file.tiles import write_tiled_kml
 from core.kml_file.write_kml_file import kml_writer
 from core.txt_file.read_txt_file import read_txt_file
+from line_thinner.__main__ import worker as line_thinner_worker
+from line_thinner.options import add_thinning_arguments, get_thinning_options
+from txt_to_kml.__main__ import get_lod_options
+from txt_to_kml.lod import write_lod_pyramid
 
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+KML_NAMESPACE = "{http://www.opengis.net/kml/2.2}"
+
+
+def write_kml(test_file, output_file, columnar=False, **kwargs):
+    with kml_writer(output_file, **kwargs) as write_node_group:
+        for feature in read_txt_file(test_file, columnar=columnar):
+            if columnar:
+                write_node_group(feature[0], metadata=feature[1], is_area=True)
+            else:
+                write_node_group(feature, is_area=True)
+
+
+def get_placemarks(kml_file):
+    placemarks = []
+    for placemark in ET.parse(kml_file).getroot().iter(f"{KML_NAMESPACE}Placemark"):
+        geometry = placemark[1].tag.replace(KML_NAMESPACE, "")
+        coordinates = [
+            [float(value) for value in coordinate.split(",")]
+            for coordinate in placemark.find(f".//{KML_NAMESPACE}coordinates").text.split()
+        ]
+        placemarks.append((placemark.find(f"{KML_NAMESPACE}name").text, geometry, coordinates))
+    return placemarks
 
 
 class TestTxtToKml(unittest.TestCase):
@@ -31,5 +62,171 @@ class TestTxtToKml(unittest.TestCase):
                 write_node_group(this_feature_nodes, is_area=is_area)
 
 
+class TestCompactKml(unittest.TestCase):
+    def test_compact_matches_default(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.kml")
+            write_kml(test_file, expected_file)
+            expected = get_placemarks(expected_file)
+
+            for columnar in [False, True]:
+                output_file = os.path.join(tempdir, f"compact_{columnar}.kml")
+                write_kml(test_file, output_file, columnar=columnar, compact=True)
+
+                self.assertListEqual(get_placemarks(output_file), expected)
+                self.assertLess(os.path.getsize(output_file), os.path.getsize(expected_file))
+
+    def test_compact_precision(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.kml")
+            output_file = os.path.join(tempdir, "output.kml")
+            write_kml(test_file, expected_file)
+            write_kml(test_file, output_file, columnar=True, compact=True, precision=5)
+
+            placemarks = get_placemarks(output_file)
+            expected_placemarks = get_placemarks(expected_file)
+            self.assertEqual(len(placemarks), len(expected_placemarks))
+
+            for (name, geometry, coordinates), expected in zip(placemarks, expected_placemarks):
+                self.assertEqual((name, geometry), expected[:2])
+                for coordinate, expected_coordinate in zip(coordinates, expected[2]):
+                    for value, expected_value in zip(coordinate, expected_coordinate):
+                        self.assertAlmostEqual(value, expected_value, delta=0.5e-5 + 1e-12)
+
+
+class TestKmz(unittest.TestCase):
+    def test_kmz_contains_kml(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.kml")
+            write_kml(test_file, expected_file)
+
+            sizes = []
+            for compression_level in [0, 9]:
+                output_file = os.path.join(tempdir, f"output_{compression_level}.kml")
+                write_kml(test_file, output_file, kmz=True, compression_level=compression_level)
+
+                kmz_file = os.path.join(tempdir, f"output_{compression_level}.kmz")
+                self.assertFalse(os.path.isfile(output_file))
+                with zipfile.ZipFile(kmz_file) as zf, open(expected_file, "rb") as fe:
+                    self.assertListEqual(zf.namelist(), ["doc.kml"])
+                    self.assertEqual(zf.read("doc.kml"), fe.read())
+                sizes.append(os.path.getsize(kmz_file))
+
+            self.assertLess(sizes[1], sizes[0])
+            self.assertLess(sizes[1], os.path.getsize(expected_file))
+
+
+class TestTiledKml(unittest.TestCase):
+    def test_tiles_contain_every_feature(self):
+        test_file = os.path.join(DATA_FOLDER, "TouristAreas.txt")
+
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.kml")
+            write_kml(test_file, expected_file)
+            expected = get_placemarks(expected_file)
+
+            for scheme in ["grid", "quadtree"]:
+                root_file = os.path.join(tempdir, f"{scheme}.kml")
+                number_of_tiles = write_tiled_kml(
+                    test_file, root_file, scheme=scheme, grid_size=2, max_features=2, is_area=True
+                )
+                self.assertGreater(number_of_tiles, 1)
+
+                placemarks = []
+                links = list(ET.parse(root_file).getroot().iter(f"{KML_NAMESPACE}NetworkLink"))
+                self.assertEqual(len(links), number_of_tiles)
+
+                for link in links:
+                    box = link.find(f"{KML_NAMESPACE}Region/{KML_NAMESPACE}LatLonAltBox")
+                    north, south, east, west = (
+                        float(box.find(f"{KML_NAMESPACE}{side}").text) for side in ["north", "south", "east", "west"]
+                    )
+                    href = link.find(f"{KML_NAMESPACE}Link/{KML_NAMESPACE}href").text
+                    tile_placemarks = get_placemarks(os.path.join(tempdir, href))
+                    self.assertTrue(tile_placemarks)
+
+                    for _, _, coordinates in tile_placemarks:
+                        for longitude, latitude, _ in coordinates:
+                            self.assertTrue(west <= longitude <= east and south <= latitude <= north)
+                    placemarks.extend(tile_placemarks)
+
+                self.assertCountEqual(placemarks, expected)
+
+
+class TestLodPyramid(unittest.TestCase):
+    def test_levels_get_finer(self):
+        test_file = os.path.join(DATA_FOLDER, "dense_line.txt")
+
+        with TemporaryDirectory() as tempdir:
+            root_file = os.path.join(tempdir, "dense_line.kml")
+            number_of_levels = write_lod_pyramid(
+                test_file, root_file, allowed_angle_deviations=[1, 10], lod_pixels=[300]
+            )
+            self.assertEqual(number_of_levels, 2)
+
+            links = list(ET.parse(root_file).getroot().iter(f"{KML_NAMESPACE}NetworkLink"))
+            lod_ranges = [
+                tuple(
+                    int(link.find(f"{KML_NAMESPACE}Region/{KML_NAMESPACE}Lod/{KML_NAMESPACE}{bound}").text)
+                    for bound in ["minLodPixels", "maxLodPixels"]
+                )
+                for link in links
+            ]
+            self.assertListEqual(lod_ranges, [(0, 300), (300, -1)])
+
+            levels = [
+                get_placemarks(os.path.join(tempdir, link.find(f"{KML_NAMESPACE}Link/{KML_NAMESPACE}href").text))
+                for link in links
+            ]
+            coarse, fine = ([len(coordinates) for _, _, coordinates in placemarks] for placemarks in levels)
+            self.assertEqual(len(coarse), len(fine))
+            self.assertTrue(all(a <= b for a, b in zip(coarse, fine)))
+            self.assertLess(sum(coarse), sum(fine))
+
+    def test_levels_match_line_thinner(self):
+        command_lines = [
+            ["--use-distance-weighted", "--max-distance-for-weighting", "0.001", "--max-angle-for-weighting", "30"],
+            ["--reduce-area-to-point", "--area-to-point-threshold", "5000"],
+        ]
+
+        for test_filename in ["dense_line.txt", "TouristAreas.txt"]:
+            test_file = os.path.join(DATA_FOLDER, test_filename)
+            for command_line in command_lines:
+                parser = argparse.ArgumentParser()
+                add_thinning_arguments(parser)
+                args = parser.parse_args(command_line + ["--allowed-angle-deviation", "5"])
+                args.lod_levels = [5]
+                args.lod_pixels = None
+
+                with TemporaryDirectory() as tempdir:
+                    thinned_file = os.path.join(tempdir, "thinned.txt")
+                    line_thinner_worker(
+                        {
+                            "input_file": test_file,
+                            "output_file": thinned_file,
+                            "replace": False,
+                            "columnar": False,
+                            "read_options": None,
+                            "staged_options": None,
+                            "thinning_options": get_thinning_options(args),
+                        }
+                    )
+                    expected_file = os.path.join(tempdir, "expected.kml")
+                    write_kml(thinned_file, expected_file)
+
+                    write_lod_pyramid(
+                        test_file, os.path.join(tempdir, "lod.kml"), is_area=True, **get_lod_options(args)
+                    )
+                    level = get_placemarks(os.path.join(tempdir, "lod_lod", "level_0.kml"))
+
+                    self.assertListEqual(level, get_placemarks(expected_file))
+
+
 if __name__ == "__main__":
     unittest.main()
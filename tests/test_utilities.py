@@ -0,0 +1,26 @@
+import unittest
+
+from core.utilities import format_bytes, get_peak_memory_usage
+
+
+class TestUtilities(unittest.TestCase):
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(None), "unknown")
+        self.assertEqual(format_bytes(0), "0.0 B")
+        self.assertEqual(format_bytes(1023), "1023.0 B")
+        self.assertEqual(format_bytes(1536), "1.5 KB")
+        self.assertEqual(format_bytes(5 * 1024**3), "5.0 GB")
+        self.assertEqual(format_bytes(2 * 1024**4), "2.0 TB")
+
+    def test_get_peak_memory_usage(self):
+        peak = get_peak_memory_usage()
+        if peak is None:
+            self.skipTest("The platform does not report the peak memory usage")
+
+        # Written so the pages are resident
+        data = b"x" * (64 * 1024 * 1024)
+        self.assertGreaterEqual(get_peak_memory_usage(), max(peak, len(data)))
+
+
+if __name__ == "__main__":
+    unittest.main()
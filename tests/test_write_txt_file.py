@@ -0,0 +1,67 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from core.txt_file.write_txt_file import txt_list_session, txt_list_writer
+
+GROUPS = [
+    ("1-1", [(1.5, 2.25, 0.0), (1.75, 2.5, 0.0), (2.0, 3.0, 0.0)]),
+    ("Untitled Path", [(76.98378438728284, 17.80511169716623, 0.0)]),
+    ("2", []),
+    ("3-4", [(-99.4593439, 27.5762924, 0.0), (-99.4592339, 27.5761676, 10.0)]),
+]
+
+
+def write_with_txt_list_writer(filepath, groups):
+    for name, coordinates in groups:
+        with txt_list_writer(filepath) as (tsv_writer, last_index):
+            for i, (longitude, latitude, altitude) in enumerate(coordinates):
+                tsv_writer.writerow([last_index + i + 1, longitude, latitude, altitude, name])
+
+
+def write_with_txt_list_session(filepath, groups):
+    with txt_list_session(filepath, buffer_size=64) as txt_writer:
+        for name, coordinates in groups:
+            last_index = txt_writer.last_index
+            for i, (longitude, latitude, altitude) in enumerate(coordinates):
+                txt_writer.writerow([last_index + i + 1, longitude, latitude, altitude, name])
+
+
+class TestTxtListSession(unittest.TestCase):
+    def test_session_matches_txt_list_writer(self):
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.txt")
+            output_file = os.path.join(tempdir, "output.txt")
+
+            write_with_txt_list_writer(expected_file, GROUPS)
+            write_with_txt_list_session(output_file, GROUPS)
+
+            with open(expected_file, "rb") as fe, open(output_file, "rb") as fo:
+                self.assertEqual(fe.read(), fo.read())
+
+    def test_session_appends_to_existing_file(self):
+        with TemporaryDirectory() as tempdir:
+            expected_file = os.path.join(tempdir, "expected.txt")
+            output_file = os.path.join(tempdir, "output.txt")
+
+            write_with_txt_list_writer(expected_file, GROUPS)
+            write_with_txt_list_writer(expected_file, GROUPS)
+
+            write_with_txt_list_writer(output_file, GROUPS)
+            write_with_txt_list_session(output_file, GROUPS)
+
+            with open(expected_file, "rb") as fe, open(output_file, "rb") as fo:
+                self.assertEqual(fe.read(), fo.read())
+
+    def test_session_without_rows_creates_no_file(self):
+        with TemporaryDirectory() as tempdir:
+            output_file = os.path.join(tempdir, "output.txt")
+
+            with txt_list_session(output_file) as txt_writer:
+                self.assertEqual(txt_writer.last_index, -1)
+
+            self.assertFalse(os.path.exists(output_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,125 @@
 import argparse
 import os
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from core.kml_file.write_kml_file import kml_writer
-from core.txt_file.read_txt_file import read_txt_file
+from core.executor import add_executor_arguments, get_staged_options
+from core.kml_file.logic import get_is_area
+from core.kml_file.tiles import (
+    DEFAULT_GRID_SIZE,
+    DEFAULT_MAX_FEATURES_PER_TILE,
+    DEFAULT_MIN_LOD_PIXELS,
+    TILING_SCHEMES,
+    write_tiled_kml,
+)
+from core.kml_file.write_kml_file import DEFAULT_KMZ_COMPRESSION_LEVEL, format_kml_feature, kml_document, kml_writer
+from core.metrics import (
+    WRITE,
+    add_metrics_arguments,
+    count_written,
+    measure_map,
+    measure_reading,
+    measure_stage,
+    run_measured_workers,
+)
+from core.txt_file.cache import add_cache_arguments
+from core.txt_file.read_txt_file import get_read_options, read_txt_file
 from core.utilities import file_handler
+from line_thinner.options import add_thinning_arguments, get_thinning_options
+from txt_to_kml.lod import write_lod_pyramid
 
 
-def worker(option):
+def tiled_worker(option):
+    return write_tiled_kml(
+        option["input_file"],
+        option["output_file"],
+        is_area=get_is_area(option["input_file"]),
+        compact=option["compact"],
+        precision=option["precision"],
+        kmz=option["kmz"],
+        compression_level=option["compression_level"],
+        **option["tiling_options"],
+    )
+
+
+def lod_worker(option):
+    return write_lod_pyramid(
+        option["input_file"],
+        option["output_file"],
+        is_area=get_is_area(option["input_file"]),
+        compact=option["compact"],
+        precision=option["precision"],
+        kmz=option["kmz"],
+        compression_level=option["compression_level"],
+        **option["lod_options"],
+    )
+
+
+def format_feature(feature, columnar=False, **kwargs):
+    # Placemark of a feature from read_txt_file, formatted in the compute stage of --staged runs
+    if columnar:
+        array, metadata = feature
+        return format_kml_feature(array, metadata=metadata, **kwargs)
+    return format_kml_feature(feature, **kwargs)
+
+
+def staged_worker(option, metrics=None):
     with file_handler(option["output_file"], replace=option["replace"]) as filepath:
-        with kml_writer(filepath) as write_node_group:
-            for this_feature_nodes in read_txt_file(option["input_file"]):
-                basename = os.path.basename(option["input_file"])
-                basename_noext = os.path.splitext(basename)[0]
-                is_area = basename_noext.lower().endswith("area")
-                write_node_group(this_feature_nodes, is_area=is_area)
+        with kml_document(
+            filepath, compact=option["compact"], kmz=option["kmz"], compression_level=option["compression_level"]
+        ) as fo, measure_stage(metrics, WRITE):
+            features = measure_reading(
+                metrics, read_txt_file(option["input_file"], columnar=option["columnar"], **option["read_options"])
+            )
+            format_placemark = partial(
+                format_feature,
+                columnar=option["columnar"],
+                compact=option["compact"],
+                precision=option["precision"],
+                is_area=get_is_area(option["input_file"]),
+            )
 
+            for placemark in measure_map(metrics, format_placemark, features, option["staged_options"]):
+                fo.write(placemark)
+
+    if metrics is not None:
+        count_written(metrics, metrics.counts["features_read"], metrics.counts["vertices_read"])
+    return True
+
+
+def worker(option, metrics=None):
+    # Tiles and levels of detail are only measured as a whole
+    if option["tiling_options"]:
+        return tiled_worker(option)
+
+    if option["lod_options"]:
+        return lod_worker(option)
+
+    if option["staged_options"]:
+        return staged_worker(option, metrics=metrics)
+
+    with file_handler(option["output_file"], replace=option["replace"]) as filepath:
+        with kml_writer(
+            filepath,
+            compact=option["compact"],
+            precision=option["precision"],
+            kmz=option["kmz"],
+            compression_level=option["compression_level"],
+        ) as write_node_group, measure_stage(metrics, WRITE):
+            is_area = get_is_area(option["input_file"])
+
+            if option["columnar"]:
+                for array, metadata in measure_reading(
+                    metrics, read_txt_file(option["input_file"], columnar=True, **option["read_options"])
+                ):
+                    write_node_group(array, metadata=metadata, is_area=is_area)
+            else:
+                for this_feature_nodes in measure_reading(
+                    metrics, read_txt_file(option["input_file"], **option["read_options"])
+                ):
+                    write_node_group(this_feature_nodes, is_area=is_area)
+
+    if metrics is not None:
+        count_written(metrics, metrics.counts["features_read"], metrics.counts["vertices_read"])
     return True
 
 
@@ -31,16 +135,56 @@ def get_file_options(input_item, args):
     basename = (
         os.path.basename(filepath)
         if args.replace
-        else os.path.basename(filepath).replace(".txt", "") + args.output_suffix + ".kml"
+        else os.path.basename(filepath).replace(".txt", "")
+        + args.output_suffix
+        + (".kmz" if args.kmz and not (args.tiles or args.lod_levels) else ".kml")
     )
 
     return {
         "replace": args.replace,
+        "columnar": args.columnar,
+        "read_options": get_read_options(args),
+        "staged_options": get_staged_options(args),
+        "compact": args.compact or args.precision is not None,
+        "precision": args.precision,
+        "kmz": args.kmz,
+        "compression_level": args.compression_level,
+        "tiling_options": get_tiling_options(args),
+        "lod_options": get_lod_options(args),
         "input_file": filepath,
         "output_file": filepath if args.replace else os.path.join(output_folder, basename),
     }
 
 
+def get_tiling_options(args):
+    if not args.tiles:
+        return None
+
+    return {
+        "scheme": args.tiles,
+        "grid_size": args.grid_size,
+        "max_features": args.max_features_per_tile,
+        "min_lod_pixels": args.min_lod_pixels,
+        # Tiles of a file are written in parallel with the same executor as the files
+        "backend": args.backend,
+        "max_workers": args.workers,
+    }
+
+
+def get_lod_options(args):
+    if not args.lod_levels:
+        return None
+
+    # Thinned as line_thinner does with the same options, each level setting the allowed angle deviation
+    thinning_options = get_thinning_options(args)
+    del thinning_options["allowed_angle_deviation"]
+    return {
+        "allowed_angle_deviations": args.lod_levels,
+        "lod_pixels": args.lod_pixels,
+        "thinning_options": thinning_options,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser("TXT to KML")
     parser.add_argument(
@@ -67,8 +211,104 @@ def main():
     parser.add_argument(
         "-o", "--output-folder", help="<Optional> Folder to put the output files in if replace is False", required=False
     )
+    parser.add_argument(
+        "--columnar",
+        help="<Optional> Read the input into numpy arrays instead of per node dicts, faster for large files",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--compact",
+        help="<Optional> Write placemarks without indentation and format coordinates in bulk, smaller and faster",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        help="<Optional> Decimals to round the coordinates to, implies --compact",
+    )
+    parser.add_argument(
+        "--kmz",
+        help="<Optional> Write a compressed .kmz instead of a .kml, the kml is compressed while it is written",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_KMZ_COMPRESSION_LEVEL,
+        help=f"<Optional> Compression level of --kmz, 0 to 9, defaults to {DEFAULT_KMZ_COMPRESSION_LEVEL}",
+    )
+    parser.add_argument(
+        "--tiles",
+        choices=TILING_SCHEMES,
+        help=(
+            "<Optional> Split the features in tiles written as separate files, linked from the output kml with "
+            "regions so viewers only load the tiles in view"
+        ),
+    )
+    parser.add_argument(
+        "--grid-size",
+        type=int,
+        default=DEFAULT_GRID_SIZE,
+        help=f"<Optional> Number of columns and rows of --tiles grid, defaults to {DEFAULT_GRID_SIZE}",
+    )
+    parser.add_argument(
+        "--max-features-per-tile",
+        type=int,
+        default=DEFAULT_MAX_FEATURES_PER_TILE,
+        help=(
+            "<Optional> Features above which a --tiles quadtree tile is split, "
+            f"defaults to {DEFAULT_MAX_FEATURES_PER_TILE}"
+        ),
+    )
+    parser.add_argument(
+        "--min-lod-pixels",
+        type=int,
+        default=DEFAULT_MIN_LOD_PIXELS,
+        help=(
+            "<Optional> Size in pixels a tile region needs on screen to be loaded, "
+            f"defaults to {DEFAULT_MIN_LOD_PIXELS}"
+        ),
+    )
+    parser.add_argument(
+        "--lod-levels",
+        nargs="+",
+        type=float,
+        help=(
+            "<Optional> Write a level of detail pyramid, the features thinned with each of these allowed angle "
+            "deviations (see line_thinner) in a folder of levels linked from the output kml"
+        ),
+    )
+    parser.add_argument(
+        "--lod-pixels",
+        nargs="+",
+        type=int,
+        help=(
+            "<Optional> Size in pixels on screen at which each --lod-levels level gives way to the next finer one, "
+            "one less than the levels"
+        ),
+    )
+    add_thinning_arguments(parser)
+    add_executor_arguments(parser)
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
+    if (args.tiles or args.lod_levels) and args.replace:
+        parser.error("--tiles and --lod-levels write a folder next to the output and cannot replace the input")
+
+    if args.tiles and args.lod_levels:
+        parser.error("--tiles and --lod-levels cannot be used together")
+
+    if args.staged and (args.tiles or args.lod_levels):
+        parser.error("--staged cannot be used with --tiles or --lod-levels")
+
+    if args.lod_levels and get_thinning_options(args)["algorithm"] != "angle":
+        parser.error("--lod-levels thins the features with the angle algorithm only")
+
+    if args.lod_pixels and (not args.lod_levels or len(args.lod_pixels) != len(args.lod_levels) - 1):
+        parser.error("--lod-pixels needs one value less than --lod-levels")
+
     options = []
 
     for input_item in args.inputs:
@@ -81,13 +321,9 @@ def main():
                 if os.path.isfile(filepath) and filepath.endswith(".txt"):
                     options.append(get_file_options(filepath, args))
 
-    # Set up multithreading
-    number_of_threads = 10
-    with ThreadPoolExecutor(max_workers=number_of_threads) as executor:
-        results = executor.map(worker, options)
-
-    for result in results:
-        print(result)
+    # Results come back per file as the workers complete
+    for option, result in run_measured_workers(worker, options, args):
+        print(option["input_file"], result)
 
 
 if __name__ == "__main__":  # pragma: no cover
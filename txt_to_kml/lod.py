@@ -0,0 +1,140 @@
+"""Level of detail pyramid, the features of a txt file thinned at several levels in one pass
+
+Every level is the kml txt_to_kml writes for the output of line_thinner with one allowed angle deviation. The file
+is read once and the angles at every point computed once for all the levels. A root kml links the levels with
+NetworkLinks whose Lod ranges show the coarsest level zoomed out and the finest zoomed in.
+"""
+import os
+from contextlib import ExitStack
+
+import numpy as np
+
+from core.kml_file.tiles import get_region, write_root_document
+from core.kml_file.write_kml_file import DEFAULT_KMZ_COMPRESSION_LEVEL, get_kml_output_filepath, kml_writer
+from core.txt_file.columnar import get_coordinates, iter_named_groups
+from core.txt_file.read_txt_file import read_txt_file
+from line_thinner.line_thinner import get_thinning_levels, polygon__area
+
+# Allowed angle deviations of the levels, coarsest first
+DEFAULT_LOD_LEVELS = [20, 5, 1]
+
+# Region size in pixels on screen at which the first level gives way to the second, every next level starts at
+# LOD_PIXELS_GROWTH times the size of the previous one
+DEFAULT_LOD_PIXELS = 512
+LOD_PIXELS_GROWTH = 4
+
+
+def get_default_lod_pixels(number_of_levels):
+    return [DEFAULT_LOD_PIXELS * LOD_PIXELS_GROWTH**i for i in range(number_of_levels - 1)]
+
+
+def get_lod_ranges(number_of_levels, lod_pixels=None):
+    """Return the (min, max) lod pixels of every level given the pixels at which each level gives way to the next"""
+    if lod_pixels is None:
+        lod_pixels = get_default_lod_pixels(number_of_levels)
+
+    if len(lod_pixels) != number_of_levels - 1:
+        raise ValueError(f"Expected {number_of_levels - 1} lod pixels for {number_of_levels} levels: {lod_pixels}")
+
+    bounds = [0, *lod_pixels, -1]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def get_centroid(group):
+    point = group[:1].copy()
+    point["longitude"], point["latitude"], point["altitude"] = get_coordinates(group).mean(axis=0)
+    return point
+
+
+def thin_feature_array(array, metadata, allowed_angle_deviations, thinning_options=None):
+    """Return the feature array thinned with every allowed angle deviation
+
+    The named groups of the feature are thinned like line_thinner does, so each level has the rows line_thinner
+    would write for the feature.
+    """
+    thinning_options = thinning_options or {}
+    levels = [[] for _ in allowed_angle_deviations]
+
+    for _, group in iter_named_groups(array, metadata):
+        coordinates = get_coordinates(group)
+
+        if thinning_options.get("reduce_area_to_point") and len(group) >= 3:
+            threshold = thinning_options.get("threshold_area_in_meter_square", 100)
+            if polygon__area(coordinates.tolist()) <= threshold:
+                for level in levels:
+                    level.append(get_centroid(group))
+                continue
+
+        kept_positions = get_thinning_levels(coordinates, allowed_angle_deviations, **thinning_options)
+        for level, positions in zip(levels, kept_positions):
+            level.append(group[positions])
+
+    return [np.concatenate(level) for level in levels]
+
+
+def write_lod_pyramid(
+    input_file,
+    output_file,
+    allowed_angle_deviations=None,
+    lod_pixels=None,
+    thinning_options=None,
+    is_area=False,
+    compact=False,
+    precision=None,
+    kmz=False,
+    compression_level=DEFAULT_KMZ_COMPRESSION_LEVEL,
+):
+    """Write the features of a txt file thinned at every level and a root kml linking the levels
+
+    The root is written to output_file (.kml) and the levels to a folder next to it named after it with a _lod
+    suffix, level_0 being the coarsest. Return the number of levels written.
+
+    :param allowed_angle_deviations: allowed angle deviation of every level, see reduce_points_in_a_line
+    :param lod_pixels: region size in pixels at which each level gives way to the next, one less than the levels
+    :param thinning_options: other reduce_points_in_a_line arguments used for all the levels
+    """
+    allowed_angle_deviations = sorted(allowed_angle_deviations or DEFAULT_LOD_LEVELS, reverse=True)
+    lod_ranges = get_lod_ranges(len(allowed_angle_deviations), lod_pixels)
+
+    root_filepath = get_kml_output_filepath(output_file)
+    levels_folder_name = os.path.splitext(os.path.basename(root_filepath))[0] + "_lod"
+    levels_folder = os.path.join(os.path.dirname(root_filepath), levels_folder_name)
+    os.makedirs(levels_folder, exist_ok=True)
+
+    extension = ".kmz" if kmz else ".kml"
+    level_filenames = [f"level_{level}{extension}" for level in range(len(allowed_angle_deviations))]
+
+    bboxes = []
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(
+                kml_writer(
+                    os.path.join(levels_folder, filename),
+                    compact=compact,
+                    precision=precision,
+                    kmz=kmz,
+                    compression_level=compression_level,
+                )
+            )
+            for filename in level_filenames
+        ]
+
+        for array, metadata in read_txt_file(input_file, columnar=True):
+            longitudes = array["longitude"]
+            latitudes = array["latitude"]
+            bboxes.append((longitudes.min(), latitudes.min(), longitudes.max(), latitudes.max()))
+
+            levels = thin_feature_array(array, metadata, allowed_angle_deviations, thinning_options)
+            for write_node_group, level_array in zip(writers, levels):
+                write_node_group(level_array, metadata=metadata, is_area=is_area)
+
+    network_links = []
+    if bboxes:
+        bboxes = np.array(bboxes)
+        region = get_region(bboxes[0], bboxes)
+        for filename, lod_range in zip(level_filenames, lod_ranges):
+            name = os.path.splitext(filename)[0]
+            network_links.append((name, f"{levels_folder_name}/{filename}", region, lod_range))
+
+    write_root_document(root_filepath, network_links)
+    return len(allowed_angle_deviations)